@@ -3,7 +3,11 @@ Main client script for the Pi Zero
 
 Connects to Pi 4 server and waits for image data to be sent using sockets.
 Scales the image as needed to fit on the HyperPixel 2" Round display using
-PyGame.
+PyGame. In lean mode (the default) frames are decoded and transformed with
+pygame, so OpenCV (slow to import and large on a Pi Zero) is only loaded if
+a frame at least twice the display size arrives: those are much cheaper to
+decode at reduced size with OpenCV. Set LEAN = False to decode everything
+with OpenCV instead.
 
 NOTE: You MUST change the host IP address to match the 'x' you chose for the Pi
 Zero!
@@ -13,22 +17,279 @@ Date: September 24, 2022
 License: Apache-2.0
 """
 
-import os, time, socket, pickle, struct
+import os, io, time, socket, select, struct
 
 import pygame
-import cv2
+
+from facedress import protocol
+from facedress.playout import PlayoutBuffer
+from facedress.profiling import Profiler
 
 # Settings
 DEBUG = True                    # Prints debugging info to console
+LEAN = True                     # Decode with pygame instead of OpenCV
+SMOOTH_SCALE = True             # Bilinear scaling in lean mode (else nearest)
+REDUCED_DECODE = True           # Decode big frames at 1/2, 1/4 or 1/8 (OpenCV)
 MIRROR = True                   # Mirror the image on the HyperPixel
 ROTATION = 90                   # Rotate image (0, 90, 180, 270)
 DISPLAY_RES = (480, 480)        # Resolution of HyperPixel
 HOST = '192.168.x.1'            # Address of the server (Pi 4 interface)
 PORT = 8484                     # Port of server (Pi 4)
-KEEPALIVE = "ACK"               # Keep alive message to send to server
 SOCKET_TIMEOUT = 3.0            # Wait this no. of seconds before closing socket
+STATS_INTERVAL = 10.0           # Print playout stats every this no. of seconds
+RECONNECT_MIN_DELAY = 0.05      # First reconnect delay (doubles each failure)
+RECONNECT_MAX_DELAY = 2.0       # Longest delay between reconnect attempts
+KEEPALIVE_IDLE = 1              # Idle seconds before TCP keepalive probes
+KEEPALIVE_INTERVAL = 1          # Seconds between keepalive probes
+KEEPALIVE_COUNT = 3             # Unanswered probes before the link is dead
+PROFILE_DIR = "/tmp"            # Profiles on SIGUSR1/SIGUSR2 are written here
+PROFILE_SECONDS = 10.0          # Length of a profile
+
+# Idle settings (what to show when the server has no face for this display)
+IDLE_IMAGE = None               # Fade to this image file (None = to black)
+IDLE_FADE = 2.0                 # Seconds the last frame takes to fade out
+IDLE_FPS = 15                   # Frame rate of the fade
+
+# Playout settings (show frames on a steady clock instead of on arrival)
+PLAYOUT = False                 # Enable the playout (jitter) buffer
+PLAYOUT_MIN_DELAY = 0.02        # Lowest added delay (seconds)
+PLAYOUT_MAX_DELAY = 0.3         # Highest added delay (seconds)
+PLAYOUT_JITTER_FACTOR = 3.0     # Delay = factor * jitter (higher = smoother)
+PLAYOUT_MAX_FRAMES = 4          # Max frames held in the buffer
+
+# Pygame rotation (degrees counterclockwise) and flips (x, y) per (ROTATION,
+# MIRROR) setting. Matches the OpenCV path, which hands the array to
+# surfarray and so shows it transposed.
+ORIENTATION = {
+    (0, True): (90, False, True),
+    (0, False): (90, False, False),
+    (90, True): (0, False, True),
+    (90, False): (0, False, False),
+    (180, True): (90, True, False),
+    (180, False): (90, True, True),
+    (270, True): (0, True, False),
+    (270, False): (0, True, True),
+}
+
+# JPEG start-of-frame markers (SOF0-SOF15 minus DHT, JPG and DAC)
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Read (width, height) from a JPEG's SOF marker, None if not found
+def jpeg_size(jpg):
+    i = 2
+    while i + 9 <= len(jpg):
+        if jpg[i] != 0xFF:
+            return None
+        marker = jpg[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in SOF_MARKERS:
+            height, width = struct.unpack_from(">HH", jpg, i + 5)
+            return width, height
+        i += 2 + struct.unpack_from(">H", jpg, i + 2)[0]
+    return None
+
+# Largest DCT scale-down (1, 2, 4 or 8) that keeps the decoded image at least
+# as big as the display (the decoder rounds sizes up)
+def decode_scale(width, height):
+    scale = 1
+    while scale < 8 and \
+            -(-width // (scale * 2)) >= DISPLAY_RES[0] and \
+            -(-height // (scale * 2)) >= DISPLAY_RES[1]:
+        scale *= 2
+    return scale
+
+# Decode a JPEG with pygame's in-memory loader (None if it fails). SDL_image
+# has no scaled decoding, so the size is not used.
+def decode_pygame(jpg, width=0, height=0):
+    try:
+        return pygame.image.load(io.BytesIO(jpg), "frame.jpg")
+    except pygame.error:
+        return None
+
+# Decode a JPEG in lean mode (None if it fails). Frames at least twice the
+# display size are decoded at reduced size by OpenCV (imported on the first
+# one), the rest with pygame. Returns a pygame surface either way.
+def decode_lean(jpg, width=0, height=0):
+    global REDUCED_DECODE
+    if REDUCED_DECODE:
+        if width == 0 or height == 0:
+            width, height = jpeg_size(jpg) or (0, 0)
+        if decode_scale(width, height) > 1:
+            try:
+                import cv2
+                img = decode_opencv(jpg, width, height)
+                if img is None:
+                    return None
+                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+                return pygame.image.frombuffer(img, (img.shape[1],
+                                                        img.shape[0]), "RGB")
+            except ImportError:
+                print("OpenCV not found, decoding big frames with pygame")
+                REDUCED_DECODE = False
+    return decode_pygame(jpg)
+
+# Scale and orient a pygame surface, then draw it
+def show_pygame(surface, img):
+    if img.get_size() != DISPLAY_RES:
+        if SMOOTH_SCALE:
+            img = pygame.transform.smoothscale(img, DISPLAY_RES)
+        else:
+            img = pygame.transform.scale(img, DISPLAY_RES)
+    angle, flip_x, flip_y = ORIENTATION[(ROTATION, MIRROR)]
+    if angle != 0:
+        img = pygame.transform.rotate(img, angle)
+    if flip_x or flip_y:
+        img = pygame.transform.flip(img, flip_x, flip_y)
+    surface.blit(img, (0,0))
+
+# Copy the tiles of a delta into a pygame frame (None if the frame does not
+# match). The atlas is a JPEG or raw RGB.
+def patch_pygame(frame, positions, tile, tile_format, data, width, height):
+    if frame is None or frame.get_size() != (width, height):
+        return None
+    if not positions:
+        return frame
+    if tile_format == protocol.RAW_TILES:
+        atlas = pygame.image.frombuffer(data,
+                                        protocol.atlas_size(len(positions),
+                                                            tile), "RGB")
+    else:
+        atlas = decode_pygame(data)
+    if atlas is None:
+        return None
+    for ax, ay, x, y, w, h in protocol.atlas_tiles(positions, tile, width,
+                                                    height):
+        frame.blit(atlas, (x, y), (ax, ay, w, h))
+    return frame
+
+# Decode a JPEG with OpenCV (None if it fails). Frames bigger than the display
+# are decoded at reduced size in the DCT domain. The size comes from the frame
+# header, or from the JPEG itself if the header has none.
+def decode_opencv(jpg, width=0, height=0):
+    import numpy as np
+    import cv2
+    flag = cv2.IMREAD_COLOR
+    if REDUCED_DECODE:
+        if width == 0 or height == 0:
+            width, height = jpeg_size(jpg) or (0, 0)
+        flag = {1: cv2.IMREAD_COLOR,
+                2: cv2.IMREAD_REDUCED_COLOR_2,
+                4: cv2.IMREAD_REDUCED_COLOR_4,
+                8: cv2.IMREAD_REDUCED_COLOR_8}[decode_scale(width, height)]
+    return cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), flag)
+
+# Copy the tiles of a delta into an OpenCV frame (None if the frame does not
+# match)
+def patch_opencv(frame, positions, tile, tile_format, data, width, height):
+    import numpy as np
+    import cv2
+    if frame is None or frame.shape[:2] != (height, width):
+        return None
+    if not positions:
+        return frame
+    if tile_format == protocol.RAW_TILES:
+        atlas_width, atlas_height = protocol.atlas_size(len(positions), tile)
+        atlas = cv2.cvtColor(np.frombuffer(data, dtype=np.uint8).reshape(
+                                atlas_height, atlas_width, 3),
+                                cv2.COLOR_RGB2BGR)
+    else:
+        atlas = cv2.imdecode(np.frombuffer(data, dtype=np.uint8),
+                                cv2.IMREAD_COLOR)
+    if atlas is None:
+        return None
+    for ax, ay, x, y, w, h in protocol.atlas_tiles(positions, tile, width,
+                                                    height):
+        frame[y:y + h, x:x + w] = atlas[ay:ay + h, ax:ax + w]
+    return frame
+
+# Resize, rotate, and flip an OpenCV image if requested, then draw it
+def show_opencv(surface, img):
+    import cv2
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img = cv2.resize(img, DISPLAY_RES, interpolation=cv2.INTER_LINEAR)
+    if ROTATION == 90:
+        img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    elif ROTATION == 180:
+        img = cv2.rotate(img, cv2.ROTATE_180)
+    elif ROTATION == 270:
+        img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    if not MIRROR:
+        img = cv2.flip(img, 1)
+    frame = pygame.surfarray.make_surface(img)
+    surface.blit(frame, (0,0))
+
+# Load the idle image, oriented and scaled like a frame (None if not set or
+# it can't be loaded)
+def load_idle_image(path):
+    if path is None:
+        return None
+    try:
+        img = pygame.image.load(path).convert()
+    except (pygame.error, OSError) as e:
+        print("Error: Could not load idle image:", str(e))
+        return None
+    background = pygame.Surface(DISPLAY_RES)
+    show_pygame(background, img)
+    return background
+
+# Draw one step of the idle content: the last frame on screen fading into the
+# idle image (or black). Returns when the next step is due, None when done.
+def show_idle(surface, last, background, start):
+    fade = 0.0
+    if IDLE_FADE > 0:
+        fade = 1.0 - (time.time() - start) / IDLE_FADE
+    if background is None:
+        surface.fill((0, 0, 0))
+    else:
+        surface.blit(background, (0, 0))
+    if fade <= 0.0:
+        return None
+    last.set_alpha(int(255 * fade))
+    surface.blit(last, (0, 0))
+    return time.time() + 1.0 / IDLE_FPS
+
+# Connect to the server with Nagle's algorithm off (small replies go out at
+# once) and TCP keepalive on (a dead link is noticed even while idle)
+def connect(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for option, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+                            ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+                            ("TCP_KEEPCNT", KEEPALIVE_COUNT)):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+    sock.settimeout(SOCKET_TIMEOUT)
+    try:
+        sock.connect((host, port))
+    except socket.error:
+        sock.close()
+        raise
+    return sock
+
+# Wait until data arrives, the next buffered frame is due or the idle content
+# needs drawing, True if readable
+def wait_for_data(sock, playout, idle_next=None):
+    timeout = SOCKET_TIMEOUT
+    for next_time in (playout.next_time() if playout is not None else None,
+                        idle_next):
+        if next_time is not None:
+            timeout = max(0.0, min(timeout, next_time - time.time()))
+    return len(select.select([sock], [], [], timeout)[0]) > 0
 
 def main():
+    start_time = time.time()
+
+    # Pick the decoder
+    if LEAN:
+        decode, patch, show = decode_lean, patch_pygame, show_pygame
+    else:
+        decode, patch, show = decode_opencv, patch_opencv, show_opencv
+
+    # Profile on SIGUSR1 (cProfile) or SIGUSR2 (stacks and memory)
+    Profiler("client", PROFILE_DIR, PROFILE_SECONDS).install()
 
     # Initialize display
     pygame.display.init()
@@ -37,10 +298,29 @@ def main():
     # Disable mouse
     pygame.event.set_blocked(pygame.MOUSEMOTION)
     pygame.mouse.set_visible(False)
+    idle_image = load_idle_image(IDLE_IMAGE)
+
+    # Id, display time and render time of the last frame put on screen
+    shown_id = 0
+    shown_time = 0.0
+    render_time = 0.0
+    dropped = 0
+    first_frame = True
+    lost_time = None                    # When the connection was lost
+    retry_delay = RECONNECT_MIN_DELAY
+
+    # Last decoded frame (patched in place by delta messages)
+    frame_buffer = None
+
+    # Idle content: when it started, the frame it fades out and the next step
+    idle_start = None
+    idle_last = None
+    idle_next = None
+
+    # Optional playout buffer
+    playout = None
+    stats_timestamp = time.time()
 
-    # Pre-calculate the payload size
-    payload_size = struct.calcsize(">L")
-    
     # Main client loop
     connected = False
     running = True
@@ -63,86 +343,175 @@ def main():
                 if DEBUG:
                     print("Connecting to " + str(HOST) + ":" + 
                             str(PORT) + "...")
-                client_socket = socket.socket(socket.AF_INET, 
-                                                socket.SOCK_STREAM)
-                client_socket.connect((HOST, PORT))
+                client_socket = connect(HOST, PORT)
+                reader = protocol.MessageReader(client_socket)
+                last_data_time = time.time()
+                frame_buffer = None
+                if PLAYOUT:
+                    playout = PlayoutBuffer(PLAYOUT_MIN_DELAY,
+                                            PLAYOUT_MAX_DELAY,
+                                            PLAYOUT_JITTER_FACTOR,
+                                            PLAYOUT_MAX_FRAMES)
                 if DEBUG:
                     print("Connected!")
                 connected = True
+                retry_delay = RECONNECT_MIN_DELAY
+
+            # Back off exponentially while the server is unreachable
             except socket.error as e:
                 print("Error: Could not connect to server")
-                time.sleep(1.0)
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, RECONNECT_MAX_DELAY)
                 connected = False
 
-        # Wait for message from server and respond with ack
+        # Wait for message from server and respond with telemetry
         else:
-            client_socket.settimeout(SOCKET_TIMEOUT)
-            data = b""
+            img = None
             try:
+
+                # In playout mode or while idle, only wait for data until a
+                # frame or the next idle step is due
+                if (playout is None and idle_next is None) or \
+                        wait_for_data(client_socket, playout, idle_next):
                 
-                # Receive message size header
-                timestamp = time.time()
-                while len(data) < payload_size:
-                    if time.time() - timestamp >= SOCKET_TIMEOUT:
-                        raise RuntimeError("Timed out waiting for data")
-                    data += client_socket.recv(4096)
-
-                # Parse the received data
-                packed_msg_size = data[:payload_size]
-                data = data[payload_size:]
-                msg_size = struct.unpack(">L", packed_msg_size)[0]
-
-                # Receive payload
-                timestamp = time.time()
-                while len(data) < msg_size:
-                    if time.time() - timestamp >= SOCKET_TIMEOUT:
-                        raise RuntimeError("Timed out waiting for data")
-                    data += client_socket.recv(4096)
-
-                # Parse the payload
-                frame_data = data[:msg_size]
-                data = data[msg_size:]
-
-                # Uncompress the image
-                img = pickle.loads(frame_data, 
-                                        fix_imports=True, 
-                                        encoding='bytes')
-                img = cv2.imdecode(img, cv2.IMREAD_COLOR)
-
-                # Send keepalive message back to server
-                client_socket.sendall(bytes(KEEPALIVE, 'UTF-8'))
+                    # Receive next message, answer clock sync requests now
+                    payload = reader.read()
+                    last_data_time = time.time()
+                    if payload[0] == protocol.SYNC:
+                        server_time = protocol.SYNC_MSG.unpack_from(payload)[1]
+                        client_socket.sendall(
+                            protocol.pack_sync_reply(server_time, time.time()))
+                        continue
+                    recv_time = time.time()
+                    total_dropped = dropped
+                    if playout is not None:
+                        total_dropped += playout.dropped
+
+                    # No face for this display: answer, then fade out the
+                    # last frame on screen (buffered frames are not shown)
+                    if payload[0] == protocol.IDLE:
+                        client_socket.sendall(protocol.pack_telemetry(0,
+                                                                recv_time,
+                                                                0.0,
+                                                                shown_id,
+                                                                shown_time,
+                                                                render_time,
+                                                                total_dropped))
+                        if idle_start is None:
+                            if DEBUG:
+                                print("Idle")
+                            idle_start = recv_time
+                            idle_last = surface.copy()
+                            idle_next = recv_time
+                            if playout is not None:
+                                playout.clear()
+                        continue
+                    idle_start = None
+                    idle_last = None
+                    idle_next = None
+
+                    # Patch the last frame with a delta's tiles (on a copy if
+                    # the playout buffer may still hold the last frame)
+                    start = time.perf_counter()
+                    if payload[0] == protocol.DELTA:
+                        (frame_id, capture_time, width, height, tile,
+                            tile_format, positions, data) = \
+                            protocol.unpack_delta(payload)
+                        unchanged = not positions
+                        if playout is not None and frame_buffer is not None \
+                                and not unchanged:
+                            frame_buffer = frame_buffer.copy()
+                        img = patch(frame_buffer, positions, tile, tile_format,
+                                    data, width, height)
+
+                    # Or uncompress a whole image
+                    else:
+                        frame_id, capture_time, width, height, jpg = \
+                            protocol.unpack_frame(payload)
+                        unchanged = False
+                        img = decode(jpg, width, height)
+                        frame_buffer = img
+                    decode_time = time.perf_counter() - start
+
+                    # Tell the server, so it sends a keyframe next
+                    if img is None:
+                        dropped += 1
+                        frame_buffer = None
+                        client_socket.sendall(protocol.pack_nack(frame_id))
+                        continue
+
+                    # Nothing changed, nothing to show
+                    elif unchanged:
+                        img = None
+
+                    # Hand the frame to the playout buffer (late ones dropped)
+                    elif playout is not None:
+                        playout.push(frame_id, capture_time, recv_time, img)
+                        img = None
+
+                    # Send telemetry back to server (doubles as keepalive)
+                    client_socket.sendall(protocol.pack_telemetry(frame_id, 
+                                                                recv_time, 
+                                                                decode_time, 
+                                                                shown_id, 
+                                                                shown_time, 
+                                                                render_time, 
+                                                                total_dropped))
+
+                # Nothing from the server for too long
+                elif time.time() - last_data_time >= SOCKET_TIMEOUT:
+                    raise socket.timeout("timed out")
 
             # Try reconnecting if we lose the connection
             except socket.timeout as e:
                 print("Socket timeout:", str(e))
+                client_socket.close()
                 connected = False
+                lost_time = time.time()
                 continue
-            except socket.error as e:
+            except (socket.error, ValueError) as e:
                 print("Socket error:", str(e))
+                client_socket.close()
                 connected = False
+                lost_time = time.time()
                 continue
-            except RuntimeError as e:
-                print("Runtime error:", str(e))
-                connected = False
+
+            # Draw the next step of the idle content
+            if idle_next is not None and time.time() >= idle_next:
+                idle_next = show_idle(surface, idle_last, idle_image,
+                                        idle_start)
+                pygame.display.update()
+
+            # Take the newest due frame from the playout buffer
+            if playout is not None:
+                if DEBUG and time.time() - stats_timestamp >= STATS_INTERVAL:
+                    stats_timestamp = time.time()
+                    print(playout.report())
+                due = playout.pop(time.time())
+                if due is not None:
+                    frame_id, img = due
+
+            # Skip frames that could not be decoded (or none due)
+            if img is None:
                 continue
+            render_start = time.perf_counter()
             
-            # Resize, rotate, and flip image if requested
-            img = cv2.resize(img, DISPLAY_RES, interpolation=cv2.INTER_LINEAR)
-            if ROTATION == 90:
-                img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
-            elif ROTATION == 180:
-                img = cv2.rotate(img, cv2.ROTATE_180)
-            elif ROTATION == 270:
-                img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOWISE)
-            if not MIRROR:
-                img = cv2.flip(img, 1)
-
             # Draw image on surface
-            frame = pygame.surfarray.make_surface(img)
-            surface.blit(frame, (0,0))
+            show(surface, img)
 
             # Draws the surface object to the screen
             pygame.display.update()
+            shown_id = frame_id
+            shown_time = time.time()
+            render_time = time.perf_counter() - render_start
+            if DEBUG and first_frame:
+                print("First frame shown {:.2f} s after start".format(
+                        shown_time - start_time))
+            first_frame = False
+            if DEBUG and lost_time is not None:
+                print("Recovered {:.2f} s after losing the connection".format(
+                        shown_time - lost_time))
+            lost_time = None
 
     # Quite and close the connection if all else fails
     client_socket.close()
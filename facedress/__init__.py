@@ -0,0 +1,8 @@
+"""
+Shared helpers for the HyperPixel dress server, client, and test scripts.
+
+Modules are imported individually (e.g. `from facedress import mask`) so that
+the Pi Zero client only pays for what it uses.
+
+License: Apache-2.0
+"""
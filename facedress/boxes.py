@@ -0,0 +1,63 @@
+"""
+Bounding box post-processing
+
+Edge Impulse results are dicts with 'label', 'value', 'x', 'y', 'width' and
+'height'. These helpers map them between image resolutions and turn them into
+the square sub-image regions sent to the displays. Regions are tuples of
+(sort key, x0, y0, x1, y1) in capture_res pixels, best first.
+
+License: Apache-2.0
+"""
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Map boxes found in an image of size from_res, whose top-left corner sits at
+# offset in the target image and which covers region_res pixels of it
+def scale_boxes(bboxes, from_res, region_res, offset=(0, 0)):
+    scale_x = region_res[0] / from_res[0]
+    scale_y = region_res[1] / from_res[1]
+    scaled = []
+    for bbox in bboxes:
+        scaled.append({'label': bbox.get('label'),
+                        'value': bbox['value'],
+                        'x': offset[0] + bbox['x'] * scale_x,
+                        'y': offset[1] + bbox['y'] * scale_y,
+                        'width': bbox['width'] * scale_x,
+                        'height': bbox['height'] * scale_y})
+    return scaled
+
+# Clamp a square of side wh centered on (center_x, center_y) to the frame
+def _square(center_x, center_y, wh, frame_res):
+    x0 = int(max(center_x - (wh / 2), 0))
+    y0 = int(max(center_y - (wh / 2), 0))
+    x1 = int(min(x0 + wh, frame_res[0]))
+    y1 = int(min(y0 + wh, frame_res[1]))
+    return x0, y0, x1, y1
+
+# Fixed size squares around box centers, sorted by value (for FOMO centroids)
+def fixed_regions(bboxes, threshold, size, frame_res):
+    regions = []
+    for bbox in bboxes:
+        if bbox['value'] >= threshold:
+            center_x = int(bbox['x'] + (bbox['width'] / 2))
+            center_y = int(bbox['y'] + (bbox['height'] / 2))
+            regions.append((bbox['value'],) + 
+                            _square(center_x, center_y, size, frame_res))
+    return sorted(regions, reverse=True)
+
+# Squares around boxes grown by box_increase, sorted by area (for SSD boxes)
+def scaled_regions(bboxes, threshold, box_increase, frame_res):
+    regions = []
+    for bbox in bboxes:
+        if bbox['value'] >= threshold:
+            center_x = int(bbox['x'] + (bbox['width'] / 2))
+            center_y = int(bbox['y'] + (bbox['height'] / 2))
+            new_wh = int(max(bbox['width'], bbox['height']) * (1 + box_increase))
+            regions.append((new_wh ** 2,) + 
+                            _square(center_x, center_y, new_wh, frame_res))
+    return sorted(regions, reverse=True)
+
+# Square region of the given size in the center of the frame
+def center_region(size, frame_res):
+    return (0,) + _square(frame_res[0] / 2, frame_res[1] / 2, size[0], frame_res)
@@ -0,0 +1,199 @@
+"""
+FOMO/SSD model cascade
+
+FOMO is fast but only reports face centroids. MobileNet-SSD gives proper box
+sizes but is several times slower. The cascade runs FOMO on every frame and
+runs SSD when it is due (every ssd_interval frames), or when FOMO is unsure of
+a detection (value inside ambiguous_range). It never runs SSD more often than
+the FPS budget allows. FOMO positions are combined with the most recent SSD
+sizes, and SSD detections that FOMO missed are added.
+
+The mode can be switched between frames ("fomo", "ssd" or "cascade") without
+reloading anything, as both models stay loaded.
+
+License: Apache-2.0
+"""
+
+import math, time
+
+from facedress import boxes
+
+# Available detection modes
+MODES = ("fomo", "ssd", "cascade")
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Inference count and latency for one model
+class ModelStats:
+
+    # Constructor
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+        self.max_time = 0.0
+        self.avg_time = 0.0             # Exponential moving average
+
+    # Record one inference
+    def add(self, seconds):
+        self.count += 1
+        self.total_time += seconds
+        self.last_time = seconds
+        self.max_time = max(self.max_time, seconds)
+        if self.count == 1:
+            self.avg_time = seconds
+        else:
+            self.avg_time = 0.9 * self.avg_time + 0.1 * seconds
+
+    def __str__(self):
+        mean = self.total_time / self.count if self.count > 0 else 0.0
+        return "{}: {} runs, mean {:.1f} ms, max {:.1f} ms".format(
+                self.name, self.count, mean * 1000, self.max_time * 1000)
+
+# Plain full-frame inference on the small (model) stream
+class FullFrameDetector:
+
+    # Constructor
+    def __init__(self, runner, capture_res, resize_res, threshold):
+        self.runner = runner
+        self.capture_res = capture_res
+        self.resize_res = resize_res
+        self.threshold = threshold
+        self.last_result = None
+
+    # Perform inference, return boxes over threshold in capture_res pixels
+    def detect(self, frame):
+        features, cropped = self.runner.get_features_from_image(frame.small)
+        res = self.runner.classify(features)
+        self.last_result = res
+        found = [b for b in res['result']['bounding_boxes']
+                    if b['value'] >= self.threshold]
+        return boxes.scale_boxes(found, self.resize_res, self.capture_res)
+
+# Runs a fast and an accurate detector within a frame time budget
+class Cascade:
+
+    # Constructor
+    def __init__(self, fomo, ssd, mode="cascade", fps_budget=10.0,
+                    ssd_interval=10, ambiguous_range=(0.4, 0.7),
+                    default_size=240):
+        self.fomo = fomo                    # Detector with detect(frame)
+        self.ssd = ssd                      # Detector with detect(frame)
+        self.mode = mode
+        self.fps_budget = fps_budget        # Frames per second to stay above
+        self.ssd_interval = ssd_interval    # Run SSD at least this often
+        self.ambiguous_range = ambiguous_range
+        self.default_size = default_size    # Face size until SSD measures one
+        self.stats = {"fomo": ModelStats("fomo"), "ssd": ModelStats("ssd")}
+        self.frame_time = 0.0               # Average frame time without SSD
+        self.ssd_time = 0.0                 # SSD time spent on current frame
+        self.ssd_boxes = []
+        self.last_ssd = None
+        self.num_frames = 0
+        self.last_result = None
+
+    # Switch mode between frames
+    def set_mode(self, mode):
+        if mode not in MODES:
+            raise ValueError("Unknown mode: " + str(mode))
+        self.mode = mode
+
+    # Tell the cascade how long the whole frame took
+    def frame_done(self, seconds):
+        seconds = max(seconds - self.ssd_time, 0.0)
+        if self.frame_time == 0.0:
+            self.frame_time = seconds
+        else:
+            self.frame_time = 0.9 * self.frame_time + 0.1 * seconds
+
+    # Run a detector and record its latency
+    def _run(self, name, detector, frame):
+        start = time.perf_counter()
+        found = detector.detect(frame)
+        self.stats[name].add(time.perf_counter() - start)
+        self.last_result = detector.last_result
+        return found
+
+    # Fewest frames between SSD runs that keeps the average FPS within budget
+    def _min_ssd_spacing(self):
+        ssd_time = self.stats["ssd"].avg_time
+        if self.fps_budget <= 0 or ssd_time == 0.0:
+            return 1
+        slack = (1.0 / self.fps_budget) - self.frame_time
+        if slack <= 0:
+            return None
+        return max(1, int(math.ceil(ssd_time / slack)))
+
+    # Decide whether SSD should look at this frame
+    def _want_ssd(self, fomo_boxes):
+        if self.last_ssd is None:
+            return True
+        since = self.num_frames - self.last_ssd
+        spacing = self._min_ssd_spacing()
+        if spacing is None or since < spacing:
+            return False
+        if since >= self.ssd_interval:
+            return True
+        low, high = self.ambiguous_range
+        for bbox in fomo_boxes:
+            if low <= bbox['value'] < high:
+                return True
+        return len(fomo_boxes) != len(self.ssd_boxes)
+
+    # Give each FOMO centroid the size of the nearest SSD box (or the default)
+    def _combine(self, fomo_boxes, ssd_boxes, ssd_fresh):
+        combined = []
+        unmatched = list(ssd_boxes)
+        for bbox in fomo_boxes:
+            center_x = bbox['x'] + bbox['width'] / 2
+            center_y = bbox['y'] + bbox['height'] / 2
+            size = (self.default_size, self.default_size)
+            value = bbox['value']
+            for ssd_box in unmatched:
+                if abs(center_x - (ssd_box['x'] + ssd_box['width'] / 2)) < ssd_box['width'] and \
+                        abs(center_y - (ssd_box['y'] + ssd_box['height'] / 2)) < ssd_box['height']:
+                    size = (ssd_box['width'], ssd_box['height'])
+                    value = max(value, ssd_box['value'])
+                    unmatched.remove(ssd_box)
+                    break
+            else:
+
+                # SSD just looked and disagrees with an unsure FOMO detection
+                if ssd_fresh and value < self.ambiguous_range[1]:
+                    continue
+            combined.append({'label': bbox.get('label'),
+                                'value': value,
+                                'x': center_x - size[0] / 2,
+                                'y': center_y - size[1] / 2,
+                                'width': size[0],
+                                'height': size[1]})
+
+        # Faces only SSD found this frame
+        if ssd_fresh:
+            combined.extend(unmatched)
+        return combined
+
+    # Detect faces in a frame, boxes in capture_res pixels
+    def detect(self, frame):
+        self.num_frames += 1
+        self.ssd_time = 0.0
+        if self.mode == "fomo":
+            return self._run("fomo", self.fomo, frame)
+        if self.mode == "ssd":
+            return self._run("ssd", self.ssd, frame)
+
+        # Cascade: FOMO every frame, SSD when needed and affordable
+        fomo_boxes = self._run("fomo", self.fomo, frame)
+        ssd_fresh = self._want_ssd(fomo_boxes)
+        if ssd_fresh:
+            self.ssd_boxes = self._run("ssd", self.ssd, frame)
+            self.ssd_time = self.stats["ssd"].last_time
+            self.last_ssd = self.num_frames
+        return self._combine(fomo_boxes, self.ssd_boxes, ssd_fresh)
+
+    # One line summary of inference counts and latencies
+    def report(self):
+        return "Mode: " + self.mode + " | " + str(self.stats["fomo"]) + \
+                " | " + str(self.stats["ssd"])
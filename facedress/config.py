@@ -0,0 +1,184 @@
+"""
+Runtime configuration updates
+
+Settings can be changed while the server runs, by editing a JSON file (checked
+for a new modification time every poll_interval seconds) and/or by sending one
+JSON object per line to a control socket on localhost, for example:
+
+    echo '{"threshold": 0.5, "jpeg_quality": 80}' | nc -q1 localhost 8485
+
+Every update is checked against the type of the current value (ints are fine
+for floats, lists for tuples of the same length) and any extra checks, then
+queued. The frame loop collects queued updates between frames with pending(),
+so a frame never sees half an update. The control socket answers each line
+with a JSON object: {"ok": true, "settings": {...}} or {"ok": false,
+"error": "..."}. An empty object just returns the current settings.
+
+The control socket also runs commands given to the constructor. A request
+with a "command" key calls the function of that name with the other keys as
+keyword arguments and replies {"ok": true, "result": ...}, for example:
+
+    echo '{"command": "profile", "seconds": 10}' | nc -q1 localhost 8485
+
+License: Apache-2.0
+"""
+
+import os, json, queue, socket, threading, time
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Convert a new value to the type of the current one (ValueError if it can't)
+def coerce(name, current, value):
+    if current is None or value is None:
+        return value
+    if isinstance(current, bool):
+        if isinstance(value, bool):
+            return value
+    elif isinstance(current, float):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    elif isinstance(current, tuple):
+        if isinstance(value, (list, tuple)) and len(value) == len(current):
+            return tuple(coerce(name, c, v) for c, v in zip(current, value))
+    elif isinstance(value, type(current)) and not isinstance(value, bool):
+        return value
+    raise ValueError("Bad value for " + name + ": " + repr(value))
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Collects validated setting changes from a file and/or a control socket
+class ConfigUpdates:
+
+    # Constructor: settings maps names to current values, checks maps names to
+    # functions that return True for acceptable values, commands maps names to
+    # functions the control socket can call
+    def __init__(self, settings, checks=None, path=None, port=None,
+                    host="127.0.0.1", poll_interval=1.0, commands=None):
+        self.settings = dict(settings)
+        self.checks = checks or {}
+        self.commands = commands or {}
+        self.path = path
+        self.port = port
+        self.host = host
+        self.poll_interval = poll_interval
+        self.q = queue.Queue()
+        self.mutex = threading.Lock()
+        self.running = False
+        self.server_socket = None
+
+    # Check a dict of changes, queue them and return the new settings
+    def submit(self, changes):
+        if not isinstance(changes, dict):
+            raise ValueError("Expected a JSON object")
+        with self.mutex:
+            checked = {}
+            for name, value in changes.items():
+                if name not in self.settings:
+                    raise ValueError("Unknown setting: " + str(name))
+                value = coerce(name, self.settings[name], value)
+                check = self.checks.get(name)
+                if check is not None and not check(value):
+                    raise ValueError("Bad value for " + name + ": " +
+                                        repr(value))
+                checked[name] = value
+            changed = {name: value for name, value in checked.items()
+                        if value != self.settings[name]}
+            self.settings.update(changed)
+            if changed:
+                self.q.put(changed)
+            return dict(self.settings)
+
+    # All changes queued since the last call, merged (empty if none)
+    def pending(self):
+        changes = {}
+        while True:
+            try:
+                changes.update(self.q.get_nowait())
+            except queue.Empty:
+                return changes
+
+    # Start watching the file and listening on the control socket
+    def start(self):
+        self.running = True
+        if self.path is not None:
+            threading.Thread(target=self._watch_file, daemon=True).start()
+        if self.port is not None:
+            server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+            # Keep running without the control socket if the port is taken
+            try:
+                server_socket.bind((self.host, self.port))
+                server_socket.listen(4)
+            except OSError as e:
+                server_socket.close()
+                print("ERROR: Could not open control port " + str(self.port) +
+                        ", live config over the socket is disabled:", str(e))
+                return
+            self.server_socket = server_socket
+            threading.Thread(target=self._serve, daemon=True).start()
+
+    # Stop the watcher threads
+    def stop(self):
+        self.running = False
+        if self.server_socket is not None:
+            self.server_socket.close()
+            self.server_socket = None
+
+    # Reload the file whenever its modification time changes
+    def _watch_file(self):
+        mtime = None
+        while self.running:
+            try:
+                new_mtime = os.stat(self.path).st_mtime
+                if new_mtime != mtime:
+                    mtime = new_mtime
+                    with open(self.path) as f:
+                        self.submit(json.load(f))
+            except FileNotFoundError:
+                mtime = None
+            except (OSError, ValueError) as e:
+                print("ERROR: Could not apply " + self.path + ":", str(e))
+            time.sleep(self.poll_interval)
+
+    # Answer one JSON object per line on control connections
+    def _serve(self):
+        while self.running:
+            try:
+                conn, _ = self.server_socket.accept()
+            except OSError:
+                return
+            try:
+                with conn, conn.makefile("rwb") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        f.write(self.handle(line) + b"\n")
+                        f.flush()
+            except OSError:
+                continue
+
+    # Run a command request, return its result
+    def run_command(self, request):
+        args = dict(request)
+        name = args.pop("command")
+        if name not in self.commands:
+            raise ValueError("Unknown command: " + str(name))
+        try:
+            return self.commands[name](**args)
+        except TypeError as e:
+            raise ValueError("Bad arguments for " + str(name) + ": " + str(e))
+
+    # Handle one control request, return the encoded reply
+    def handle(self, line):
+        try:
+            request = json.loads(line)
+            if isinstance(request, dict) and "command" in request:
+                reply = {"ok": True, "result": self.run_command(request)}
+            else:
+                reply = {"ok": True, "settings": self.submit(request)}
+        except ValueError as e:
+            reply = {"ok": False, "error": str(e)}
+        return json.dumps(reply).encode()
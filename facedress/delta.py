@@ -0,0 +1,118 @@
+"""
+Tile-based delta coding of display frames
+
+Consecutive frames of a display often differ in only a small part of the
+image (a still face, the default center crop of a quiet scene). Instead of a
+full JPEG, the server can send only the tiles that changed: the frame is cut
+into square tiles, and a tile is sent if its mean absolute difference to what
+the display already has exceeds a threshold. Changed tiles are packed into one
+atlas image (rows of up to protocol.ATLAS_COLUMNS tiles) that is compressed
+as a single JPEG (or sent raw), which keeps the per-image JPEG overhead and the
+number of decoder calls on the client down. The tile size is a multiple of 16
+so tiles line up with JPEG blocks and do not bleed into each other.
+
+The reference is what was last sent for each tile, so slow changes add up
+until they are sent. As messages arrive in order over TCP, the display's
+frame buffer always matches the reference when a delta arrives. Keyframes
+(full JPEG frames) are sent first, when the frame size changes, when most
+tiles changed anyway, every keyframe_interval frames to wash out JPEG losses,
+and after the display reports a frame it could not decode (its frame buffer no
+longer matches the reference).
+
+License: Apache-2.0
+"""
+
+import numpy as np
+import cv2
+
+from facedress import protocol
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Pack the given tiles of an image into an atlas (unused space is black)
+def make_atlas(img, positions, tile):
+    width, height = protocol.atlas_size(len(positions), tile)
+    atlas = np.zeros((height, width) + img.shape[2:], dtype=img.dtype)
+    for ax, ay, x, y, w, h in protocol.atlas_tiles(positions, tile,
+                                                    img.shape[1], img.shape[0]):
+        atlas[ay:ay + h, ax:ax + w] = img[y:y + h, x:x + w]
+    return atlas
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Decides per frame between a keyframe and the list of changed tiles
+class DeltaEncoder:
+
+    # Constructor
+    def __init__(self,
+                    tile=32,
+                    threshold=5.0,
+                    keyframe_interval=60,
+                    max_fraction=0.6):
+        self.tile = tile
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.max_fraction = max_fraction
+        self.reference = None
+        self.keyframe_due = False
+        self.since_keyframe = 0
+        self.keyframes = 0
+        self.deltas = 0
+        self.tiles_sent = 0
+
+    # Force a keyframe next (safe to call from the client thread while the main
+    # thread encodes)
+    def reset(self):
+        self.keyframe_due = True
+
+    # Mean absolute difference of every tile, shape (rows, columns)
+    def _tile_diff(self, img):
+        diff = cv2.absdiff(img, self.reference)
+        height, width = diff.shape[:2]
+        rows = -(-height // self.tile)
+        columns = -(-width // self.tile)
+        if rows * self.tile != height or columns * self.tile != width:
+            diff = cv2.copyMakeBorder(diff, 0, rows * self.tile - height, 0,
+                                        columns * self.tile - width,
+                                        cv2.BORDER_CONSTANT, value=0)
+        means = cv2.resize(diff, (columns, rows), interpolation=cv2.INTER_AREA)
+        if means.ndim == 3:
+            return means.mean(axis=2)
+        return means
+
+    # Return the (x, y) pixel positions of the changed tiles, or None if a
+    # keyframe should be sent. Updates the reference either way.
+    def encode(self, img):
+        if self.keyframe_due or self.reference is None or \
+                self.reference.shape != img.shape or \
+                self.since_keyframe + 1 >= self.keyframe_interval:
+            return self._keyframe(img)
+        tile_diff = self._tile_diff(img)
+        changed = np.argwhere(tile_diff > self.threshold)
+        if len(changed) > self.max_fraction * tile_diff.size:
+            return self._keyframe(img)
+        positions = [(int(col) * self.tile, int(row) * self.tile)
+                        for row, col in changed]
+        for x, y in positions:
+            self.reference[y:y + self.tile, x:x + self.tile] = \
+                img[y:y + self.tile, x:x + self.tile]
+        self.since_keyframe += 1
+        self.deltas += 1
+        self.tiles_sent += len(positions)
+        return positions
+
+    # Take the whole image as the new reference
+    def _keyframe(self, img):
+        self.keyframe_due = False
+        self.reference = img.copy()
+        self.since_keyframe = 0
+        self.keyframes += 1
+        return None
+
+    # One line summary
+    def report(self):
+        return "Delta: {} keyframes, {} deltas ({:.1f} tiles each)".format(
+                self.keyframes, self.deltas,
+                self.tiles_sent / max(self.deltas, 1))
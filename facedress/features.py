@@ -0,0 +1,65 @@
+"""
+Feature helpers
+
+Vectorized parsing of Edge Impulse feature files (comma separated, either
+decimal or 0xRRGGBB hex values, as copied from the Studio).
+
+License: Apache-2.0
+"""
+
+import numpy as np
+
+# Value of each ASCII hex digit, and which bytes are hex digits at all
+_HEX_VALUES = np.zeros(256, dtype=np.int64)
+_HEX_VALID = np.zeros(256, dtype=bool)
+for i, c in enumerate("0123456789abcdef"):
+    for ch in (c, c.upper()):
+        _HEX_VALUES[ord(ch)] = i
+        _HEX_VALID[ord(ch)] = True
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Parse comma separated hex values (with or without 0x) into an int64 array.
+# Works on the raw bytes: each value is one run of digits, and every digit
+# contributes digit * 16^(digits after it in the run).
+def parse_hex(data):
+    if isinstance(data, str):
+        data = data.encode()
+    data = data.strip().rstrip(b",")
+    chars = np.frombuffer(data, dtype=np.uint8)
+
+    # Digits, ignoring the '0' of each "0x" prefix
+    is_digit = _HEX_VALID[chars]
+    prefix = (chars == ord("x")) | (chars == ord("X"))
+    is_digit[:-1] &= ~prefix[1:]
+
+    # Find the runs of digits (one per value)
+    idx = np.flatnonzero(is_digit)
+    starts = np.flatnonzero(np.diff(idx) != 1) + 1
+    starts = np.concatenate(([0], starts))
+    lengths = np.diff(np.concatenate((starts, [len(idx)])))
+    if len(starts) != data.count(b",") + 1:
+        raise ValueError("Could not parse hex features")
+
+    # Digits remaining in the run after each digit
+    ends = starts + lengths - 1
+    places = np.repeat(ends, lengths) - np.arange(len(idx))
+
+    # Sum up the digit contributions for each value
+    contrib = _HEX_VALUES[chars[idx]] << (4 * places)
+    return np.add.reduceat(contrib, starts)
+
+# Parse a feature file's contents into a float array
+def parse_features(data):
+    if isinstance(data, bytes):
+        data = data.decode("utf8")
+    data = data.strip().rstrip(",")
+    if "0x" in data[:32] or "0X" in data[:32]:
+        return parse_hex(data).astype(np.float64)
+    return np.fromstring(data, dtype=np.float64, sep=",")
+
+# Read a feature file into a list of floats (ready for runner.classify)
+def load_features(path):
+    with open(path, "rb") as f:
+        return parse_features(f.read()).tolist()
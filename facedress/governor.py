@@ -0,0 +1,114 @@
+"""
+Frame-rate governor for the server loop
+
+Caps the loop at a target frame rate by sleeping until the next frame is due
+(deadlines advance by a fixed interval, so the rate does not drift with
+processing time). The rate drops to idle_fps when no clients are connected,
+and to static_fps while the scene is not changing: fewer than static_fraction
+of the pixels (sampled from the model input frame) changed by more than
+static_threshold since the previous frame. Any motion brings the full rate
+back on the next frame. It also drops to static_fps while every display shows
+its own idle content (standby), as the loop then only has to notice a face.
+
+License: Apache-2.0
+"""
+
+import time
+
+import numpy as np
+
+# Governor states
+ACTIVE = "active"
+STATIC = "static"
+STANDBY = "standby"
+IDLE = "idle"
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Paces the capture loop
+class FrameGovernor:
+
+    # Constructor (a rate of 0 means no limit)
+    def __init__(self,
+                    target_fps,
+                    idle_fps=1.0,
+                    static_fps=5.0,
+                    static_threshold=24,
+                    static_frames=10,
+                    static_fraction=0.002,
+                    subsample=8):
+        self.set_rates(target_fps, idle_fps, static_fps)
+        self.static_threshold = static_threshold
+        self.static_frames = static_frames
+        self.static_fraction = static_fraction
+        self.subsample = subsample
+        self.state = ACTIVE
+        self.static_count = 0
+        self.last_thumb = None
+        self.last_time = None
+        self.slept = 0.0
+
+    # Change the frame rate limits
+    def set_rates(self, target_fps, idle_fps, static_fps):
+        self.rates = {ACTIVE: target_fps, STATIC: static_fps,
+                        STANDBY: static_fps, IDLE: idle_fps}
+
+    # Current frame rate limit
+    def rate(self):
+        return self.rates[self.state]
+
+    # Fraction of sampled pixels that changed since the previous frame
+    def _motion(self, img):
+        thumb = img[::self.subsample, ::self.subsample].astype(np.int16)
+        motion = None
+        if self.last_thumb is not None and self.last_thumb.shape == thumb.shape:
+            diff = np.abs(thumb - self.last_thumb).max(axis=2)
+            motion = np.count_nonzero(diff > self.static_threshold) / diff.size
+        self.last_thumb = thumb
+        return motion
+
+    # Pick the rate for the next frame from the client count, how many of them
+    # get frames (None if all do) and scene motion
+    def update(self, frame, num_clients, num_streaming=None):
+        motion = self._motion(frame.small)
+        if motion is not None and motion < self.static_fraction:
+            self.static_count += 1
+        else:
+            self.static_count = 0
+        if num_clients == 0:
+            self.state = IDLE
+        elif num_streaming == 0:
+            self.state = STANDBY
+        elif self.static_count >= self.static_frames:
+            self.state = STATIC
+        else:
+            self.state = ACTIVE
+
+    # Sleep until the next frame is due. If wake (a threading.Event) is given,
+    # setting it ends the wait early, e.g. when a client connects.
+    def wait(self, wake=None):
+        now = time.perf_counter()
+        rate = self.rate()
+        if rate <= 0 or self.last_time is None:
+            self.last_time = now
+            return
+        due = self.last_time + 1.0 / rate
+        if due > now:
+            if wake is None:
+                time.sleep(due - now)
+            elif wake.wait(due - now):
+                wake.clear()
+                due = time.perf_counter()
+            self.slept += due - now
+
+        # Keep the schedule unless we fell a whole interval behind
+        if now - due < 1.0 / rate:
+            self.last_time = due
+        else:
+            self.last_time = now
+
+    # One line summary
+    def report(self):
+        return "Governor: {} at {:g} fps max, slept {:.1f} s".format(
+                self.state, self.rate(), self.slept)
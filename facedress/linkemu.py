@@ -0,0 +1,343 @@
+"""
+Link emulator for benchmarking the display transport on one machine
+
+A local proxy that sits between the server and a display and shapes the
+traffic like the USB gadget Ethernet link between a Pi 4 and a Pi Zero:
+bandwidth cap, one-way latency, jitter, reordering and packet loss. Connect
+the display (or a bench) to the emulator's address instead of the server.
+
+Both directions share one bandwidth budget, as USB 2.0 is a half-duplex bus.
+Streams are cut into MTU-sized segments and each segment is given a delivery
+time: when the link is free again plus its transmission time, the latency and
+a random (exponential) jitter. In TCP mode bytes are delivered in order, so a
+late segment holds back the ones behind it, and a lost segment arrives the
+recovery time later (TCP's fast retransmit takes about a round trip, a lost
+last segment waits for the 200 ms minimum retransmission timeout). In UDP mode
+datagrams are really reordered and dropped. A bounded buffer in each
+direction pushes back on the sender like a full socket buffer would.
+
+Give a seed to get the same random link behavior on every run.
+
+License: Apache-2.0
+"""
+
+import time, heapq, random, socket, threading
+
+# Link profiles (rate in bits/s, times in seconds)
+PROFILES = {
+    "loopback": {"rate": 0, "latency": 0.0},
+    "gadget": {"rate": 60e6, "latency": 0.0005, "jitter": 0.0002},
+    "gadget-busy": {"rate": 20e6, "latency": 0.002, "jitter": 0.002,
+                    "reorder": 0.01},
+    "gadget-lossy": {"rate": 60e6, "latency": 0.0005, "jitter": 0.0002,
+                        "reorder": 0.01, "loss": 0.005},
+}
+
+# Bytes added to each segment on the wire (Ethernet, IPv4, TCP with
+# timestamps, RNDIS framing)
+SEGMENT_OVERHEAD = 14 + 20 + 32 + 44
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Timing model of the link, shared by both directions
+class LinkModel:
+
+    # Constructor
+    def __init__(self,
+                    rate=60e6,
+                    latency=0.0005,
+                    jitter=0.0,
+                    reorder=0.0,
+                    loss=0.0,
+                    reorder_delay=0.002,
+                    recovery=0.02,
+                    seed=None):
+        self.rate = rate
+        self.latency = latency
+        self.jitter = jitter
+        self.reorder = reorder
+        self.loss = loss
+        self.reorder_delay = reorder_delay
+        self.recovery = recovery
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.free_time = 0.0            # When the link is done sending
+
+    # Delivery time of size bytes sent now in the given number of segments
+    # (IP fragments for a datagram), and whether any segment was lost or
+    # the data was reordered
+    def schedule(self, size, now, segments=1):
+        with self.lock:
+            start = max(now, self.free_time)
+            if self.rate > 0:
+                self.free_time = start + \
+                    (size + segments * SEGMENT_OVERHEAD) * 8 / self.rate
+            else:
+                self.free_time = start
+            when = self.free_time + self.latency
+            if self.jitter > 0:
+                when += self.random.expovariate(1.0 / self.jitter)
+            lost = self.random.random() < 1.0 - (1.0 - self.loss) ** segments
+            reordered = self.random.random() < self.reorder
+        if reordered:
+            when += self.reorder_delay
+        return when, lost, reordered
+
+# Sends data at its delivery time (one thread per direction)
+class _Delivery(threading.Thread):
+
+    # Constructor
+    def __init__(self, send, on_close, max_bytes):
+        threading.Thread.__init__(self, daemon=True)
+        self.send = send
+        self.on_close = on_close
+        self.max_bytes = max_bytes
+        self.heap = []                  # (delivery time, seq, data)
+        self.seq = 0
+        self.pending = 0
+        self.closed = False
+        self.failed = False
+        self.cond = threading.Condition()
+
+    # Queue data for delivery. When the buffer is full, wait for room (block)
+    # or drop the data. Returns False if the data was not queued.
+    def put(self, when, data, block=True):
+        with self.cond:
+            if block:
+                self.cond.wait_for(lambda: self.pending < self.max_bytes or
+                                            self.closed)
+            if self.closed or self.pending >= self.max_bytes:
+                return False
+            heapq.heappush(self.heap, (when, self.seq, data))
+            self.seq += 1
+            self.pending += len(data)
+            self.cond.notify_all()
+            return True
+
+    # Finish after delivering what is queued
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    # Thread loop
+    def run(self):
+        try:
+            while True:
+                with self.cond:
+                    self.cond.wait_for(lambda: self.heap or self.closed)
+                    if not self.heap:
+                        break
+                    delay = self.heap[0][0] - time.perf_counter()
+                    if delay > 0:
+                        self.cond.wait(delay)
+                        continue
+                    _, _, data = heapq.heappop(self.heap)
+                    self.pending -= len(data)
+                    self.cond.notify_all()
+                self.send(data)
+        except OSError:
+            self.failed = True
+        with self.cond:
+            self.closed = True
+            self.heap = []
+            self.cond.notify_all()
+        self.on_close(self)
+
+# Counters of one direction
+class LinkStats:
+
+    # Constructor
+    def __init__(self):
+        self.bytes = 0
+        self.segments = 0
+        self.lost = 0
+        self.reordered = 0
+
+    # One line summary
+    def __str__(self):
+        return "{:.1f} MB in {} segments, {} lost, {} reordered".format(
+                self.bytes / 1e6, self.segments, self.lost, self.reordered)
+
+# Proxy that shapes traffic between displays and the server
+class LinkEmulator:
+
+    # Constructor (target is the server's (host, port), model settings are
+    # passed to LinkModel, e.g. **PROFILES["gadget"]; listen port 0 picks a
+    # free port, see address)
+    def __init__(self,
+                    target,
+                    listen=("127.0.0.1", 0),
+                    mtu=1500,
+                    buffer=256 * 1024,
+                    udp=False,
+                    **model):
+        self.target = target
+        self.listen = listen
+        self.payload = mtu - 20 - (8 if udp else 32)
+        self.buffer = buffer
+        self.udp = udp
+        self.model = LinkModel(**model)
+        self.downstream = LinkStats()       # Server to display
+        self.upstream = LinkStats()         # Display to server
+        self.sock = None
+        self.running = False
+
+    # Address displays should connect to
+    @property
+    def address(self):
+        return self.sock.getsockname()
+
+    # Start accepting connections (or datagrams) in the background
+    def start(self):
+        if self.udp:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(self.listen)
+        self.running = True
+        if self.udp:
+            target = self._relay_udp
+        else:
+            self.sock.listen(5)
+            target = self._accept
+        threading.Thread(target=target, daemon=True).start()
+        return self
+
+    # Stop accepting (open connections end when either side closes)
+    def stop(self):
+        self.running = False
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+
+    # One line summary of both directions
+    def report(self):
+        return "Link: down " + str(self.downstream) + " | up " + \
+                str(self.upstream)
+
+    # Accept displays and connect each one to the server
+    def _accept(self):
+        while self.running:
+            try:
+                display, _ = self.sock.accept()
+            except OSError:
+                break
+            try:
+                server = socket.create_connection(self.target)
+            except OSError:
+                display.close()
+                continue
+            for sock in (display, server):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._connect(server, display)
+
+    # Forward both directions of a TCP connection. A direction that ends
+    # normally passes the end on (half close), one that fails resets the
+    # whole connection; sockets are closed when both directions are done.
+    def _connect(self, server, display):
+        done = []
+        lock = threading.Lock()
+
+        def on_close(delivery, dst):
+            with lock:
+                done.append(delivery)
+                finished = len(done) == 2
+            try:
+                if delivery.failed:
+                    server.shutdown(socket.SHUT_RDWR)
+                    display.shutdown(socket.SHUT_RDWR)
+                elif not finished:
+                    dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+            if finished:
+                server.close()
+                display.close()
+
+        for src, dst, stats in ((server, display, self.downstream),
+                                (display, server, self.upstream)):
+            delivery = _Delivery(dst.sendall,
+                                    lambda delivery, dst=dst:
+                                        on_close(delivery, dst),
+                                    self.buffer)
+            delivery.start()
+            threading.Thread(target=self._pipe, args=(src, delivery, stats),
+                                daemon=True).start()
+
+    # Cut one direction of a TCP stream into segments and deliver them in
+    # order
+    def _pipe(self, src, delivery, stats):
+        last = 0.0
+        try:
+            while True:
+                data = src.recv(self.payload)
+                if not data:
+                    break
+                when, lost, reordered = self.model.schedule(len(data),
+                                                        time.perf_counter())
+                if lost:
+                    when += self.model.recovery
+                    stats.lost += 1
+                if reordered:
+                    stats.reordered += 1
+                last = max(last, when)
+                stats.bytes += len(data)
+                stats.segments += 1
+                if not delivery.put(last, data):
+                    break
+        except OSError:
+            pass
+        delivery.close()
+
+    # Relay datagrams between the first display that sends one and the
+    # server. Datagrams that find the buffer full are dropped.
+    def _relay_udp(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.connect(self.target)
+        display = []
+        down = _Delivery(lambda data: self.sock.sendto(data, display[0]),
+                            lambda delivery: None, self.buffer)
+        up = _Delivery(server.send, lambda delivery: None, self.buffer)
+        down.start()
+        up.start()
+
+        def receive_down():
+            while self.running:
+                try:
+                    data = server.recv(65536)
+                except OSError:
+                    break
+                if display:
+                    self._datagram(data, down, self.downstream)
+        threading.Thread(target=receive_down, daemon=True).start()
+
+        while self.running:
+            try:
+                data, address = self.sock.recvfrom(65536)
+            except OSError:
+                break
+            if not display:
+                display.append(address)
+            self._datagram(data, up, self.upstream)
+        down.close()
+        up.close()
+        server.close()
+
+    # Deliver (or drop) one datagram
+    def _datagram(self, data, delivery, stats):
+        segments = max(1, -(-len(data) // self.payload))
+        when, lost, reordered = self.model.schedule(len(data),
+                                                    time.perf_counter(),
+                                                    segments)
+        stats.bytes += len(data)
+        stats.segments += segments
+        if reordered:
+            stats.reordered += 1
+        if lost or not delivery.put(when, data, block=False):
+            stats.lost += 1
@@ -0,0 +1,49 @@
+"""
+Circular display masking
+
+The HyperPixel 2" Round only shows the circle inscribed in its 480x480 frame.
+The client stretches every sub-image to fill the display, so the visible part of
+any sub-image is the ellipse inscribed in its bounding rectangle. Blacking out
+everything else before encoding means JPEG spends (almost) no bits on the
+corners.
+
+Masks are precomputed once per sub-image shape and cached.
+
+License: Apache-2.0
+"""
+
+import numpy as np
+import cv2
+
+# Cached masks (uint8, 255 inside the display circle), keyed by (height, width)
+_masks = {}
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Return the (cached) visible-area mask for an image of the given size
+def get_mask(height, width):
+    key = (height, width)
+    mask = _masks.get(key)
+    if mask is None:
+
+        # A pixel is visible if its center lies inside the inscribed ellipse
+        ys, xs = np.ogrid[0:height, 0:width]
+        ry = height / 2.0
+        rx = width / 2.0
+        dist = ((ys + 0.5 - ry) / ry) ** 2 + ((xs + 0.5 - rx) / rx) ** 2
+        mask = np.where(dist <= 1.0, 255, 0).astype(np.uint8)
+        mask.setflags(write=False)
+        _masks[key] = mask
+
+    return mask
+
+# Return a copy of the image with everything outside the display circle black.
+# The input is never modified, as sub-images are often views into the frame.
+def apply_mask(img):
+    mask = get_mask(img.shape[0], img.shape[1])
+    return cv2.bitwise_and(img, img, mask=mask)
+
+# Fraction of pixels that are visible for a given image size
+def visible_fraction(height, width):
+    return np.count_nonzero(get_mask(height, width)) / float(height * width)
@@ -0,0 +1,147 @@
+"""
+Playout (jitter) buffer for showing frames on a steady clock
+
+Frames are presented according to their capture timestamps instead of the
+moment they are decoded. A frame's play time is its capture time plus the
+smallest transit time seen recently (this absorbs the clock offset between
+server and client) plus a playout delay. The delay follows the measured
+arrival jitter (RFC 3550 style running estimate) times a safety factor,
+clamped to a configured range: a bigger factor gives smoother motion at the
+cost of latency. Frames that arrive after their play time are dropped rather
+than queued, and the buffer holds a bounded number of frames.
+
+All times are seconds and must come from one clock on the receiving side
+(e.g. time.time() for both arrival and presentation).
+
+License: Apache-2.0
+"""
+
+import collections
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Bounded buffer that releases frames at their play time
+class PlayoutBuffer:
+
+    # Constructor
+    def __init__(self,
+                    min_delay=0.02,
+                    max_delay=0.3,
+                    jitter_factor=3.0,
+                    max_frames=4,
+                    window=5.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.jitter_factor = jitter_factor
+        self.max_frames = max_frames
+        self.window = window
+        self.frames = collections.deque()   # (play time, id, capture, item)
+        self.delay = min_delay
+
+        # Minimum transit over the current and previous window
+        self.cur_min = None
+        self.prev_min = None
+        self.window_start = None
+
+        # Arrival and presentation jitter estimates
+        self.last_transit = None
+        self.jitter = 0.0
+        self.last_shown = None              # (present time, capture time)
+        self.display_jitter = 0.0
+
+        # Counters
+        self.presented = 0
+        self.late = 0
+        self.overflow = 0
+        self.skipped = 0
+
+    # Frames thrown away so far (late, buffer full, or overtaken)
+    @property
+    def dropped(self):
+        return self.late + self.overflow + self.skipped
+
+    # Track the transit floor over a sliding pair of windows
+    def _update_base(self, transit, arrival):
+        if self.window_start is None or arrival - self.window_start > self.window:
+            self.prev_min = self.cur_min
+            self.cur_min = transit
+            self.window_start = arrival
+        else:
+            self.cur_min = min(self.cur_min, transit)
+        if self.prev_min is None:
+            return self.cur_min
+        return min(self.cur_min, self.prev_min)
+
+    # Update the jitter estimate and the playout delay that follows it
+    def _update_delay(self, transit):
+        if self.last_transit is not None:
+            d = abs(transit - self.last_transit)
+            self.jitter += (d - self.jitter) / 16.0
+        self.last_transit = transit
+
+        # Grow the delay at once, shrink it slowly
+        target = self.jitter_factor * self.jitter
+        target = min(max(target, self.min_delay), self.max_delay)
+        if target > self.delay:
+            self.delay = target
+        else:
+            self.delay += (target - self.delay) / 32.0
+
+    # Add a frame, returns False if it arrived too late to be shown
+    def push(self, frame_id, capture_time, arrival, item):
+        transit = arrival - capture_time
+        base = self._update_base(transit, arrival)
+        self._update_delay(transit)
+        play_time = capture_time + base + self.delay
+        if play_time < arrival:
+            self.late += 1
+            return False
+        self.frames.append((play_time, frame_id, capture_time, item))
+        while len(self.frames) > self.max_frames:
+            self.frames.popleft()
+            self.overflow += 1
+        return True
+
+    # Drop all buffered frames (they are not shown)
+    def clear(self):
+        self.skipped += len(self.frames)
+        self.frames.clear()
+
+    # Play time of the next buffered frame (None if empty)
+    def next_time(self):
+        if not self.frames:
+            return None
+        return self.frames[0][0]
+
+    # Return (frame id, item) of the newest frame that is due, or None
+    def pop(self, now):
+        due = None
+        while self.frames and self.frames[0][0] <= now:
+            if due is not None:
+                self.skipped += 1
+            due = self.frames.popleft()
+        if due is None:
+            return None
+
+        # Presentation jitter: spacing on screen vs spacing at capture
+        _, frame_id, capture_time, item = due
+        if self.last_shown is not None:
+            d = abs((now - self.last_shown[0]) -
+                    (capture_time - self.last_shown[1]))
+            self.display_jitter += (d - self.display_jitter) / 16.0
+        self.last_shown = (now, capture_time)
+        self.presented += 1
+        return frame_id, item
+
+    # One line summary
+    def report(self):
+        return "Playout delay {:.1f} ms | arrival jitter {:.1f} ms | " \
+                "display jitter {:.1f} ms | shown {} | late {} | " \
+                "overflow {} | skipped {}".format(self.delay * 1000.0,
+                                                    self.jitter * 1000.0,
+                                                    self.display_jitter * 1000.0,
+                                                    self.presented,
+                                                    self.late,
+                                                    self.overflow,
+                                                    self.skipped)
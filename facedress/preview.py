@@ -0,0 +1,157 @@
+"""
+MJPEG preview over HTTP
+
+Serves the latest JPEG of each named stream as multipart/x-mixed-replace, which
+browsers show as live video. Open http://<pi>:<port>/ for a page with all
+streams, or /<name>.mjpg for one of them.
+
+The frame loop only hands over bytes it already has with publish() (a
+reference swap under a lock), so viewers cost it nothing. Each viewer has its
+own thread that sends at most max_fps frames per second and skips frames it
+could not keep up with, so a slow browser only slows itself. Streams that
+need extra work (like drawing boxes on the full frame) can ask wants() first
+and only do it while someone watches, at most max_fps times per second.
+
+License: Apache-2.0
+"""
+
+import time, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Multipart boundary
+BOUNDARY = b"frame"
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Latest frame of one stream
+class _Stream:
+
+    # Constructor
+    def __init__(self):
+        self.jpg = None
+        self.seq = 0
+        self.viewers = 0
+        self.last_wanted = 0.0
+
+# HTTP request handler (one thread per connection)
+class _Handler(BaseHTTPRequestHandler):
+
+    # Answer GET requests
+    def do_GET(self):
+        preview = self.server.preview
+        path = self.path.split("?")[0]
+        if path == "/":
+            self._send_index(preview.names())
+        elif path.endswith(".mjpg") and path[1:-5] in preview.names():
+            self._send_stream(preview, path[1:-5])
+        else:
+            self.send_error(404)
+
+    # Simple page showing every stream
+    def _send_index(self, names):
+        body = "<html><head><title>Preview</title></head><body>" + \
+                "".join('<figure style="display:inline-block">'
+                        '<img src="/{0}.mjpg"><figcaption>{0}</figcaption>'
+                        '</figure>'.format(name) for name in names) + \
+                "</body></html>"
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Send frames until the viewer goes away
+    def _send_stream(self, preview, name):
+        self.send_response(200)
+        self.send_header("Content-Type",
+                            "multipart/x-mixed-replace; boundary=" +
+                            BOUNDARY.decode())
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for jpg in preview.frames(name):
+                self.wfile.write(b"--" + BOUNDARY + b"\r\n"
+                                    b"Content-Type: image/jpeg\r\n"
+                                    b"Content-Length: " +
+                                    str(len(jpg)).encode() + b"\r\n\r\n")
+                self.wfile.write(jpg)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    # Keep the console quiet
+    def log_message(self, format, *args):
+        pass
+
+# HTTP server with the latest frame of each stream
+class PreviewServer:
+
+    # Constructor
+    def __init__(self, host, port, max_fps=5.0):
+        self.host = host
+        self.port = port
+        self.max_fps = max_fps
+        self.streams = {}
+        self.cond = threading.Condition()
+        self.httpd = None
+
+    # Start serving in a background thread
+    def start(self):
+        self.httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.preview = self
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    # Stop serving
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    # Names of the streams published so far
+    def names(self):
+        with self.cond:
+            return sorted(self.streams)
+
+    # Check if a stream has viewers and is due for a new frame
+    def wants(self, name):
+        with self.cond:
+            stream = self.streams.setdefault(name, _Stream())
+            now = time.perf_counter()
+            if stream.viewers == 0 or \
+                    now - stream.last_wanted < 1.0 / self.max_fps:
+                return False
+            stream.last_wanted = now
+            return True
+
+    # Replace the latest frame of a stream (any bytes-like JPEG, not copied:
+    # it must not be modified afterwards)
+    def publish(self, name, jpg):
+        with self.cond:
+            stream = self.streams.setdefault(name, _Stream())
+            stream.jpg = jpg
+            stream.seq += 1
+            self.cond.notify_all()
+
+    # Yield new frames of a stream as they come, at most max_fps per second
+    def frames(self, name):
+        with self.cond:
+            stream = self.streams.setdefault(name, _Stream())
+            stream.viewers += 1
+        try:
+            seq = 0
+            while True:
+                with self.cond:
+                    self.cond.wait_for(lambda: stream.seq != seq, timeout=5.0)
+                    if stream.seq == seq or stream.jpg is None:
+                        continue
+                    seq = stream.seq
+                    jpg = stream.jpg
+                yield jpg
+                time.sleep(1.0 / self.max_fps)
+        finally:
+            with self.cond:
+                stream.viewers -= 1
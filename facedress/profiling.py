@@ -0,0 +1,198 @@
+"""
+On-demand profiling of a running server or client
+
+Nothing is traced or sampled until asked for, so a process with the hooks
+installed runs exactly as fast as one without. Three captures can be started
+at any time, each for a number of seconds, and write their results to files
+named <directory>/<name>-<pid>-<time>.<kind>.txt:
+
+    profile  cProfile of the main thread (the frame loop), sorted by
+             cumulative time (a .prof file for pstats/snakeviz is written
+             next to it)
+    stacks   stack samples of every thread, in collapsed format (one line
+             per distinct stack with its count, for flamegraph.pl/speedscope)
+    memory   tracemalloc snapshot diff between the start and end of the
+             capture (biggest growth first)
+
+Start them with signals (SIGUSR1 profiles, SIGUSR2 samples stacks and memory
+together), e.g. sudo kill -USR1 <pid>, or call profile(), stacks() and
+memory() from another thread (the server's control socket does). Sending
+SIGUSR1 again stops a running profile early.
+
+cProfile only sees the thread it was enabled in, so it is started and stopped
+by the signal handler, which Python always runs in the main thread.
+
+License: Apache-2.0
+"""
+
+import os, sys, time, signal, cProfile, pstats, threading, tracemalloc, \
+        collections
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Starts and stops profiling captures on request
+class Profiler:
+
+    # Constructor
+    def __init__(self, name, directory="/tmp", seconds=10.0, sample_hz=100.0,
+                    top=40):
+        self.name = name
+        self.directory = directory
+        self.seconds = seconds
+        self.sample_hz = sample_hz
+        self.top = top
+        self.cprofile = None            # Running cProfile.Profile
+        self.profile_seconds = None     # Requested length of the next profile
+        self.profile_path = None
+        self.expired = False            # Set by the timer that ends a profile
+        self.timer = None
+        self.sampling = False
+        self.tracing = False
+        self.installed = False
+
+    # Handle SIGUSR1 and SIGUSR2. Only possible in the main thread; returns
+    # False (and profile() is not available) elsewhere.
+    def install(self):
+        if threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signal.SIGUSR1, self._on_profile_signal)
+        signal.signal(signal.SIGUSR2, self._on_sample_signal)
+        self.installed = True
+        return True
+
+    # Base path for the files of a capture
+    def _path(self, kind):
+        return os.path.join(self.directory, "{}-{}-{}.{}".format(
+                self.name, os.getpid(), time.strftime("%Y%m%d-%H%M%S"), kind))
+
+    # Profile the main thread for a number of seconds, return the report path
+    def profile(self, seconds=None):
+        if not self.installed:
+            raise ValueError("Profiling needs the main thread's signal handler")
+        if self.cprofile is not None or self.profile_seconds is not None:
+            raise ValueError("A profile is already running")
+        self.profile_seconds = float(seconds or self.seconds)
+        self.profile_path = self._path("profile.txt")
+        os.kill(os.getpid(), signal.SIGUSR1)
+        return self.profile_path
+
+    # Sample the stacks of all threads for a number of seconds, return the
+    # report path
+    def stacks(self, seconds=None):
+        if self.sampling:
+            raise ValueError("Stack sampling is already running")
+        self.sampling = True
+        path = self._path("stacks.txt")
+        threading.Thread(target=self._sample_stacks,
+                            args=(float(seconds or self.seconds), path),
+                            daemon=True).start()
+        return path
+
+    # Trace allocations for a number of seconds, return the report path
+    def memory(self, seconds=None):
+        if self.tracing or tracemalloc.is_tracing():
+            raise ValueError("Memory tracing is already running")
+        self.tracing = True
+        tracemalloc.start()
+        path = self._path("memory.txt")
+        threading.Thread(target=self._diff_memory,
+                            args=(float(seconds or self.seconds), path),
+                            daemon=True).start()
+        return path
+
+    # Start or stop cProfile (runs in the main thread)
+    def _on_profile_signal(self, signum, frame):
+        if self.cprofile is not None:
+            self.timer.cancel()
+            self.cprofile.disable()
+            threading.Thread(target=self._write_profile,
+                                args=(self.cprofile, self.profile_path),
+                                daemon=True).start()
+            self.cprofile = None
+            self.profile_seconds = None
+            self.expired = False
+        elif self.expired:
+            self.expired = False
+        else:
+            seconds = self.profile_seconds or self.seconds
+            if self.profile_seconds is None:
+                self.profile_path = self._path("profile.txt")
+            self.timer = threading.Timer(seconds, self._expire)
+            self.timer.daemon = True
+            self.timer.start()
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+            print("Profiling for {:.0f} s, writing {}".format(seconds,
+                                                            self.profile_path))
+
+    # End the running profile (timer thread)
+    def _expire(self):
+        self.expired = True
+        os.kill(os.getpid(), signal.SIGUSR1)
+
+    # Start stack sampling and memory tracing together
+    def _on_sample_signal(self, signum, frame):
+        for capture in (self.stacks, self.memory):
+            try:
+                print("Writing", capture())
+            except ValueError as e:
+                print("ERROR:", str(e))
+
+    # Write a finished profile
+    def _write_profile(self, profile, path):
+        profile.dump_stats(path[:-len(".txt")] + ".prof")
+        with open(path, "w") as f:
+            stats = pstats.Stats(profile, stream=f)
+            stats.sort_stats("cumulative").print_stats(self.top)
+        print("Wrote", path)
+
+    # Count the stacks of all threads until the time is up
+    def _sample_stacks(self, seconds, path):
+        counts = collections.Counter()
+        me = threading.get_ident()
+        end = time.perf_counter() + seconds
+        try:
+            while True:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append("{} ({}:{})".format(code.co_name,
+                                        os.path.basename(code.co_filename),
+                                        code.co_firstlineno))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)))
+                    counts[";".join(reversed(stack))] += 1
+                if time.perf_counter() >= end:
+                    break
+                time.sleep(1.0 / self.sample_hz)
+            with open(path, "w") as f:
+                for stack, count in counts.most_common():
+                    f.write("{} {}\n".format(stack, count))
+            print("Wrote", path)
+        finally:
+            self.sampling = False
+
+    # Compare allocations at the start and end of the time
+    def _diff_memory(self, seconds, path):
+        try:
+            before = tracemalloc.take_snapshot()
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            diff = after.compare_to(before, "lineno")
+            with open(path, "w") as f:
+                f.write("Traced: {:.1f} MB now, {:.1f} MB peak over {:.0f} s\n"
+                        .format(current / 1e6, peak / 1e6, seconds))
+                for stat in diff[:self.top]:
+                    f.write(str(stat) + "\n")
+            print("Wrote", path)
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self.tracing = False
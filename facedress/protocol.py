@@ -0,0 +1,189 @@
+"""
+Wire protocol between the server (Pi 4) and the clients (Pi Zeros)
+
+Server to client messages are a 4-byte big-endian length followed by the
+payload. The first byte of every payload is its message type:
+
+    FRAME: frame id, capture time (server clock), width, height, JPEG bytes
+    SYNC: server send time (for clock offset estimation at connect time)
+    DELTA: frame id, capture time, width, height, tile size, tile format,
+        tile count, the (x, y) position of each changed tile, then the tiles
+        packed into one atlas image (see facedress/delta.py), as a JPEG or as
+        raw RGB bytes. Patches the previous frame in place.
+    IDLE: server send time. The display has no face to show, so it renders
+        its own idle content until the next frame. Repeated every few
+        seconds while idle, so the client knows the server is still there.
+
+Clients answer every message with a fixed size reply, first byte is the type:
+
+    TELEMETRY: frame id, receive-complete time, decode time, plus the id,
+        display time and render time of the last frame put on screen, and the
+        number of frames dropped so far
+    SYNC_REPLY: echoed server send time, client receive time
+    NACK: frame id of a frame or delta the client could not decode (sent
+        instead of telemetry). Deltas need the frame they patch, so the
+        server answers with a keyframe.
+
+Times are seconds since the epoch on the sender's clock (time.time()).
+Durations are in seconds.
+
+License: Apache-2.0
+"""
+
+import struct
+
+# Message types (server to client)
+FRAME = 1
+SYNC = 2
+DELTA = 3
+IDLE = 4
+
+# Delta tile formats
+JPEG_TILES = 0
+RAW_TILES = 1
+
+# Max tiles per atlas row
+ATLAS_COLUMNS = 16
+
+# Reply types (client to server)
+TELEMETRY = 101
+SYNC_REPLY = 102
+NACK = 103
+
+# Message layouts
+LENGTH = struct.Struct(">L")
+FRAME_HEADER = struct.Struct(">BIdHH")
+SYNC_MSG = struct.Struct(">Bd")
+IDLE_MSG = struct.Struct(">Bd")
+DELTA_HEADER = struct.Struct(">BIdHHBBH")
+DELTA_TILE = struct.Struct(">HH")
+TELEMETRY_MSG = struct.Struct(">BIdfIdfI")
+SYNC_REPLY_MSG = struct.Struct(">Bdd")
+NACK_MSG = struct.Struct(">BI")
+REPLY_MSGS = {TELEMETRY: TELEMETRY_MSG,
+                SYNC_REPLY: SYNC_REPLY_MSG,
+                NACK: NACK_MSG}
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Build a complete frame message (length prefix included)
+def pack_frame(frame_id, capture_time, width, height, data):
+    header = FRAME_HEADER.pack(FRAME, frame_id & 0xFFFFFFFF, capture_time,
+                                width, height)
+    return LENGTH.pack(len(header) + len(data)) + header + bytes(data)
+
+# Split a frame payload into (frame id, capture time, width, height, JPEG)
+def unpack_frame(payload):
+    _, frame_id, capture_time, width, height = FRAME_HEADER.unpack_from(payload)
+    return (frame_id, capture_time, width, height,
+            memoryview(payload)[FRAME_HEADER.size:])
+
+# JPEG bytes of a complete frame message (a view, nothing is copied)
+def frame_jpeg(message):
+    return memoryview(message)[LENGTH.size + FRAME_HEADER.size:]
+
+# Type of a complete message
+def message_type(message):
+    return message[LENGTH.size]
+
+# Width and height of the atlas holding count tiles
+def atlas_size(count, tile):
+    columns = min(count, ATLAS_COLUMNS)
+    return columns * tile, -(-count // max(columns, 1)) * tile
+
+# Where each tile of a delta is in the atlas: yields (atlas x, atlas y, x, y,
+# width, height), tiles at the right and bottom edges may be cut off
+def atlas_tiles(positions, tile, width, height):
+    columns = atlas_size(len(positions), tile)[0] // tile
+    for i, (x, y) in enumerate(positions):
+        yield ((i % columns) * tile, (i // columns) * tile, x, y,
+                min(tile, width - x), min(tile, height - y))
+
+# Build a complete delta message from tile positions and the atlas data
+def pack_delta(frame_id, capture_time, width, height, tile, tile_format,
+                positions, data):
+    header = DELTA_HEADER.pack(DELTA, frame_id & 0xFFFFFFFF, capture_time,
+                                width, height, tile, tile_format,
+                                len(positions)) + \
+                b"".join(DELTA_TILE.pack(x, y) for x, y in positions)
+    return LENGTH.pack(len(header) + len(data)) + header + bytes(data)
+
+# Split a delta payload into (frame id, capture time, width, height, tile
+# size, tile format, tile positions, atlas data)
+def unpack_delta(payload):
+    (_, frame_id, capture_time, width, height, tile, tile_format,
+        count) = DELTA_HEADER.unpack_from(payload)
+    offset = DELTA_HEADER.size
+    positions = [DELTA_TILE.unpack_from(payload, offset + i * DELTA_TILE.size)
+                    for i in range(count)]
+    offset += count * DELTA_TILE.size
+    return (frame_id, capture_time, width, height, tile, tile_format,
+            positions, memoryview(payload)[offset:])
+
+# Build a complete clock sync message
+def pack_sync(server_time):
+    payload = SYNC_MSG.pack(SYNC, server_time)
+    return LENGTH.pack(len(payload)) + payload
+
+# Build a complete idle message
+def pack_idle(server_time):
+    payload = IDLE_MSG.pack(IDLE, server_time)
+    return LENGTH.pack(len(payload)) + payload
+
+# Build a telemetry reply
+def pack_telemetry(frame_id, recv_time, decode_time, shown_id, shown_time,
+                    render_time, dropped):
+    return TELEMETRY_MSG.pack(TELEMETRY, frame_id, recv_time, decode_time,
+                                shown_id, shown_time, render_time, dropped)
+
+# Build a clock sync reply
+def pack_sync_reply(server_time, client_time):
+    return SYNC_REPLY_MSG.pack(SYNC_REPLY, server_time, client_time)
+
+# Build a decode failure reply
+def pack_nack(frame_id):
+    return NACK_MSG.pack(NACK, frame_id)
+
+# Receive exactly n bytes into a view of buf (a writable buffer of at least n
+# bytes). Raises ConnectionError if the peer hangs up.
+def recv_into_exact(sock, view, n):
+    received = 0
+    while received < n:
+        count = sock.recv_into(view[received:n], n - received)
+        if count == 0:
+            raise ConnectionError("Connection closed by peer")
+        received += count
+    return view[:n]
+
+# Receive one client reply, return the unpacked tuple (type first)
+def recv_reply(sock):
+    buf = bytearray(max(msg.size for msg in REPLY_MSGS.values()))
+    view = memoryview(buf)
+    reply_type = recv_into_exact(sock, view, 1)[0]
+    if reply_type not in REPLY_MSGS:
+        raise ValueError("Unknown reply type: " + str(reply_type))
+    msg = REPLY_MSGS[reply_type]
+    recv_into_exact(sock, view[1:], msg.size - 1)
+    return msg.unpack_from(buf)
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Reads length-prefixed messages into one reused receive buffer
+class MessageReader:
+
+    # Constructor
+    def __init__(self, sock, size=64 * 1024):
+        self.sock = sock
+        self.buf = bytearray(size)
+
+    # Receive the next message, return its payload. The payload is a view into
+    # the receive buffer, so it is only valid until the next call.
+    def read(self):
+        view = memoryview(self.buf)
+        size = LENGTH.unpack(recv_into_exact(self.sock, view, LENGTH.size))[0]
+        if size > len(self.buf):
+            self.buf = bytearray(max(size, 2 * len(self.buf)))
+            view = memoryview(self.buf)
+        return recv_into_exact(self.sock, view, size)
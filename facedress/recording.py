@@ -0,0 +1,290 @@
+"""
+Record and replay of camera frames and detections
+
+Recorder appends captured frames (optionally downscaled, raw or JPEG) together
+with the raw runner.classify() results and timestamps to a memory-mapped,
+append-only log. The header holds the offset of the end of the last complete
+record, so a log cut short by a crash or power loss is still readable.
+
+ReplaySource feeds a log back through the server pipeline as a frame source, at
+the recorded speed or as fast as possible, and ReplayRunner stands in for the
+model by handing back the recorded results. Post-processing, encoding and
+fan-out can then be benchmarked without a camera or a model.
+
+Log layout (little endian):
+
+    header: magic (8 bytes), end offset (uint64)
+    record: record length (uint32), frame index (uint32), timestamp (double),
+            width (uint16), height (uint16), encoding (uint8),
+            image length (uint32), image bytes, results (JSON)
+
+License: Apache-2.0
+"""
+
+import json, mmap, struct, time
+
+import numpy as np
+import cv2
+
+from facedress.sources import Frame, downscale
+
+# Log format
+MAGIC = b"FDLOG001"
+_HEADER = struct.Struct("<8sQ")
+_RECORD = struct.Struct("<IIdHHBI")
+
+# Image encodings
+RAW_BGR = 0
+JPEG = 1
+
+# Grow the log file by at least this many bytes at a time
+GROW_SIZE = 64 * 1024 * 1024
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Append-only, memory-mapped frame and detection log writer
+class Recorder:
+
+    # Constructor (record_res of None keeps full resolution, jpeg_quality of
+    # None stores raw BGR pixels)
+    def __init__(self, path, record_res=None, jpeg_quality=None):
+        self.path = path
+        self.record_res = record_res
+        self.jpeg_quality = jpeg_quality
+        self.results = []
+        self.num_records = 0
+        self.resized = None
+        self.file = open(path, "w+b")
+        self.size = 0
+        self.mm = None
+        self._grow(GROW_SIZE)
+        self.end = _HEADER.size
+        self.mm[0:_HEADER.size] = _HEADER.pack(MAGIC, self.end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Make the file (and the mapping) at least new_size bytes long
+    def _grow(self, new_size):
+        if self.mm is not None:
+            self.mm.flush()
+            self.mm.close()
+        self.size = new_size
+        self.file.truncate(self.size)
+        self.mm = mmap.mmap(self.file.fileno(), self.size)
+
+    # Remember one classify() result for the frame being processed
+    def add_result(self, name, res):
+        self.results.append([name, res])
+
+    # Append a frame and the results gathered since the last one
+    def write_frame(self, frame):
+
+        # Downscale and encode the full resolution image
+        img = frame.full
+        if self.record_res is not None and \
+                (img.shape[1], img.shape[0]) != tuple(self.record_res):
+            self.resized = cv2.resize(img, tuple(self.record_res),
+                                        dst=self.resized,
+                                        interpolation=cv2.INTER_AREA)
+            img = self.resized
+        if self.jpeg_quality is None:
+            encoding = RAW_BGR
+            img_data = np.ascontiguousarray(img).data
+        else:
+            encoding = JPEG
+            _, img_jpg = cv2.imencode('.jpg', img,
+                                [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+            img_data = img_jpg.data
+        results = json.dumps(self.results, separators=(',', ':')).encode()
+        self.results = []
+
+        # Make room for the record
+        length = _RECORD.size + img_data.nbytes + len(results)
+        if self.end + length > self.size:
+            self._grow(max(self.size + GROW_SIZE, self.end + length))
+
+        # Write the record, then publish it by moving the end offset
+        pos = self.end
+        self.mm[pos:pos + _RECORD.size] = _RECORD.pack(length,
+                                                        frame.index,
+                                                        frame.timestamp,
+                                                        img.shape[1],
+                                                        img.shape[0],
+                                                        encoding,
+                                                        img_data.nbytes)
+        pos += _RECORD.size
+        self.mm[pos:pos + img_data.nbytes] = img_data.cast('B')
+        pos += img_data.nbytes
+        self.mm[pos:pos + len(results)] = results
+        self.end += length
+        self.mm[0:_HEADER.size] = _HEADER.pack(MAGIC, self.end)
+        self.num_records += 1
+
+    # Flush and cut the file down to the data actually written
+    def close(self):
+        if self.mm is None:
+            return
+        self.mm.flush()
+        self.mm.close()
+        self.mm = None
+        self.file.truncate(self.end)
+        self.file.close()
+
+# Memory-mapped reader for logs written by Recorder
+class RecordingReader:
+
+    # Constructor
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.end = _HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a frame log: " + str(path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Images handed out may still point into the mapping, in which case it is
+    # released once the last of them is gone
+    def close(self):
+        try:
+            self.mm.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+    # Yield (index, timestamp, BGR image, results) for each record. Raw images
+    # are read-only views into the log, so nothing is copied.
+    def __iter__(self):
+        pos = _HEADER.size
+        while pos < self.end:
+            (length, index, timestamp, width, height, encoding,
+                img_len) = _RECORD.unpack_from(self.mm, pos)
+            img_pos = pos + _RECORD.size
+            img = np.frombuffer(self.mm, dtype=np.uint8, count=img_len,
+                                offset=img_pos)
+            if encoding == RAW_BGR:
+                img = img.reshape((height, width, 3))
+            else:
+                img = cv2.imdecode(img, cv2.IMREAD_COLOR)
+            results = json.loads(self.mm[img_pos + img_len:pos + length])
+            yield index, timestamp, img, results
+            pos += length
+
+# Frame source that plays back a log (speed 0 plays as fast as possible)
+class ReplaySource:
+
+    # Constructor
+    def __init__(self, path, capture_res, resize_res, speed=1.0, loop=False):
+        self.path = path
+        self.capture_res = capture_res
+        self.resize_res = resize_res
+        self.speed = speed
+        self.loop = loop
+        self.reader = None
+        self.results = []
+        self.resized = np.empty((resize_res[1], resize_res[0], 3), dtype=np.uint8)
+        self.small = np.empty_like(self.resized)
+        self.full = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        self.reader = RecordingReader(self.path)
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    # Scale a recorded image back up to capture_res (only when a crop is cut)
+    def _full(self, img):
+        if (img.shape[1], img.shape[0]) == tuple(self.capture_res):
+            return img
+        self.full = cv2.resize(img, self.capture_res, dst=self.full,
+                                interpolation=cv2.INTER_LINEAR)
+        return self.full
+
+    # Yield recorded frames, paced like the original capture
+    def __iter__(self):
+        if self.reader is None:
+            self.open()
+        count = 0
+        while True:
+            first = None
+            for index, timestamp, img, results in self.reader:
+
+                # Wait until this frame is due
+                if first is None:
+                    first = (timestamp, time.perf_counter())
+                elif self.speed > 0:
+                    due = first[1] + (timestamp - first[0]) / self.speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                # Recorded results are handed out by ReplayRunner
+                self.results = results
+                small = downscale(img, self.resize_res, self.resized, self.small)
+                yield Frame(count, timestamp, small,
+                            lambda img=img: self._full(img))
+                count += 1
+            if not self.loop:
+                break
+
+# Wraps a runner and copies every classify() result into a Recorder
+class RecordingRunner:
+
+    # Constructor
+    def __init__(self, runner, recorder, name):
+        self.runner = runner
+        self.recorder = recorder
+        self.name = name
+
+    def get_features_from_image(self, img):
+        return self.runner.get_features_from_image(img)
+
+    def classify(self, features):
+        res = self.runner.classify(features)
+        self.recorder.add_result(self.name, res)
+        return res
+
+    def stop(self):
+        self.runner.stop()
+
+# Stands in for a model by returning the results recorded for the current frame
+class ReplayRunner:
+
+    # Constructor
+    def __init__(self, source, name):
+        self.source = source
+        self.name = name
+
+    # No features needed, the results are already known
+    def get_features_from_image(self, img):
+        return None, img
+
+    # Next recorded result for this model (empty if the pipeline now asks for
+    # more inferences than were made while recording)
+    def classify(self, features):
+        for i, (name, res) in enumerate(self.source.results):
+            if name == self.name:
+                del self.source.results[i]
+                return res
+        return {'result': {'bounding_boxes': []}, 'timing': {}}
+
+    def stop(self):
+        pass
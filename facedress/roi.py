@@ -0,0 +1,172 @@
+"""
+Region-of-interest and tiled inference
+
+Squashing the whole capture_res frame down to resize_res makes distant faces
+tiny. Once a face is known, RoiDetector runs the model on a square crop around
+its last position instead, so the face is seen at (up to) full sensor
+resolution. New faces are picked up by periodic scans that alternate between
+the whole frame and one tile of a grid covering it.
+
+Exactly one inference is made per frame, so the cost stays that of a single
+full-frame run of the same model. All boxes are returned in capture_res pixels.
+
+License: Apache-2.0
+"""
+
+import cv2
+import numpy as np
+
+from facedress import boxes, yuv
+from facedress.yuv import YuvImage
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Last known position of a face
+class _Track:
+
+    # Constructor
+    def __init__(self, bbox, frame_index):
+        self.bbox = bbox
+        self.last_seen = frame_index
+        self.last_run = frame_index
+        self.misses = 0
+
+    # Center of the face box
+    def center(self):
+        return (self.bbox['x'] + self.bbox['width'] / 2,
+                self.bbox['y'] + self.bbox['height'] / 2)
+
+# Detector that alternates ROI, full-frame and tile inference
+class RoiDetector:
+
+    # Constructor
+    def __init__(self, runner, capture_res, resize_res, threshold,
+                    roi_scale=3.0, min_roi=0.5, scan_interval=8, tiles=(2, 2),
+                    tile_overlap=0.2, max_misses=4, max_tracks=2):
+        self.runner = runner
+        self.capture_res = capture_res
+        self.resize_res = resize_res
+        self.threshold = threshold
+        self.roi_scale = roi_scale          # ROI side / face size
+        self.min_roi = min_roi              # Smallest ROI side / frame width
+        self.scan_interval = scan_interval  # Scan every n frames
+        self.tile_overlap = tile_overlap    # Fraction shared by neighbor tiles
+        self.max_misses = max_misses        # Drop track after n missed ROIs
+        self.max_tracks = max_tracks        # Faces tracked at once
+        self.tracks = []
+        self.num_frames = 0
+        self.num_scans = 0
+        self.regions = [None] + self._tile_regions(tiles)
+        self.resized = np.empty((resize_res[1], resize_res[0], 3), dtype=np.uint8)
+        self.small = np.empty_like(self.resized)
+        self.last_region = None
+        self.last_result = None
+
+    # Square tiles (x, y, side) covering the frame with some overlap
+    def _tile_regions(self, tiles):
+        regions = []
+        for ty in range(tiles[1]):
+            for tx in range(tiles[0]):
+                w = self.capture_res[0] / (tiles[0] - (tiles[0] - 1) * self.tile_overlap)
+                h = self.capture_res[1] / (tiles[1] - (tiles[1] - 1) * self.tile_overlap)
+                side = int(max(w, h))
+                x = int(tx * w * (1 - self.tile_overlap))
+                y = int(ty * h * (1 - self.tile_overlap))
+                x = min(x, self.capture_res[0] - side)
+                y = min(y, self.capture_res[1] - side)
+                regions.append((max(x, 0), max(y, 0), side))
+        return regions
+
+    # Square region (x, y, side) around a tracked face, never smaller than the
+    # model input (so we never upscale) and clamped to the frame. FOMO boxes
+    # are centroid cells that say little about face size, hence min_roi.
+    def _roi_region(self, track):
+        center_x, center_y = track.center()
+        side = max(track.bbox['width'], track.bbox['height']) * self.roi_scale
+        side = int(max(side, self.min_roi * self.capture_res[0],
+                        self.resize_res[0]))
+        side = min(side, self.capture_res[0], self.capture_res[1])
+        x = int(min(max(center_x - side / 2, 0), self.capture_res[0] - side))
+        y = int(min(max(center_y - side / 2, 0), self.capture_res[1] - side))
+        return (x, y, side)
+
+    # Run the model on a region (None for the whole frame), boxes in capture_res
+    def _infer(self, frame, region):
+        if region is None:
+            img = frame.small
+            offset = (0, 0)
+            region_res = self.capture_res
+        else:
+            x, y, side = region
+            img = frame.crop(x, y, x + side, y + side)
+            if isinstance(img, YuvImage):
+                img = yuv.downscale(img, self.resize_res, small=self.small)
+            else:
+                img = cv2.resize(img, self.resize_res, dst=self.resized,
+                                    interpolation=cv2.INTER_AREA)
+                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self.small)
+            offset = (x, y)
+            region_res = (side, side)
+        features, cropped = self.runner.get_features_from_image(img)
+        res = self.runner.classify(features)
+        self.last_result = res
+        found = [b for b in res['result']['bounding_boxes']
+                    if b['value'] >= self.threshold]
+        return boxes.scale_boxes(found, self.resize_res, region_res, offset)
+
+    # Find the track a box belongs to (centers closer than the bigger face)
+    def _match(self, bbox):
+        center_x = bbox['x'] + bbox['width'] / 2
+        center_y = bbox['y'] + bbox['height'] / 2
+        min_radius = 0.05 * self.capture_res[0]
+        for track in self.tracks:
+            track_x, track_y = track.center()
+            radius = max(bbox['width'], bbox['height'], track.bbox['width'],
+                            track.bbox['height'], min_radius)
+            if abs(center_x - track_x) < radius and abs(center_y - track_y) < radius:
+                return track
+        return None
+
+    # Update tracks with boxes found during a scan
+    def _merge(self, found):
+        for bbox in sorted(found, key=lambda b: b['value'], reverse=True):
+            track = self._match(bbox)
+            if track is not None:
+                if bbox['value'] >= track.bbox['value'] or \
+                        track.last_seen < self.num_frames:
+                    track.bbox = bbox
+                track.last_seen = self.num_frames
+                track.misses = 0
+            elif len(self.tracks) < self.max_tracks:
+                self.tracks.append(_Track(bbox, self.num_frames))
+
+    # Perform one inference on the frame and return all known face boxes
+    def detect(self, frame):
+
+        # Scan periodically, or all the time while no face is known
+        scanning = len(self.tracks) == 0 or \
+                    self.num_frames % self.scan_interval == 0
+        if scanning:
+            region = self.regions[self.num_scans % len(self.regions)]
+            self.num_scans += 1
+            self._merge(self._infer(frame, region))
+
+        # Otherwise look closer at the face we checked least recently
+        else:
+            track = min(self.tracks, key=lambda t: t.last_run)
+            region = self._roi_region(track)
+            track.last_run = self.num_frames
+            found = self._infer(frame, region)
+            if len(found) > 0:
+                self._merge(found)
+                if track.last_seen != self.num_frames:
+                    track.misses += 1
+            else:
+                track.misses += 1
+
+        # Forget faces that keep slipping out of their ROI
+        self.tracks = [t for t in self.tracks if t.misses < self.max_misses]
+        self.last_region = region
+        self.num_frames += 1
+        return [t.bbox for t in self.tracks]
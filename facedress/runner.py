@@ -0,0 +1,205 @@
+"""
+Lean client for Edge Impulse .eim model processes
+
+Stands in for ImageImpulseRunner from edge_impulse_linux, with the same
+init(), get_features_from_image(), classify() and stop(), but less work per
+inference:
+
+- Features (one 0xRRGGBB value per pixel) are packed from the image with one
+  OpenCV call and a mask instead of a Python loop over every pixel.
+- If the model process offers a shared memory segment for the features (the
+  features_shm entry of its hello response), they are written straight into
+  it and the classify request is a few bytes of JSON. Otherwise they go out
+  as one JSON list of integers.
+- Requests are sent with sendall(), replies are received into one reusable
+  buffer and parsed by a single json.loads() call, instead of being copied
+  chunk by chunk and scanned character by character in Python first.
+
+The .eim protocol is one JSON object per request over a Unix socket, and each
+reply is a JSON object followed by a NUL byte. tests/mock-eim.py implements
+enough of it to test and benchmark this without a model.
+
+License: Apache-2.0
+"""
+
+import os, json, time, socket, signal, shutil, tempfile, subprocess
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+import cv2
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Pack an RGB (or grayscale) image into one 0xRRGGBB integer per pixel
+def pack_features(img):
+    if img.ndim == 2:
+        return img.reshape(-1).astype(np.uint32) * 0x010101
+    bgra = cv2.cvtColor(np.ascontiguousarray(img), cv2.COLOR_RGB2BGRA)
+    return bgra.view("<u4").reshape(-1) & 0xFFFFFF
+
+# Scale an image to cover the model input and cut out the center, like
+# ImageImpulseRunner does (nothing to do if it is the right size already)
+def fit_image(img, width, height):
+    in_height, in_width = img.shape[:2]
+    if (in_width, in_height) == (width, height):
+        return img
+    factor = max(width / in_width, height / in_height)
+    size = (int(np.ceil(factor * in_width)), int(np.ceil(factor * in_height)))
+    resized = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    x = (size[0] - width) // 2
+    y = (size[1] - height) // 2
+    return resized[y:y + height, x:x + width]
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Runs an .eim model process and classifies images with it
+class FastImageRunner:
+
+    # Constructor
+    def __init__(self, model_path, timeout=30.0, allow_shm=True):
+        self.model_path = model_path
+        self.timeout = timeout
+        self.allow_shm = allow_shm
+        self.process = None
+        self.sock = None
+        self.tempdir = None
+        self.features_shm = None
+        self.features = None            # Float view of the shared features
+        self.buf = bytearray(64 * 1024)
+        self.msg_id = 0
+        self.dim = (0, 0)
+        self.labels = []
+        self.is_grayscale = False
+        self.requests = 0
+        self.bytes_sent = 0
+        self.send_time = 0.0            # Packing and sending requests
+        self.parse_time = 0.0           # Parsing replies
+
+    # Start the model process and connect to it, returns the model info
+    def init(self, debug=False):
+        if not os.access(self.model_path, os.X_OK):
+            raise ValueError("Model file " + self.model_path +
+                                " does not exist or is not executable")
+        self.tempdir = tempfile.mkdtemp()
+        socket_path = os.path.join(self.tempdir, "runner.sock")
+        output = None if debug else subprocess.DEVNULL
+        self.process = subprocess.Popen([self.model_path, socket_path],
+                                        stdout=output, stderr=output)
+        while not os.path.exists(socket_path):
+            if self.process.poll() is not None:
+                raise RuntimeError("Model process exited with " +
+                                    str(self.process.returncode))
+            time.sleep(0.01)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(socket_path)
+
+        # Use the features segment if the model process has one
+        model_info = self.request({"hello": 1})
+        shm = model_info.get("features_shm")
+        if self.allow_shm and shm is not None and shm["type"] == "float32":
+            self.features_shm = shared_memory.SharedMemory(
+                                    name=shm["name"].lstrip("/"))
+
+            # The model process owns the segment, don't remove it on exit
+            resource_tracker.unregister(self.features_shm._name,
+                                        "shared_memory")
+            self.features = np.ndarray((shm["elements"],), dtype=np.float32,
+                                        buffer=self.features_shm.buf)
+        params = model_info["model_parameters"]
+        self.dim = (params["image_input_width"], params["image_input_height"])
+        self.labels = params["labels"]
+        self.is_grayscale = params["image_channel_count"] == 1
+        return model_info
+
+    # Features and the cut out image for an RGB image
+    def get_features_from_image(self, img):
+        cropped = fit_image(img, *self.dim)
+        if self.is_grayscale and cropped.ndim == 3:
+            cropped = cv2.cvtColor(cropped, cv2.COLOR_RGB2GRAY)
+        return pack_features(cropped), cropped
+
+    # Classify features (an array or a list), returns the result dict
+    def classify(self, features):
+        start = time.perf_counter()
+        if self.features is not None:
+            self.features[:len(features)] = features
+            msg = {"classify_shm": {"elements": len(features)}}
+        else:
+            if isinstance(features, np.ndarray):
+                features = features.tolist()
+            msg = {"classify": features}
+        return self.request(msg, start)
+
+    # Send one request and wait for its reply (raises if it failed)
+    def request(self, msg, start=None):
+        if self.sock is None:
+            raise RuntimeError("Runner is not initialized (call init())")
+        if start is None:
+            start = time.perf_counter()
+        self.msg_id += 1
+        msg["id"] = self.msg_id
+        data = json.dumps(msg, separators=(",", ":")).encode()
+        self.sock.sendall(data)
+        self.requests += 1
+        self.bytes_sent += len(data)
+        self.send_time += time.perf_counter() - start
+
+        # Receive until the terminating NUL byte
+        size = 0
+        while size == 0 or self.buf[size - 1] != 0:
+            if size == len(self.buf):
+                self.buf.extend(bytes(len(self.buf)))
+            count = self.sock.recv_into(memoryview(self.buf)[size:])
+            if count == 0:
+                raise ConnectionError("Model process closed the connection")
+            size += count
+
+        # Parse it in one go
+        start = time.perf_counter()
+        begin = self.buf.find(b"{", 0, size)
+        if begin < 0:
+            raise ValueError("No data or corrupted data received")
+        reply = json.loads(bytes(memoryview(self.buf)[begin:size - 1]))
+        self.parse_time += time.perf_counter() - start
+        if reply.get("id") != self.msg_id:
+            raise ValueError("Wrong reply id, expected " + str(self.msg_id) +
+                                " but got " + str(reply.get("id")))
+        if not reply.get("success"):
+            raise RuntimeError(reply.get("error", "Request failed"))
+        del reply["id"]
+        del reply["success"]
+        return reply
+
+    # Stop the model process
+    def stop(self):
+        self.features = None
+        if self.features_shm is not None:
+            self.features_shm.close()
+            self.features_shm = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.send_signal(signal.SIGINT)
+                try:
+                    self.process.wait(1.0)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            self.process = None
+        if self.tempdir is not None:
+            shutil.rmtree(self.tempdir, ignore_errors=True)
+            self.tempdir = None
+
+    # One line summary
+    def report(self):
+        requests = max(self.requests, 1)
+        return "Runner: {} requests | {:.1f} kB sent each | send {:.2f} ms, " \
+                "parse {:.2f} ms each".format(self.requests,
+                                            self.bytes_sent / requests / 1e3,
+                                            self.send_time / requests * 1e3,
+                                            self.parse_time / requests * 1e3)
@@ -0,0 +1,155 @@
+"""
+Frame scheduling across displays under overload
+
+When the frame loop can't keep up with the target frame rate, every display
+slows down together, whether it shows the main face or the default center
+crop. The scheduler ranks the displays instead and takes frames and JPEG
+quality away from the least important ones first, so the display showing
+the main face keeps its frame rate.
+
+A display's priority is the confidence of its face plus the area of the face
+as a fraction of the frame (its face score, 0 for the center crop), plus a
+bonus that grows with the time since it last got a frame, so low-priority
+displays take turns and are never starved.
+
+Overload is the time the loop was busy per frame against the frame interval
+(1 / target_fps). Every settle_frames frames the pressure goes up one step if
+the smoothed busy fraction is above high, and down one step if it is below
+low. Each step degrades the lowest-priority display by one level, up to
+max_level, then the next one. At level n a display gets every (n + 1)th frame,
+at quality_step lower JPEG quality per level (but not below min_quality). The
+display with the highest priority is never degraded.
+
+Independent of the pressure, a display that still has more than max_backlog
+messages waiting to be sent (a slow link or client) skips the frame, so its
+queue and its latency can't grow without bound.
+
+License: Apache-2.0
+"""
+
+import time
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Face score of a display from the detection confidence and the face area (as
+# a fraction of the frame)
+def face_score(confidence, area):
+    return confidence + area
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Ranks displays and decides which get each frame, at what quality
+class DisplayScheduler:
+
+    # Constructor
+    def __init__(self,
+                    target_fps,
+                    max_level=3,
+                    quality_step=15,
+                    min_quality=50,
+                    max_backlog=1,
+                    high=1.0,
+                    low=0.8,
+                    settle_frames=5,
+                    stale_weight=0.25,
+                    stale_time=1.0):
+        self.target_fps = target_fps
+        self.max_level = max_level
+        self.quality_step = quality_step
+        self.min_quality = min_quality
+        self.max_backlog = max_backlog
+        self.high = high
+        self.low = low
+        self.settle_frames = settle_frames
+        self.stale_weight = stale_weight
+        self.stale_time = stale_time
+        self.pressure = 0
+        self.load = 0.0                 # Smoothed busy fraction of a frame
+        self.frames = 0
+        self.state = {}                 # Display -> [frames since sent, time]
+        self.sent = 0
+        self.skipped = 0                # Frames not sent due to pressure
+        self.backlogged = 0             # Frames not sent due to a backlog
+
+    # Update the pressure with the time the loop was busy on the last frame
+    def update(self, busy_time):
+        if self.target_fps <= 0:
+            self.pressure = 0
+            return
+        self.load += (busy_time * self.target_fps - self.load) / 8.0
+        self.frames += 1
+        if self.frames % self.settle_frames != 0:
+            return
+        if self.load > self.high:
+            self.pressure += 1
+        elif self.load < self.low and self.pressure > 0:
+            self.pressure -= 1
+
+    # Priority of a display from its face score and when it last got a frame
+    def priority(self, score, last_sent, now):
+        stale = min((now - last_sent) / self.stale_time, 1.0)
+        return score + self.stale_weight * stale
+
+    # JPEG quality of a display at a degradation level
+    def quality(self, quality, level):
+        if level == 0:
+            return quality
+        return max(min(self.min_quality, quality),
+                    quality - level * self.quality_step)
+
+    # Decide which displays get this frame. displays is a list of (key, face
+    # score, messages waiting) and quality the full JPEG quality. Returns
+    # (send, quality, priority, level) for each display, in the same order.
+    def plan(self, displays, quality, now=None):
+        if now is None:
+            now = time.perf_counter()
+
+        # Forget displays that went away, start new ones with a frame
+        keys = set(key for key, _, _ in displays)
+        for key in list(self.state):
+            if key not in keys:
+                del self.state[key]
+        states = [self.state.setdefault(key, [self.max_level, now])
+                    for key, _, _ in displays]
+        priorities = [self.priority(score, state[1], now)
+                        for (_, score, _), state in zip(displays, states)]
+
+        # Spread the pressure over all but the highest-priority display,
+        # lowest priority first
+        self.pressure = min(self.pressure,
+                            max(len(displays) - 1, 0) * self.max_level)
+        levels = [0] * len(displays)
+        remaining = self.pressure
+        order = sorted(range(len(displays)), key=lambda i: priorities[i])
+        for i in order[:-1]:
+            levels[i] = min(remaining, self.max_level)
+            remaining -= levels[i]
+
+        # A display at level n gets every (n + 1)th frame, if it has no backlog
+        plan = []
+        for (_, _, waiting), state, priority, level in zip(displays, states,
+                                                            priorities, levels):
+            state[0] += 1
+            send = False
+            if state[0] <= level:
+                self.skipped += 1
+            elif waiting > self.max_backlog:
+                self.backlogged += 1
+            else:
+                send = True
+                state[0] = 0
+                state[1] = now
+                self.sent += 1
+            plan.append((send, self.quality(quality, level), priority, level))
+        return plan
+
+    # One line summary
+    def report(self):
+        return "Scheduler: pressure {} (load {:.2f}) | sent {} | skipped {} " \
+                "under pressure, {} with a backlog".format(self.pressure,
+                                                            self.load,
+                                                            self.sent,
+                                                            self.skipped,
+                                                            self.backlogged)
@@ -0,0 +1,174 @@
+"""
+Shared-memory ring of frames between processes
+
+One writer process puts images (e.g. the display crops of a frame) into a ring
+of slots in shared memory, one reader process takes them out without copying
+(numpy views straight into the shared memory). Every write gets the next
+sequence number. The writer never waits: it always overwrites the oldest slot.
+The reader always takes the newest frame it has not seen, so when it falls
+behind the frames in between are dropped (and counted), never queued.
+
+A slot can be overwritten while the reader still works on it. Each slot starts
+with its sequence number, which the writer sets to -1 before it changes the
+slot and back to the new number when it is done. Check valid(seq) after using
+the views: if it returns False, the slot was overwritten in the meantime and
+the results must be thrown away.
+
+Each image can carry a number (tag) along, e.g. a score computed by the
+writer that the reader needs to handle the image.
+
+The writer signals new frames through a pipe (one byte per frame, dropped if
+the pipe is full), so the reader sleeps until there is something to read. A
+few shared counters (values) pass small numbers back and forth, such as the
+number of connected displays.
+
+The ring must be created before the reader process is forked.
+
+License: Apache-2.0
+"""
+
+import os, select, struct
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Layout: ring header (write seq, values), then slots of (header, image data)
+RING_HEADER = struct.Struct("<q8q")
+SLOT_HEADER = struct.Struct("<qqdq")            # seq, frame id, time, count
+IMAGE_HEADER = struct.Struct("<qqqqd")          # height, width, channels, size,
+                                                # tag
+MAX_IMAGES = 8
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Fixed-size ring of frames in shared memory
+class FrameRing:
+
+    # Constructor
+    def __init__(self, slots=4, slot_size=8 * 1024 * 1024):
+        self.slots = slots
+        self.header_size = SLOT_HEADER.size + MAX_IMAGES * IMAGE_HEADER.size
+        self.slot_size = self.header_size + slot_size
+        self.shm = shared_memory.SharedMemory(create=True,
+                                                size=RING_HEADER.size +
+                                                    slots * self.slot_size)
+        self.buf = self.shm.buf
+        RING_HEADER.pack_into(self.buf, 0, 0, *([0] * 8))
+        for i in range(slots):
+            SLOT_HEADER.pack_into(self.buf, self._offset(i), -1, 0, 0.0, 0)
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_blocking(self.write_fd, False)
+        self.last_read = 0
+        self.dropped = 0
+        self.torn = 0
+
+    # Start of a slot
+    def _offset(self, index):
+        return RING_HEADER.size + index * self.slot_size
+
+    # Sequence number of the last frame written
+    def head(self):
+        return struct.unpack_from("<q", self.buf, 0)[0]
+
+    # Read a shared counter
+    def get_value(self, index):
+        return struct.unpack_from("<q", self.buf, 8 + index * 8)[0]
+
+    # Set a shared counter
+    def set_value(self, index, value):
+        struct.pack_into("<q", self.buf, 8 + index * 8, value)
+
+    # Put a frame's images (uint8 arrays) and their tags into the oldest slot.
+    # Images that don't fit are left out. Returns the sequence number.
+    def write(self, frame_id, capture_time, images, tags=None):
+        if tags is None:
+            tags = [0.0] * len(images)
+        seq = self.head() + 1
+        offset = self._offset(seq % self.slots)
+        struct.pack_into("<q", self.buf, offset, -1)
+        data = offset + self.header_size
+        end = offset + self.slot_size
+        count = 0
+        for img, tag in zip(images[:MAX_IMAGES], tags):
+            if data + img.nbytes > end:
+                break
+            channels = img.shape[2] if img.ndim == 3 else 1
+            IMAGE_HEADER.pack_into(self.buf, offset + SLOT_HEADER.size +
+                                    count * IMAGE_HEADER.size, img.shape[0],
+                                    img.shape[1], channels, img.nbytes, tag)
+            view = np.ndarray(img.shape, dtype=np.uint8, buffer=self.buf,
+                                offset=data)
+            view[...] = img
+            data += img.nbytes
+            count += 1
+        SLOT_HEADER.pack_into(self.buf, offset, seq, frame_id, capture_time,
+                                count)
+        struct.pack_into("<q", self.buf, 0, seq)
+        try:
+            os.write(self.write_fd, b"\0")
+        except BlockingIOError:
+            pass
+        return seq
+
+    # Take the newest unread frame: (seq, frame id, capture time, images as
+    # views into the ring, tags), or None if nothing new arrived within the
+    # timeout
+    def read(self, timeout=None):
+        if self.head() <= self.last_read:
+            if not select.select([self.read_fd], [], [], timeout)[0]:
+                return None
+        if select.select([self.read_fd], [], [], 0)[0]:
+            os.read(self.read_fd, 4096)
+        seq = self.head()
+        if seq <= self.last_read:
+            return None
+        self.dropped += seq - self.last_read - 1
+        self.last_read = seq
+        offset = self._offset(seq % self.slots)
+        slot_seq, frame_id, capture_time, count = \
+            SLOT_HEADER.unpack_from(self.buf, offset)
+        if slot_seq != seq:
+            self.torn += 1
+            return None
+        images = []
+        tags = []
+        data = offset + self.header_size
+        for i in range(count):
+            height, width, channels, size, tag = IMAGE_HEADER.unpack_from(
+                self.buf, offset + SLOT_HEADER.size + i * IMAGE_HEADER.size)
+            shape = (height, width, channels) if channels > 1 else \
+                    (height, width)
+            images.append(np.ndarray(shape, dtype=np.uint8, buffer=self.buf,
+                                        offset=data))
+            tags.append(tag)
+            data += size
+        return seq, frame_id, capture_time, images, tags
+
+    # Check that a frame's slot was not overwritten (counts it if it was)
+    def valid(self, seq):
+        if struct.unpack_from("<q", self.buf,
+                                self._offset(seq % self.slots))[0] == seq:
+            return True
+        self.torn += 1
+        return False
+
+    # One line summary (reader side)
+    def report(self):
+        return "Ring: frame {} | dropped {} | overwritten while read {}".format(
+                self.last_read, self.dropped, self.torn)
+
+    # Release the shared memory (the creating process also removes it)
+    def close(self, unlink=False):
+        self.buf = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+        if unlink:
+            self.shm.unlink()
+        for fd in (self.read_fd, self.write_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
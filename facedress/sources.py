@@ -0,0 +1,411 @@
+"""
+Frame sources
+
+A frame source yields Frame objects with two views of the same moment:
+
+  * small: RGB image at resize_res, ready to hand to the model
+  * full: BGR image at capture_res, only used when a sub-image is cut
+  * yuv: the full frame as YUV420 planes, if the source captures YUV (then
+    full is converted from it on first use, see yuv.py)
+
+The Pi camera can produce both streams on the GPU (two splitter ports, one of
+them resized by the ISP), so the CPU never touches the full frame unless a crop
+is taken from it. Where that isn't possible, the full frame is downscaled once
+into a reused buffer (resize first, then convert the small image to RGB).
+With YUV capture the planes are resized and only the small image is converted.
+
+Frames are only valid until the next one is requested, as buffers are reused.
+
+License: Apache-2.0
+"""
+
+import time
+
+import numpy as np
+import cv2
+
+from facedress import yuv
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Downscale a full BGR frame to an RGB model input, writing into reused buffers
+def downscale(img_bgr, resize_res, resized=None, small=None):
+    resized = cv2.resize(img_bgr, resize_res, dst=resized,
+                            interpolation=cv2.INTER_LINEAR)
+    return cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=small)
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# One captured frame with a small (model) and full (crop) resolution view
+class Frame:
+
+    # Constructor: full may be an array or a function that returns one, yuv
+    # is the full frame as a YuvImage if the source captures YUV420
+    def __init__(self, index, timestamp, small, full, yuv=None):
+        self.index = index
+        self.timestamp = timestamp
+        self.small = small
+        self._full = full
+        self.yuv = yuv
+
+    # Full resolution BGR image (fetched or converted on first use)
+    @property
+    def full(self):
+        if callable(self._full):
+            self._full = self._full()
+        return self._full
+
+    # Region of the full frame: a BGR view, or YUV planes if captured as YUV
+    def crop(self, x0, y0, x1, y1):
+        if self.yuv is not None:
+            return self.yuv.crop(x0, y0, x1, y1)
+        return self.full[y0:y1, x0:x1]
+
+# Latest-frame holder for the full resolution picamera splitter port (picamera
+# may write one frame in several chunks, they are put together in a ring of
+# reused buffers and a frame is only handed out once it is complete)
+class _FullResOutput:
+
+    # Constructor
+    def __init__(self, size, num_buffers=3):
+        self.size = size
+        self.padded = ((size[0] + 31) // 32 * 32, (size[1] + 15) // 16 * 16)
+        self.bufs = [np.empty(self.padded[0] * self.padded[1] * 3,
+                                dtype=np.uint8) for _ in range(num_buffers)]
+        self.index = 0
+        self.pos = 0
+        self.buf = None
+
+    # Called by picamera (from its encoder thread) with (part of) a raw frame.
+    # A complete frame stays untouched while the next num_buffers - 1 arrive.
+    def write(self, data):
+        data = np.frombuffer(data, dtype=np.uint8)
+        start = 0
+        while start < len(data):
+            buf = self.bufs[self.index]
+            count = min(len(data) - start, len(buf) - self.pos)
+            buf[self.pos:self.pos + count] = data[start:start + count]
+            start += count
+            self.pos += count
+            if self.pos == len(buf):
+                self.buf = buf
+                self.index = (self.index + 1) % len(self.bufs)
+                self.pos = 0
+        return len(data)
+
+    def flush(self):
+        pass
+
+    # Turn the most recent complete frame into a BGR array view
+    def array(self):
+        buf = self.buf
+        if buf is None:
+            return None
+        img = buf.reshape((self.padded[1], self.padded[0], 3))
+        return img[:self.size[1], :self.size[0]]
+
+# Latest-frame holder for YUV420 captures (picamera may write one frame in
+# several chunks, they are put together in a reused buffer)
+class _YuvOutput:
+
+    # Constructor
+    def __init__(self, size):
+        self.size = size
+        self.padded = ((size[0] + 31) // 32 * 32, (size[1] + 15) // 16 * 16)
+        self.buf = bytearray(self.padded[0] * self.padded[1] * 3 // 2)
+        self.pos = 0
+
+    # Called by picamera with (part of) a raw frame
+    def write(self, data):
+        count = min(len(data), len(self.buf) - self.pos)
+        self.buf[self.pos:self.pos + count] = data[:count]
+        self.pos += count
+        return len(data)
+
+    def flush(self):
+        pass
+
+    # Planes of the frame just captured (the next one starts over)
+    def image(self):
+        self.pos = 0
+        return yuv.from_i420(self.buf, self.size, self.padded)
+
+# Pi camera source (uses the GPU resizer for the model stream if dual is set,
+# or captures YUV420 and resizes its planes on the CPU if yuv is set)
+class PiCameraSource:
+
+    # Constructor
+    def __init__(self, capture_res, resize_res, rotation=0, dual=True,
+                    yuv=False):
+        self.capture_res = capture_res
+        self.resize_res = resize_res
+        self.rotation = rotation
+        self.dual = dual
+        self.yuv = yuv
+        self.camera = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Start the camera
+    def open(self):
+        from picamera import PiCamera
+        self.camera = PiCamera()
+        self.camera.resolution = self.capture_res
+        self.camera.rotation = self.rotation
+
+    # Stop the camera
+    def close(self):
+        if self.camera is not None:
+            self.camera.close()
+            self.camera = None
+
+    # Yield frames forever
+    def __iter__(self):
+        if self.yuv:
+            return self._yuv_frames()
+        if self.dual:
+            try:
+                return self._dual_frames()
+            except Exception as e:
+                print("Dual stream capture not available:", str(e))
+                self.dual = False
+        return self._single_frames()
+
+    # Small RGB frames from port 0 (resized by the GPU), full BGR from port 1
+    def _dual_frames(self):
+        from picamera.array import PiRGBArray
+        full_output = _FullResOutput(self.capture_res)
+        self.camera.start_recording(full_output, format='bgr', splitter_port=1)
+        return self._dual_loop(full_output, PiRGBArray(self.camera,
+                                                        size=self.resize_res))
+
+    # Port 0 frames are dropped until port 1 has delivered a complete frame
+    # (it can lag behind at startup), so every frame has a full view to crop
+    def _dual_loop(self, full_output, raw_capture):
+        index = 0
+        try:
+            for frame in self.camera.capture_continuous(raw_capture,
+                                                        format='rgb',
+                                                        use_video_port=True,
+                                                        resize=self.resize_res,
+                                                        splitter_port=0):
+                if full_output.buf is not None:
+                    yield Frame(index, time.time(), frame.array,
+                                full_output.array)
+                    index += 1
+                raw_capture.truncate(0)
+        finally:
+            self.camera.stop_recording(splitter_port=1)
+
+    # Full BGR frames only, downscaled on the CPU into reused buffers
+    def _single_frames(self):
+        from picamera.array import PiRGBArray
+        raw_capture = PiRGBArray(self.camera, size=self.capture_res)
+        resized = np.empty((self.resize_res[1], self.resize_res[0], 3),
+                            dtype=np.uint8)
+        small = np.empty_like(resized)
+        for index, frame in enumerate(self.camera.capture_continuous(
+                                                    raw_capture,
+                                                    format='bgr',
+                                                    use_video_port=True)):
+            img = frame.array
+            downscale(img, self.resize_res, resized, small)
+            yield Frame(index, time.time(), small, img)
+            raw_capture.truncate(0)
+
+    # YUV420 frames: the model input is resized from the planes, the full
+    # frame is only converted to BGR if something asks for it
+    def _yuv_frames(self):
+        output = _YuvOutput(self.capture_res)
+        i420 = np.empty((self.resize_res[1] * 3 // 2, self.resize_res[0]),
+                        dtype=np.uint8)
+        small = np.empty((self.resize_res[1], self.resize_res[0], 3),
+                            dtype=np.uint8)
+        for index, _ in enumerate(self.camera.capture_continuous(
+                                                    output,
+                                                    format='yuv',
+                                                    use_video_port=True)):
+            img = output.image()
+            yuv.downscale(img, self.resize_res, i420, small)
+            yield Frame(index, time.time(), small, img.to_bgr, img)
+
+# Synthetic source for testing off the Pi: a face-like blob drifting around
+class SyntheticSource:
+
+    # Constructor
+    def __init__(self, capture_res, resize_res, dual=True, fps=0,
+                    num_frames=None, seed=0, face_size=0.12, yuv=False):
+        self.capture_res = capture_res
+        self.face_size = face_size
+        self.resize_res = resize_res
+        self.dual = dual
+        self.yuv = yuv
+        self.i420 = None
+        self.small_i420 = None
+        if yuv:
+            self.i420 = np.empty((capture_res[1] * 3 // 2, capture_res[0]),
+                                    dtype=np.uint8)
+            self.small_i420 = np.empty((resize_res[1] * 3 // 2, resize_res[0]),
+                                        dtype=np.uint8)
+        self.fps = fps
+        self.num_frames = num_frames
+        self.rng = np.random.default_rng(seed)
+        self.full_buf = np.empty((capture_res[1], capture_res[0], 3),
+                                    dtype=np.uint8)
+        self.resized = np.empty((resize_res[1], resize_res[0], 3),
+                                    dtype=np.uint8)
+        self.small_buf = np.empty_like(self.resized)
+        self.noise = self.rng.integers(0, 16,
+                                        size=(capture_res[1], capture_res[0], 3),
+                                        dtype=np.uint8)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    # Position (fraction of frame) and radius (fraction of width) of the face
+    def face_at(self, index):
+        t = index / 30.0
+        return (0.5 + 0.3 * np.sin(t * 0.7),
+                0.5 + 0.2 * np.cos(t * 0.5),
+                self.face_size * (1 + 0.33 * np.sin(t * 0.3)))
+
+    # Draw the scene into a BGR buffer of any resolution
+    def render(self, index, res, img, noise=None):
+        img[:] = (60, 90, 120)
+        if noise is not None:
+            img += noise
+        cx, cy, r = self.face_at(index)
+        center = (int(cx * res[0]), int(cy * res[1]))
+        radius = max(int(r * res[0]), 1)
+        cv2.circle(img, center, radius, (150, 170, 210), -1)
+        eye = max(radius // 6, 1)
+        cv2.circle(img, (center[0] - radius // 3, center[1] - radius // 4), eye,
+                    (40, 40, 40), -1)
+        cv2.circle(img, (center[0] + radius // 3, center[1] - radius // 4), eye,
+                    (40, 40, 40), -1)
+        return img
+
+    # Ground truth face box in capture_res pixels (x, y, width, height)
+    def face_box(self, index):
+        cx, cy, r = self.face_at(index)
+        radius = r * self.capture_res[0]
+        return (int(cx * self.capture_res[0] - radius),
+                int(cy * self.capture_res[1] - radius),
+                int(2 * radius),
+                int(2 * radius))
+
+    # Yield frames, paced to fps if set
+    def __iter__(self):
+        index = 0
+        next_time = time.perf_counter()
+        while self.num_frames is None or index < self.num_frames:
+            if self.fps > 0:
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_time += 1.0 / self.fps
+
+            # YUV: render the full frame and convert it like the camera would
+            if self.yuv:
+                full = self.render(index, self.capture_res, self.full_buf,
+                                    self.noise)
+                img = yuv.from_bgr(full, self.i420)
+                small = yuv.downscale(img, self.resize_res, self.small_i420,
+                                        self.small_buf)
+                yield Frame(index, time.time(), small, img.to_bgr, img)
+
+            # Dual: small stream is rendered directly, full only on demand
+            elif self.dual:
+                small = self.render(index, self.resize_res, self.resized)
+                small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB,
+                                        dst=self.small_buf)
+                full = (lambda i=index: self.render(i, self.capture_res,
+                                                    self.full_buf, self.noise))
+                yield Frame(index, time.time(), small, full)
+
+            # Single: render full frame and downscale like the camera fallback
+            else:
+                full = self.render(index, self.capture_res, self.full_buf,
+                                    self.noise)
+                small = downscale(full, self.resize_res, self.resized,
+                                    self.small_buf)
+                yield Frame(index, time.time(), small, full)
+            index += 1
+
+# Video file source: center square of each frame scaled to capture_res, frames
+# start to stop (exclusive, None for the end of the file)
+class VideoSource:
+
+    # Constructor
+    def __init__(self, path, capture_res, resize_res, start=0, stop=None):
+        self.path = path
+        self.capture_res = capture_res
+        self.resize_res = resize_res
+        self.start = start
+        self.stop = stop
+        self.cap = None
+        self.fps = 0.0
+        self.num_frames = 0
+        self.full_buf = np.empty((capture_res[1], capture_res[0], 3),
+                                    dtype=np.uint8)
+        self.resized = np.empty((resize_res[1], resize_res[0], 3),
+                                    dtype=np.uint8)
+        self.small_buf = np.empty_like(self.resized)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Open the file and seek to the first frame
+    def open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            raise IOError("Could not open video: " + str(self.path))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.num_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if self.start > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start)
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    # Yield frames (index is the frame number in the file, timestamp is the
+    # position in the video in seconds)
+    def __iter__(self):
+        if self.cap is None:
+            self.open()
+        index = self.start
+        while self.stop is None or index < self.stop:
+            ok, img = self.cap.read()
+            if not ok:
+                break
+            height, width = img.shape[:2]
+            side = min(width, height)
+            x0 = (width - side) // 2
+            y0 = (height - side) // 2
+            full = cv2.resize(img[y0:y0 + side, x0:x0 + side], self.capture_res,
+                                dst=self.full_buf, interpolation=cv2.INTER_AREA)
+            small = downscale(full, self.resize_res, self.resized, self.small_buf)
+            yield Frame(index, index / self.fps, small, full)
+            index += 1
@@ -0,0 +1,111 @@
+"""
+Latency statistics from client telemetry
+
+ClockSync estimates a client's clock offset from SYNC round trips (the sample
+with the shortest round trip wins, like NTP). LatencyHistogram keeps fixed
+log-spaced buckets, so adding a sample is cheap and memory never grows.
+StartupTimeline records when each part of the server became ready.
+
+License: Apache-2.0
+"""
+
+import bisect, threading, time
+
+# Bucket upper edges in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 15, 20, 30, 40, 50, 75, 100, 150, 200, 300, 500,
+                750, 1000, 2000, 5000]
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Clock offset estimate (client clock - server clock)
+class ClockSync:
+
+    # Constructor
+    def __init__(self):
+        self.offset = 0.0
+        self.rtt = None
+
+    # Add one round trip: server send, client receive, server receive times
+    def add(self, sent, client_time, received):
+        rtt = received - sent
+        if self.rtt is None or rtt < self.rtt:
+            self.rtt = rtt
+            self.offset = client_time - (sent + received) / 2.0
+
+    # Convert a client timestamp to server time
+    def to_server(self, client_time):
+        return client_time - self.offset
+
+# Histogram of latencies (in seconds) with percentile estimates
+class LatencyHistogram:
+
+    # Constructor
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    # Add one latency sample
+    def add(self, seconds):
+        ms = seconds * 1000.0
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    # Upper edge (ms) of the bucket holding the given percentile
+    def percentile(self, p):
+        if self.count == 0:
+            return 0.0
+        target = p / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                if i < len(BUCKETS_MS):
+                    return min(BUCKETS_MS[i], self.max * 1000.0)
+                return self.max * 1000.0
+        return self.max * 1000.0
+
+    def __str__(self):
+        if self.count == 0:
+            return "n=0"
+        return "n={} mean={:.1f} p50<={:.0f} p90<={:.0f} p99<={:.0f} max={:.1f} ms".format(
+                self.count,
+                self.total / self.count * 1000.0,
+                self.percentile(50),
+                self.percentile(90),
+                self.percentile(99),
+                self.max * 1000.0)
+
+# Seconds from start until each startup step finished (thread safe)
+class StartupTimeline:
+
+    # Constructor
+    def __init__(self, verbose=False):
+        self.start = time.perf_counter()
+        self.verbose = verbose
+        self.marks = {}
+        self.mutex = threading.Lock()
+
+    # Record a step (only the first time it happens), returns its time
+    def mark(self, name):
+        with self.mutex:
+            if name not in self.marks:
+                self.marks[name] = time.perf_counter() - self.start
+                if self.verbose:
+                    print("Startup: {} after {:.2f} s".format(name,
+                                                            self.marks[name]))
+            return self.marks[name]
+
+    # Check if a step has happened
+    def has(self, name):
+        return name in self.marks
+
+    def __str__(self):
+        with self.mutex:
+            steps = sorted(self.marks.items(), key=lambda item: item[1])
+        return "Startup: " + " | ".join("{} {:.2f} s".format(name, seconds)
+                                        for name, seconds in steps)
@@ -0,0 +1,185 @@
+"""
+YUV420 frames
+
+With yuv_capture the camera delivers I420 frames: a full resolution Y (luma)
+plane followed by U and V (chroma) planes at half the width and height. That
+is half the bytes of BGR and what a JPEG encoder works on anyway, so nothing
+is converted at full resolution:
+
+  * The model input is resized from the planes and only converted to RGB at
+    resize_res.
+  * Display crops are cut from the planes (on even pixels, so the chroma
+    lines up) and encoded straight from them with libjpeg-turbo's YUV encoder
+    if PyTurboJPEG is installed. Otherwise just the crop is converted to BGR
+    for cv2.imencode.
+  * Anything that needs a BGR image (the delta codec, split mode, recording)
+    converts the crop or frame it uses.
+
+The Pi camera's video port produces BT.601 video range YUV (Y from 16 to 235),
+which is also what OpenCV converts. JPEG uses the full range, so the planes
+are stretched (with a lookup table, on the crop only) for libjpeg-turbo.
+
+License: Apache-2.0
+"""
+
+import numpy as np
+import cv2
+
+from facedress import mask
+
+# Lookup tables from video range to full range and back (Y and U/V)
+_levels = np.arange(256, dtype=np.float32)
+_Y_TO_FULL = np.clip(np.round((_levels - 16) * 255 / 219), 0,
+                        255).astype(np.uint8)
+_C_TO_FULL = np.clip(np.round((_levels - 128) * 255 / 224 + 128), 0,
+                        255).astype(np.uint8)
+_Y_TO_VIDEO = np.round(_levels * 219 / 255 + 16).astype(np.uint8)
+_C_TO_VIDEO = np.round((_levels - 128) * 224 / 255 + 128).astype(np.uint8)
+
+# PyTurboJPEG encoder (None without it or libjpeg-turbo), loaded on first use
+_turbo = None
+_turbo_loaded = False
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Return the libjpeg-turbo encoder, or None if it is not available
+def get_turbo():
+    global _turbo, _turbo_loaded
+    if not _turbo_loaded:
+        _turbo_loaded = True
+        try:
+            from turbojpeg import TurboJPEG
+            _turbo = TurboJPEG()
+        except (ImportError, RuntimeError, OSError):
+            _turbo = None
+    return _turbo
+
+# Views of the Y, U and V planes in an I420 buffer whose rows are padded to a
+# multiple of pad bytes
+def _planes(buf, width, height, pad=1):
+    stride = -(-width // pad) * pad
+    chroma_stride = -(-(width // 2) // pad) * pad
+    luma = stride * height
+    chroma = chroma_stride * (height // 2)
+    y = buf[:luma].reshape(height, stride)[:, :width]
+    u = buf[luma:luma + chroma].reshape(height // 2, chroma_stride)
+    v = buf[luma + chroma:luma + 2 * chroma].reshape(height // 2,
+                                                        chroma_stride)
+    return y, u[:, :width // 2], v[:, :width // 2]
+
+# Wrap a raw I420 frame (rows and planes padded to padded, like the camera
+# does) without copying it
+def from_i420(buf, size, padded=None, full_range=False):
+    width, height = size
+    padded_width, padded_height = padded or size
+    data = np.frombuffer(buf, dtype=np.uint8)
+    luma = padded_width * padded_height
+    chroma = (padded_width // 2) * (padded_height // 2)
+    y = data[:luma].reshape(padded_height, padded_width)
+    u = data[luma:luma + chroma].reshape(padded_height // 2, padded_width // 2)
+    v = data[luma + chroma:luma + 2 * chroma].reshape(padded_height // 2,
+                                                        padded_width // 2)
+    return YuvImage(y[:height, :width], u[:height // 2, :width // 2],
+                    v[:height // 2, :width // 2], full_range)
+
+# Convert a BGR image to a (video range) YUV image, like the camera produces
+def from_bgr(img, out=None):
+    height, width = img.shape[:2]
+    out = cv2.cvtColor(img, cv2.COLOR_BGR2YUV_I420, dst=out)
+    return YuvImage(*_planes(out.reshape(-1), width, height))
+
+# Resize a YUV image to the model input and convert that to RGB, writing into
+# reused buffers (i420 is the resized frame, small the RGB result)
+def downscale(img, resize_res, i420=None, small=None):
+    width, height = resize_res
+    if i420 is None:
+        i420 = np.empty((height * 3 // 2, width), dtype=np.uint8)
+    y, u, v = _planes(i420.reshape(-1), width, height)
+    cv2.resize(img.y, (width, height), dst=y, interpolation=cv2.INTER_LINEAR)
+    cv2.resize(img.u, (width // 2, height // 2), dst=u,
+                interpolation=cv2.INTER_LINEAR)
+    cv2.resize(img.v, (width // 2, height // 2), dst=v,
+                interpolation=cv2.INTER_LINEAR)
+    if img.full_range:
+        cv2.LUT(i420[:height], _Y_TO_VIDEO, dst=i420[:height])
+        cv2.LUT(i420[height:], _C_TO_VIDEO, dst=i420[height:])
+    return cv2.cvtColor(i420, cv2.COLOR_YUV2RGB_I420, dst=small)
+
+# Compress a YUV image to JPEG (returns an array of bytes), from the planes
+# with libjpeg-turbo if available (and turbo is set)
+def encode_jpeg(img, quality, circle=False, turbo=True):
+    encoder = get_turbo() if turbo else None
+    if encoder is not None:
+        from turbojpeg import TJSAMP_420
+        buf = img.to_i420(full_range=True, circle=circle, pad=4)
+        data = encoder.encode_from_yuv(buf, img.height, img.width, quality,
+                                        TJSAMP_420)
+        return np.frombuffer(data, dtype=np.uint8)
+    bgr = img.to_bgr()
+    if circle:
+        bgr = mask.apply_mask(bgr)
+    _, img_jpg = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return img_jpg
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Y, U and V planes of a frame or crop (views, nothing is copied)
+class YuvImage:
+
+    # Constructor
+    def __init__(self, y, u, v, full_range=False):
+        self.y = y
+        self.u = u
+        self.v = v
+        self.full_range = full_range
+        self.height, self.width = y.shape
+
+    # Shape of the matching BGR image
+    @property
+    def shape(self):
+        return (self.height, self.width, 3)
+
+    # Region of the image, moved to even pixels so the chroma lines up (an odd
+    # width or height loses a pixel)
+    def crop(self, x0, y0, x1, y1):
+        x1 = x1 - x0 % 2 - (x1 - x0) % 2
+        y1 = y1 - y0 % 2 - (y1 - y0) % 2
+        x0 -= x0 % 2
+        y0 -= y0 % 2
+        return YuvImage(self.y[y0:y1, x0:x1],
+                        self.u[y0 // 2:y1 // 2, x0 // 2:x1 // 2],
+                        self.v[y0 // 2:y1 // 2, x0 // 2:x1 // 2],
+                        self.full_range)
+
+    # Copy into one flat I420 buffer in video or full range, rows padded to
+    # pad bytes, optionally black outside the display circle
+    def to_i420(self, full_range=False, circle=False, pad=1):
+        stride = -(-self.width // pad) * pad
+        chroma_stride = -(-(self.width // 2) // pad) * pad
+        buf = np.zeros(stride * self.height +
+                        2 * chroma_stride * (self.height // 2), dtype=np.uint8)
+        y, u, v = _planes(buf, self.width, self.height, pad)
+        if full_range == self.full_range:
+            y[:] = self.y
+            u[:] = self.u
+            v[:] = self.v
+        else:
+            luma = _Y_TO_FULL if full_range else _Y_TO_VIDEO
+            chroma = _C_TO_FULL if full_range else _C_TO_VIDEO
+            y[:] = cv2.LUT(self.y, luma)
+            u[:] = cv2.LUT(self.u, chroma)
+            v[:] = cv2.LUT(self.v, chroma)
+        if circle:
+            y[mask.get_mask(self.height, self.width) == 0] = \
+                0 if full_range else 16
+            outside = mask.get_mask(self.height // 2, self.width // 2) == 0
+            u[outside] = 128
+            v[outside] = 128
+        return buf
+
+    # Convert to a BGR image
+    def to_bgr(self):
+        return cv2.cvtColor(self.to_i420().reshape(-1, self.width),
+                            cv2.COLOR_YUV2BGR_I420)
@@ -0,0 +1,198 @@
+"""
+Offline video processing
+
+Runs a video file through the server pipeline (face detection, box
+post-processing, per-display cropping and JPEG encoding, using the same
+functions as server.py) as fast as the machine allows. Writes one MJPEG clip
+per display slot, holding exactly the JPEGs each display would have received,
+plus a detections file with one JSON line per frame.
+
+The video is split into chunks that are processed in parallel, each in its own
+process with its own model runners. The tracking state (known faces, ROI
+tracks, cascade timing) is handed from one chunk to the next by replaying the
+last frames of the previous chunk through the detector before the chunk
+starts. Those warm-up frames are not written out.
+
+Play a clip with e.g. `ffplay -f mjpeg slot0.mjpeg`.
+
+Usage: python3 offline.py [-j <processes>] [-d <displays>] [-w <warmup>]
+            <video> <output_dir>
+
+License: Apache-2.0
+"""
+
+import os, sys, getopt, json, time, multiprocessing
+
+import server
+from facedress.sources import VideoSource
+
+# Settings
+DEFAULT_WARMUP = 32                     # Frames replayed to rebuild tracking state
+
+#-------------------------------------------------------------------------------
+# Functions
+
+def help():
+    print('python3 offline.py [-j <processes>] [-d <displays>] [-w <warmup>] ' +
+            '<video> <output_dir>')
+
+# Name of a chunk's part file
+def part_path(out_dir, name, chunk_ix):
+    return os.path.join(out_dir, name + ".part" + str(chunk_ix))
+
+# Load the models for server.MODE. Raises RuntimeError if one fails (rather
+# than exiting like the server, which would leave the pool waiting on a dead
+# worker).
+def load_models():
+    runners = {}
+    for name in server.required_models(server.MODE):
+        model_file = getattr(server, name + "_model_file")
+        try:
+            runners[name] = server.load_runner(model_file)
+        except Exception as e:
+            for runner in runners.values():
+                runner.stop()
+            raise RuntimeError("Could not initialize model " + model_file +
+                                ": " + str(e))
+    return runners
+
+# Worker: process frames start to stop of the video
+def process_chunk(task):
+    video, out_dir, chunk_ix, start, stop, warmup, num_displays = task
+    server.DEBUG = False
+
+    # Clips show the center crop while there is no face, like before idle
+    # content (the idle state would also differ between chunks)
+    server.idle_content = False
+
+    # Each process loads its own models
+    runners = load_models()
+    cascade = server.make_cascade(runners)
+
+    # One clip part per display slot, plus detections
+    clips = [open(part_path(out_dir, "slot" + str(i) + ".mjpeg", chunk_ix), "wb")
+                for i in range(num_displays)]
+    detections = open(part_path(out_dir, "detections.jsonl", chunk_ix), "w")
+
+    num_frames = 0
+    begin = time.perf_counter()
+    try:
+        with VideoSource(video, server.capture_res, server.resize_res,
+                            max(start - warmup, 0), stop) as source:
+            for frame in source:
+                timestamp = time.perf_counter()
+
+                # Detect on every frame, including warm-up frames
+                bboxes = server.detect_regions(cascade, frame)
+                if frame.index < start:
+                    cascade.frame_done(time.perf_counter() - timestamp)
+                    continue
+
+                # Same cropping and encoding as the live server
+                sub_imgs = server.cut_sub_images(frame, bboxes, num_displays)
+                for clip, sub_img in zip(clips, sub_imgs):
+                    clip.write(server.encode_jpeg(sub_img).tobytes())
+                detections.write(json.dumps({
+                    'frame': frame.index,
+                    'time': frame.timestamp,
+                    'mode': cascade.mode,
+                    'regions': [[float(b[0])] + [int(v) for v in b[1:]]
+                                    for b in bboxes],
+                }) + "\n")
+                cascade.frame_done(time.perf_counter() - timestamp)
+                num_frames += 1
+
+    finally:
+        for clip in clips:
+            clip.close()
+        detections.close()
+        for runner in runners.values():
+            runner.stop()
+
+    return chunk_ix, num_frames, time.perf_counter() - begin, cascade.report()
+
+# Join the part files of all chunks in order, then remove them
+def concatenate(out_dir, name, num_chunks):
+    with open(os.path.join(out_dir, name), "wb") as out:
+        for chunk_ix in range(num_chunks):
+            path = part_path(out_dir, name, chunk_ix)
+            with open(path, "rb") as part:
+                while True:
+                    data = part.read(1024 * 1024)
+                    if not data:
+                        break
+                    out.write(data)
+            os.remove(path)
+
+#-------------------------------------------------------------------------------
+# Main
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "hj:d:w:",
+                                    ["help", "jobs=", "displays=", "warmup="])
+    except getopt.GetoptError:
+        help()
+        sys.exit(2)
+
+    num_jobs = os.cpu_count() or 1
+    num_displays = len(server.HOSTS)
+    warmup = DEFAULT_WARMUP
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            help()
+            sys.exit()
+        elif opt in ('-j', '--jobs'):
+            num_jobs = int(arg)
+        elif opt in ('-d', '--displays'):
+            num_displays = int(arg)
+        elif opt in ('-w', '--warmup'):
+            warmup = int(arg)
+
+    if len(args) != 2:
+        help()
+        sys.exit(2)
+    video, out_dir = args
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Split the video into one chunk per process
+    with VideoSource(video, server.capture_res, server.resize_res) as source:
+        total = source.num_frames
+    if total <= 0:
+        print("ERROR: Could not count frames in " + video)
+        sys.exit(1)
+    chunk_size = (total + num_jobs - 1) // num_jobs
+    tasks = []
+    for start in range(0, total, chunk_size):
+        tasks.append((video, out_dir, len(tasks), start,
+                        min(start + chunk_size, total), warmup, num_displays))
+    print("Processing " + str(total) + " frames in " + str(len(tasks)) +
+            " chunk(s)...")
+
+    # Process chunks in parallel
+    begin = time.perf_counter()
+    num_frames = 0
+    with multiprocessing.Pool(min(num_jobs, len(tasks))) as pool:
+        try:
+            for chunk_ix, count, elapsed, report in pool.imap_unordered(
+                                                        process_chunk, tasks):
+                num_frames += count
+                print("Chunk " + str(chunk_ix) + ": " + str(count) +
+                        " frames in " + "{:.1f} s | ".format(elapsed) + report)
+
+        # Stop the other chunks if one fails
+        except Exception as e:
+            print("ERROR: " + str(e))
+            pool.terminate()
+            sys.exit(1)
+    elapsed = time.perf_counter() - begin
+
+    # Stitch the parts together
+    for i in range(num_displays):
+        concatenate(out_dir, "slot" + str(i) + ".mjpeg", len(tasks))
+    concatenate(out_dir, "detections.jsonl", len(tasks))
+    print("Done: {} frames in {:.1f} s ({:.1f} FPS)".format(
+            num_frames, elapsed, num_frames / elapsed if elapsed > 0 else 0.0))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,1108 @@
+"""
+Main server script for the Pi 4
+
+Handles incoming client connections from the Pi Zeros. Takes images with
+attached Pi cam, performs face detection, and sends out the sub-images to each
+of the connected Pi Zeros.
+
+Loads both the FOMO and the MobileNet-SSD face models. In "cascade" mode, FOMO
+runs on every frame and SSD refines box sizes periodically or when FOMO is
+unsure, within an FPS budget. Download both .eim files from Edge Impulse (or
+set MODE to "fomo" or "ssd" and download just that one).
+
+NOTE: You must update the HOSTS setting to reflect the Pi Zero interfaces.
+
+Author: Shawn Hymel (Edge Impulse)
+Date: September 23, 2022
+License: Apache-2.0
+"""
+
+import os, sys, socket, threading, time, queue, random, multiprocessing, \
+        collections
+
+import cv2
+
+from facedress import boxes, mask, protocol, yuv
+from facedress.cascade import MODES, Cascade, FullFrameDetector
+from facedress.config import ConfigUpdates
+from facedress.delta import DeltaEncoder, make_atlas
+from facedress.governor import FrameGovernor
+from facedress.preview import PreviewServer
+from facedress.profiling import Profiler
+from facedress.recording import Recorder, RecordingRunner, ReplayRunner, ReplaySource
+from facedress.roi import RoiDetector
+from facedress.runner import FastImageRunner
+from facedress.scheduler import DisplayScheduler, face_score
+from facedress.shmring import FrameRing
+from facedress.sources import PiCameraSource
+from facedress.telemetry import ClockSync, LatencyHistogram, StartupTimeline
+from facedress.yuv import YuvImage
+
+# Debug setting
+DEBUG = True                            # Prints debugging info to console
+
+# Face detection settings
+MODE = "cascade"                        # "fomo", "ssd", or "cascade" (both)
+fomo_model_file = "fomo-face.eim"       # Trained ML models from Edge Impulse
+ssd_model_file = "mobilenet-ssd-face.eim"
+draw_frames = True                      # Draw face boxes on the preview
+capture_res = (1088, 1088)              # Resolution captured by the camera
+resize_res = (320, 320)                 # Resolution expected by model
+sub_res = (240, 240)                    # Sub-image size around detected face
+default_sub_res = (480, 480)            # Default sub-image size (center of img)
+rotation = 90                           # Camera rotation (0, 90, 180, or 270)
+threshold = 0.4                         # Prediction value must be over this
+box_increase = 0.2                      # % to add to the size of the box
+num_faces = 2                           # Max faces sent (rest get the center)
+circle_mask = True                      # Black out corners hidden by round display
+jpeg_quality = 95                       # JPEG quality of sub-images (0-100)
+dual_stream = True                      # Let the GPU produce the model input
+yuv_capture = False                     # Capture YUV420, encode crops from it
+yuv_turbojpeg = True                    # Encode YUV crops with libjpeg-turbo
+roi_inference = True                    # Look closer at known faces (see roi.py)
+FAST_RUNNER = False                     # Lean .eim client (see runner.py)
+
+# Cascade settings
+fps_budget = 10.0                       # SSD only runs if FPS stays above this
+ssd_interval = 10                       # Run SSD at least every n frames
+ambiguous_range = (0.4, 0.7)            # FOMO values in range ask SSD to check
+stats_interval = 10.0                   # Seconds between model stats reports
+
+# Frame rate settings (0 = as fast as possible)
+target_fps = 15.0                       # Frame rate cap with clients connected
+idle_fps = 1.0                          # Frame rate with no clients connected
+static_fps = 5.0                        # Frame rate while the scene is static
+static_threshold = 24                   # Pixel change (0-255) that is motion
+static_frames = 10                      # Static frames before slowing down
+
+# Delta codec settings (send only changed tiles, see facedress/delta.py)
+delta_codec = False                     # Send changed tiles between keyframes
+delta_res = (480, 480)                  # Sub-images are scaled to this size
+delta_tile = 32                         # Tile size in pixels (multiple of 16)
+delta_threshold = 5.0                   # Mean pixel change that sends a tile
+keyframe_interval = 60                  # Full frame at least every n frames
+delta_raw = False                       # Send tiles uncompressed (fast links)
+
+# Idle settings (displays without a face show their own idle content)
+idle_content = True                     # Stop streaming to displays without a face
+idle_after = 15                         # Frames without a face before going idle
+idle_keepalive = 1.0                    # Seconds between idle messages
+
+# Display scheduling settings (under overload, see facedress/scheduler.py)
+schedule_displays = True                # Degrade low-priority displays first
+min_jpeg_quality = 50                   # Lowest quality of a degraded display
+max_backlog = 1                         # Skip displays with more messages queued
+fps_window = 2.0                        # Seconds of delivered frames for fps
+
+# Record and replay settings
+RECORD_FILE = None                      # Log frames and detections to this file
+record_res = (544, 544)                 # Resolution of recorded frames (or None)
+record_jpeg_quality = None              # Store JPEGs instead of raw pixels
+REPLAY_FILE = None                      # Play a log instead of camera and models
+replay_speed = 1.0                      # Playback speed (0 = as fast as possible)
+
+# Runtime configuration (see facedress/config.py)
+CONFIG_FILE = None                      # Watch this JSON file for settings
+CONTROL_PORT = 8485                     # Local control socket (None to disable)
+
+# Settings that can be changed while running (models reload in the background)
+LIVE_SETTINGS = ("DEBUG", "MODE", "fomo_model_file", "ssd_model_file",
+                    "sub_res", "default_sub_res", "threshold", "box_increase",
+                    "num_faces", "circle_mask", "jpeg_quality", "fps_budget",
+                    "ssd_interval", "ambiguous_range", "target_fps", "idle_fps",
+                    "static_fps", "static_threshold", "static_frames",
+                    "delta_codec", "delta_threshold", "keyframe_interval",
+                    "delta_raw", "idle_content", "idle_after",
+                    "idle_keepalive", "schedule_displays", "min_jpeg_quality",
+                    "max_backlog")
+
+# Profiling settings (started with SIGUSR1/SIGUSR2 or the control socket, see
+# facedress/profiling.py)
+PROFILE_DIR = "/tmp"                    # Where profiles are written
+PROFILE_SECONDS = 10.0                  # Default length of a capture
+
+# Preview settings (MJPEG over HTTP, see facedress/preview.py)
+PREVIEW_HOST = "127.0.0.1"              # Interface ("0.0.0.0" = all, no auth)
+PREVIEW_PORT = 8080                     # Port of preview server (None = off)
+preview_fps = 5.0                       # Max frame rate sent to each viewer
+
+# Process settings
+SPLIT_PROCESSES = False                 # Encode and send in a second process
+ring_slots = 4                          # Frames buffered between the processes
+
+# Network settings
+HOSTS = ['192.168.2.1', '192.168.3.1']  # Available IP addresses
+PORT = 8484                     # Port of server (Pi 4)
+SOCKET_TIMEOUT = 3.0            # Wait this no. of seconds before closing socket
+SYNC_ROUNDS = 5                 # Clock sync round trips when a client connects
+RESUME_CACHE = True             # Resend a display's last frame on reconnect
+
+# Global client list and mutex
+clients = []
+clients_mutex = threading.Lock()
+client_connected = threading.Event()    # Set when a new client connects
+
+# Frames for the network process (split mode), shared counters of displays
+# and of the delivered frame rate per display slot (in mFPS)
+ring = None
+RING_DISPLAYS = 0
+RING_FPS = 1
+RING_FPS_SLOTS = 7
+
+# Decides which displays get each frame (in the process that encodes)
+scheduler = None
+
+# Per display host: slot order (first come, first served) and the last frame
+# sent (data, frame id, capture time), kept across reconnects
+display_slots = []
+last_frames = {}
+
+# Frames in a row without a face, per display slot (idle content)
+no_face_frames = []
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Server listening thread
+class ListeningThread(threading.Thread):
+
+    # Constructor
+    def __init__(self, host, port, timeline=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.host = host
+        self.port = port
+        self.timeline = timeline
+
+    # Thread loop
+    def run(self):
+
+        # Create a socket for listening (retry quickly at first, the
+        # interface may still be coming up)
+        bound = False
+        retry_delay = 0.1
+        while not bound:
+            try:
+                server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                server_socket.bind((self.host, self.port))
+                bound = True
+            except socket.error as e:
+                print("ERROR:", str(e))
+                server_socket.close()
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 2.0)
+                bound = False
+        if self.timeline is not None:
+            self.timeline.mark("listening on " + self.host)
+
+        # Start listening on socket
+        if DEBUG:
+            print("Socket is listening...")
+        server_socket.listen(10)
+
+        # Spin off new thread for each new connection
+        running = True
+        while running:
+            client_socket, client_address = server_socket.accept()
+            client_full_address = str(client_address[0]) + ":" + str(client_address[1])
+            if DEBUG:
+                print("Connected to: " + client_full_address)
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client_thread = ClientThread(client_address, client_socket)
+
+            # Add client to list (a known display gets its slot back and its
+            # last frame right after the clock sync). A display that comes
+            # back without closing its old connection (it lost power or its
+            # link) replaces it, so it does not wait for the socket timeout.
+            clients_mutex.acquire()
+            for stale in [c for c in clients
+                            if c.client_address[0] == client_address[0]]:
+                clients.remove(stale)
+                stale.close()
+            if client_address[0] not in display_slots:
+                display_slots.append(client_address[0])
+            cached = last_frames.get(client_address[0])
+            clients.append(client_thread)
+            update_display_count()
+            clients_mutex.release()
+            if RESUME_CACHE and cached is not None:
+                client_thread.send(*cached)
+            client_thread.start()
+            client_connected.set()
+
+# Client connection thread
+class ClientThread(threading.Thread):
+
+    # Constructor
+    def __init__(self, client_address, client_socket):
+        threading.Thread.__init__(self, daemon=True)
+        self.client_socket = client_socket
+        self.client_address = client_address
+        self.q = queue.Queue()
+        self.clock = ClockSync()
+        self.capture_times = {}                 # Frame id -> capture time
+        self.latency = LatencyHistogram()       # Capture to display
+        self.decode_time = LatencyHistogram()
+        self.render_time = LatencyHistogram()
+        self.dropped = 0
+        self.connect_time = time.perf_counter()
+        self.first_frame_time = None            # Connect to first frame sent
+        self.delta = None                       # DeltaEncoder (delta codec)
+        self.resyncing = False                  # Keyframe asked for, not sent
+        self.idle = False                       # Showing its own idle content
+        self.idle_sent = 0.0                    # Last idle message sent
+        self.idle_frames = 0                    # Frames not sent while idle
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.encode_time = 0.0                  # Seconds spent encoding frames
+        self.delivered = collections.deque()    # When frames were answered
+        self.priority = 0.0                     # Scheduling state (last frame)
+        self.level = 0
+        self.quality = jpeg_quality
+
+    # Estimate the client's clock offset with a few round trips
+    def sync_clock(self):
+        for _ in range(SYNC_ROUNDS):
+            sent = time.time()
+            self.client_socket.sendall(protocol.pack_sync(sent))
+            reply = protocol.recv_reply(self.client_socket)
+            received = time.time()
+            if reply[0] != protocol.SYNC_REPLY or reply[1] != sent:
+                raise ValueError("Unexpected reply to clock sync")
+            self.clock.add(sent, reply[2], received)
+        if DEBUG:
+            print("Clock offset for " + str(self.client_address) + ": " +
+                    "{:.1f} ms (rtt {:.1f} ms)".format(self.clock.offset * 1000,
+                                                        self.clock.rtt * 1000))
+
+    # Update statistics from a telemetry reply. The frame put on screen is
+    # reported one reply later, as the client replies before rendering.
+    # Replies to idle messages have no decode time.
+    def add_telemetry(self, reply, decoded=True):
+        (_, frame_id, recv_time, decode_time, shown_id, shown_time,
+            render_time, dropped) = reply
+        if decoded:
+            self.decode_time.add(decode_time)
+        capture_time = None
+        if shown_time > 0:
+            capture_time = self.capture_times.pop(shown_id, None)
+        if capture_time is not None:
+            self.latency.add(self.clock.to_server(shown_time) - capture_time)
+            self.render_time.add(render_time)
+        self.dropped = dropped
+
+    # Thread loop
+    def run(self):
+        self.client_socket.settimeout(SOCKET_TIMEOUT)
+        running = True
+        try:
+            self.sync_clock()
+        except (socket.error, ValueError) as e:
+            print("Clock sync failed:", str(e))
+            running = False
+
+        while running:
+            
+            # Send message to client (None once replaced by a reconnect)
+            item = self.q.get()
+            if item is None:
+                break
+            frame_id, capture_time, data = item
+            try:
+                self.client_socket.sendall(data)
+                if protocol.message_type(data) == protocol.FRAME:
+                    self.resyncing = False
+                if DEBUG:
+                    print("Sent data to: " + str(self.client_address))
+                if self.first_frame_time is None:
+                    self.first_frame_time = time.perf_counter() - \
+                                            self.connect_time
+                    if DEBUG:
+                        print("First frame to " + str(self.client_address) + 
+                                " {:.2f} s after connecting".format(
+                                    self.first_frame_time))
+
+                # Remember when the frame was captured (keep the last few)
+                self.capture_times[frame_id] = capture_time
+                while len(self.capture_times) > 64:
+                    del self.capture_times[next(iter(self.capture_times))]
+
+                # Wait for telemetry response (doubles as keepalive)
+                reply = protocol.recv_reply(self.client_socket)
+                if DEBUG:
+                    print("From client:", reply)
+                if reply[0] == protocol.TELEMETRY:
+                    decoded = protocol.message_type(data) != protocol.IDLE
+                    self.add_telemetry(reply, decoded)
+                    if decoded:
+                        self.add_delivered()
+
+                # The client could not decode the frame, so deltas no longer
+                # apply to what it has. Deltas already queued behind it fail
+                # too, one keyframe is enough.
+                elif reply[0] == protocol.NACK:
+                    if DEBUG:
+                        print("Frame " + str(reply[1]) + " not decoded by " +
+                                str(self.client_address))
+                    if self.delta is not None and not self.resyncing:
+                        self.resyncing = True
+                        self.delta.reset()
+
+            # If we don't get a response, shut socket down
+            except socket.timeout as e:
+                print("Socket timeout:", str(e))
+                running = False
+            except (socket.error, ValueError) as e:
+                print("Socket error:", str(e))
+                running = False
+
+        # Close socket
+        self.client_socket.close()
+        if DEBUG:
+            print("Client " + str(self.client_address) + " disconnected")
+
+        # Remove self from list (unless a reconnect already did)
+        clients_mutex.acquire()
+        if self in clients:
+            clients.remove(self)
+        update_display_count()
+        clients_mutex.release()
+
+    # Add message to queue
+    def send(self, data, frame_id=0, capture_time=0.0):
+        self.q.put((frame_id, capture_time, data))
+
+    # Drop the connection, waking the thread from a blocking send or receive
+    # or an empty queue so it exits
+    def close(self):
+        try:
+            self.client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.q.put(None)
+
+    # Note a frame the display answered (keeps fps_window seconds)
+    def add_delivered(self):
+        now = time.perf_counter()
+        self.delivered.append(now)
+        while self.delivered[0] < now - fps_window:
+            self.delivered.popleft()
+
+    # Frames per second the display answered recently
+    def delivered_fps(self):
+        start = time.perf_counter() - fps_window
+        return sum(1 for t in list(self.delivered) if t >= start) / fps_window
+
+    # Delivered frame rate and scheduling state
+    def stats(self):
+        return {"host": self.client_address[0],
+                "fps": round(self.delivered_fps(), 1),
+                "priority": round(self.priority, 2),
+                "level": self.level,
+                "quality": self.quality,
+                "idle": self.idle}
+
+    # Count a frame message that was encoded for this display
+    def add_sent(self, size, encode_time):
+        self.frames_sent += 1
+        self.bytes_sent += size
+        self.encode_time += encode_time
+
+    # Frames, bytes and encoding time saved by not streaming while idle (the
+    # last two estimated from the frames that were sent)
+    def idle_report(self):
+        sent = max(self.frames_sent, 1)
+        return "Idle: {} frames not sent, saved ~{:.1f} MB, ~{:.1f} s " \
+                "encoding".format(self.idle_frames,
+                                    self.idle_frames * self.bytes_sent / sent
+                                        / 1e6,
+                                    self.idle_frames * self.encode_time / sent)
+
+    # One line summary of latency statistics
+    def report(self):
+        return "Display " + str(self.client_address[0]) + \
+                ": delivered {:.1f} fps".format(self.delivered_fps()) + \
+                " | capture-to-display " + str(self.latency) + \
+                " | decode " + str(self.decode_time) + \
+                " | render " + str(self.render_time) + \
+                " | dropped " + str(self.dropped) + \
+                ("" if self.delta is None else " | " + self.delta.report()) + \
+                ("" if not self.idle_frames else " | " + self.idle_report())
+
+# Loads a model in the background so the frame loop keeps running
+class RunnerLoader(threading.Thread):
+
+    # Constructor
+    def __init__(self, name, model_file):
+        threading.Thread.__init__(self, daemon=True)
+        self.name = name
+        self.model_file = model_file
+        self.runner = None
+        self.error = None
+
+    # Thread loop
+    def run(self):
+        try:
+            self.runner = load_runner(self.model_file)
+        except Exception as e:
+            self.error = e
+
+# Id and capture time of sub-images taken from the ring (split mode)
+class RingFrame:
+
+    # Constructor
+    def __init__(self, index, timestamp):
+        self.index = index
+        self.timestamp = timestamp
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Load and initialize one model (raises if it fails to load)
+def load_runner(model_file):
+
+    # The ImpulseRunner module will attempt to load files relative to its location,
+    # so we make it load files relative to this program instead
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    model_path = os.path.join(dir_path, model_file)
+    if FAST_RUNNER:
+        runner = FastImageRunner(model_path)
+    else:
+        from edge_impulse_linux.image import ImageImpulseRunner
+        runner = ImageImpulseRunner(model_path)
+
+    # Initialize model (and print information if it loads)
+    try:
+        model_info = runner.init()
+    except Exception:
+        runner.stop()
+        raise
+    if DEBUG:
+        print("Model name:", model_info['project']['name'])
+        print("Model owner:", model_info['project']['owner'])
+    return runner
+
+# Size of the square sub-image around each FOMO face (in capture_res pixels)
+def get_sub_size():
+    return int(sub_res[0] * capture_res[0] / resize_res[0])
+
+# Create the detector for a runner (look for faces around their last known
+# position if roi_inference is set, still one inference per frame and model)
+def make_detector(runner):
+    if roi_inference:
+        return RoiDetector(runner, capture_res, resize_res, threshold)
+    return FullFrameDetector(runner, capture_res, resize_res, threshold)
+
+# Create the detectors and model cascade for a set of runners
+def make_cascade(runners):
+    detectors = {name: make_detector(runner) for name, runner in runners.items()}
+    return Cascade(detectors.get("fomo"),
+                    detectors.get("ssd"),
+                    mode=MODE,
+                    fps_budget=fps_budget,
+                    ssd_interval=ssd_interval,
+                    ambiguous_range=ambiguous_range,
+                    default_size=get_sub_size() / (1 + box_increase))
+
+# Models needed by a detection mode
+def required_models(mode):
+    return ("fomo", "ssd") if mode == "cascade" else (mode,)
+
+# Apply setting changes between frames. Models that change (or are needed by a
+# new mode) are loaded by background threads, see swap_runners().
+def apply_settings(changes, cascade, governor, runners, loaders):
+    globals().update(changes)
+    if DEBUG:
+        print("Settings changed:", changes)
+
+    # Start loading new or missing models (not possible when replaying)
+    for name in ("fomo", "ssd"):
+        wanted = name in required_models(MODE) and \
+                    (name + "_model_file" in changes or name not in runners)
+        if not wanted or name in loaders:
+            continue
+        if REPLAY_FILE is not None:
+            print("Replaying, cannot load " + globals()[name + "_model_file"])
+            continue
+        start_loader(name, loaders)
+
+    # Update the live objects
+    for detector in (cascade.fomo, cascade.ssd):
+        if detector is not None:
+            detector.threshold = threshold
+    cascade.fps_budget = fps_budget
+    cascade.ssd_interval = ssd_interval
+    cascade.ambiguous_range = ambiguous_range
+    cascade.default_size = get_sub_size() / (1 + box_increase)
+    governor.set_rates(target_fps, idle_fps, static_fps)
+    governor.static_threshold = static_threshold
+    governor.static_frames = static_frames
+    update_mode(cascade, runners)
+
+# Switch the cascade to MODE once the models it needs are loaded
+def update_mode(cascade, runners):
+    if cascade.mode != MODE and \
+            all(name in runners for name in required_models(MODE)):
+        cascade.set_mode(MODE)
+
+# Start loading a model in the background
+def start_loader(name, loaders):
+    loaders[name] = RunnerLoader(name, globals()[name + "_model_file"])
+    loaders[name].start()
+
+# Check if the models needed by the cascade's current mode are loaded
+def models_ready(cascade, runners):
+    return all(name in runners for name in required_models(cascade.mode))
+
+# Swap in models that finished loading in the background, return the names
+# of models that failed to load
+def swap_runners(cascade, runners, loaders, recorder, timeline=None):
+    failed = []
+    for name, loader in list(loaders.items()):
+        if loader.is_alive():
+            continue
+        del loaders[name]
+        if loader.error is not None:
+            print("ERROR: Could not initialize model " + loader.model_file)
+            print("Exception:", loader.error)
+            failed.append(name)
+            continue
+        if timeline is not None:
+            timeline.mark("model " + name + " loaded")
+        runner = loader.runner
+        if recorder is not None:
+            runner = RecordingRunner(runner, recorder, name)
+        old = runners.get(name)
+        runners[name] = runner
+        setattr(cascade, name, make_detector(runner))
+        if old is not None:
+            old.stop()
+        if DEBUG:
+            print("Swapped in model " + loader.model_file)
+    update_mode(cascade, runners)
+    return failed
+
+# Connected displays in slot order, so a reconnecting display keeps its place
+def get_displays():
+    clients_mutex.acquire()
+    slots = {host: i for i, host in enumerate(display_slots)}
+    displays = sorted(clients,
+                        key=lambda c: slots.get(c.client_address[0], len(slots)))
+    clients_mutex.release()
+    return displays
+
+# Tell the capture process how many displays are connected (split mode)
+def update_display_count():
+    if ring is not None:
+        ring.set_value(RING_DISPLAYS, len(clients))
+
+# Send a message to a display and remember it for a reconnect (only full
+# frames, a delta is no use to a display that just connected)
+def send_to_display(client, data, frame):
+    client.send(data, frame.index, frame.timestamp)
+    if protocol.message_type(data) == protocol.FRAME:
+        last_frames[client.client_address[0]] = (data, frame.index,
+                                                    frame.timestamp)
+
+# Small JPEG of the whole frame (model input) with the face regions drawn on
+def encode_preview(frame, bboxes):
+    img = cv2.cvtColor(frame.small, cv2.COLOR_RGB2BGR)
+    if draw_frames:
+        scale_x = img.shape[1] / capture_res[0]
+        scale_y = img.shape[0] / capture_res[1]
+        for _, x0, y0, x1, y1 in bboxes:
+            cv2.rectangle(img, 
+                            (int(x0 * scale_x), int(y0 * scale_y)),
+                            (int(x1 * scale_x), int(y1 * scale_y)),
+                            (0, 255, 0), 
+                            1)
+    _, img_jpg = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return img_jpg.tobytes()
+
+# Find faces and turn them into square sub-image regions (best first)
+def detect_regions(cascade, frame):
+
+    # Perform inference (boxes are mapped to capture_res)
+    found = []
+    try:
+        found = cascade.detect(frame)
+    except Exception as e:
+        print("ERROR: Could not perform inference")
+        print("Exception:", e)
+        
+    # Display predictions and timing data
+    if DEBUG:
+        print("Output:", cascade.last_result)
+    
+    # FOMO only gives centroids: make fixed size squares around them.
+    # Otherwise make the boxes bigger and square (largest first).
+    if cascade.mode == "fomo":
+        bboxes = boxes.fixed_regions(found, threshold, get_sub_size(),
+                                        capture_res)
+    else:
+        bboxes = boxes.scaled_regions(found, threshold, box_increase,
+                                        capture_res)
+    if DEBUG:
+        print("Boxes:", bboxes)
+
+    return bboxes
+
+# Cut one sub-image per display: faces first, then the default center of the
+# image. Sub-images are views into the full frame (BGR, or its YUV planes with
+# yuv_capture). With idle_content, a display that had no face for idle_after
+# frames gets None instead (it shows idle content).
+def cut_sub_images(frame, bboxes, num_displays):
+    del no_face_frames[num_displays:]
+    no_face_frames.extend([0] * (num_displays - len(no_face_frames)))
+    sub_imgs = []
+    for i in range(num_displays):
+        if i < min(len(bboxes), num_faces):
+            no_face_frames[i] = 0
+            _, x0, y0, x1, y1 = bboxes[i]
+        else:
+            no_face_frames[i] += 1
+            if idle_content and no_face_frames[i] > idle_after:
+                sub_imgs.append(None)
+                continue
+            _, x0, y0, x1, y1 = boxes.center_region(default_sub_res,
+                                                    capture_res)
+        sub_imgs.append(frame.crop(x0, y0, x1, y1))
+    return sub_imgs
+
+# Face score of each display slot for scheduling (0 for the center crop)
+def face_scores(bboxes, num_displays):
+    area = float(capture_res[0] * capture_res[1])
+    scores = []
+    for i in range(num_displays):
+        if i < min(len(bboxes), num_faces):
+            value, x0, y0, x1, y1 = bboxes[i]
+            scores.append(face_score(value, (x1 - x0) * (y1 - y0) / area))
+        else:
+            scores.append(0.0)
+    return scores
+
+# Compress a sub-image to JPEG (returns an array of bytes)
+def encode_jpeg(sub_img, quality=None):
+    if isinstance(sub_img, YuvImage):
+        return yuv.encode_jpeg(sub_img, quality or jpeg_quality, circle_mask,
+                                yuv_turbojpeg)
+    if circle_mask:
+        sub_img = mask.apply_mask(sub_img)
+    _, img_jpg = cv2.imencode('.jpg', sub_img,
+                                [cv2.IMWRITE_JPEG_QUALITY,
+                                    quality or jpeg_quality])
+    return img_jpg
+
+# Compress a sub-image into a frame message for a client
+def encode_sub_image(sub_img, frame, quality=None):
+    return protocol.pack_frame(frame.index, frame.timestamp, sub_img.shape[1],
+                                sub_img.shape[0], encode_jpeg(sub_img, quality))
+
+# Decide which displays get this frame: (send, quality, priority, level) for
+# each display slot that is not idle
+def schedule(displays, sub_imgs, scores):
+    slots = [slot for slot, sub_img in enumerate(sub_imgs[:len(displays)])
+                if sub_img is not None]
+    if not schedule_displays:
+        return {slot: (True, jpeg_quality, scores[slot], 0) for slot in slots}
+    scheduler.target_fps = target_fps
+    scheduler.min_quality = min_jpeg_quality
+    scheduler.max_backlog = max_backlog
+    plan = scheduler.plan([(displays[slot], scores[slot],
+                            displays[slot].q.qsize()) for slot in slots],
+                            jpeg_quality)
+    return dict(zip(slots, plan))
+
+# Compress the sub-images for the displays, returns (slot, client, message)
+# for each one that gets a message (idle displays mostly don't, nor do
+# displays the scheduler skips)
+def encode_for_displays(displays, sub_imgs, frame, scores):
+    plan = schedule(displays, sub_imgs, scores)
+    messages = []
+    for slot, (client, sub_img) in enumerate(zip(displays, sub_imgs)):
+        try:
+            if sub_img is None:
+                data = encode_idle(client)
+            else:
+                client.idle = False
+                send, client.quality, client.priority, client.level = \
+                    plan[slot]
+                if not send:
+                    continue
+                start = time.perf_counter()
+                data = encode_for_display(client, sub_img, frame,
+                                            client.quality)
+                client.add_sent(len(data), time.perf_counter() - start)
+            if data is not None:
+                messages.append((slot, client, data))
+        except Exception as e:
+            print("Error:", str(e))
+    return messages
+
+# Delivered frame rate and scheduling state of each display (control socket).
+# In split mode only the frame rate of each slot is known here.
+def display_stats():
+    if ring is not None:
+        return [{"slot": slot,
+                    "fps": ring.get_value(RING_FPS + slot) / 1000.0}
+                for slot in range(min(ring.get_value(RING_DISPLAYS),
+                                        RING_FPS_SLOTS))]
+    return [client.stats() for client in get_displays()]
+
+# Sub-image as the ring stores it (split mode): BGR pixels, converted from YUV
+# crops, or an empty image for an idle display
+def ring_image(frame, sub_img):
+    if sub_img is None:
+        return frame.small[:0, :0]
+    if isinstance(sub_img, YuvImage):
+        return sub_img.to_bgr()
+    return sub_img
+
+# Idle message for a display without a face: sent when it goes idle, then
+# every idle_keepalive seconds so the client knows the server is still there
+# (None when nothing needs to be sent)
+def encode_idle(client):
+    now = time.perf_counter()
+    if client.idle:
+        client.idle_frames += 1
+        if now - client.idle_sent < idle_keepalive:
+            return None
+    client.idle = True
+    client.idle_sent = now
+
+    # The display shows its own content now, start over with a keyframe
+    if client.delta is not None:
+        client.delta.reset()
+    return protocol.pack_idle(time.time())
+
+# Send encoded messages to their displays (the preview reuses the same JPEGs)
+def send_messages(messages, frame, preview):
+    for slot, client, data in messages:
+        try:
+            send_to_display(client, data, frame)
+            if preview is not None and \
+                    protocol.message_type(data) == protocol.FRAME:
+                preview.publish("display" + str(slot),
+                                protocol.frame_jpeg(data))
+            if DEBUG:
+                print("Sending message of " + str(len(data)) + " bytes to " +
+                        str(client.client_address))
+        except Exception as e:
+            print("Error:", str(e))
+
+# Start the preview server (None if it is off or can't start)
+def start_preview():
+    if PREVIEW_PORT is None:
+        return None
+    try:
+        preview = PreviewServer(PREVIEW_HOST, PREVIEW_PORT, preview_fps)
+        preview.start()
+        return preview
+    except OSError as e:
+        print("ERROR: Could not start preview server:", str(e))
+        return None
+
+# Compress a sub-image for a display: a full frame, or with the delta codec
+# only the tiles that changed since the last message to that display
+def encode_for_display(client, sub_img, frame, quality=None):
+    quality = quality or jpeg_quality
+    if not delta_codec:
+        client.delta = None
+        return encode_sub_image(sub_img, frame, quality)
+    if client.delta is None:
+        client.delta = DeltaEncoder(delta_tile)
+    client.delta.threshold = delta_threshold
+    client.delta.keyframe_interval = keyframe_interval
+
+    # Compare at a fixed size, so a face box changing size is not a keyframe
+    if isinstance(sub_img, YuvImage):
+        sub_img = sub_img.to_bgr()
+    img = cv2.resize(sub_img, delta_res, interpolation=cv2.INTER_AREA)
+    if circle_mask:
+        img = mask.apply_mask(img)
+    positions = client.delta.encode(img)
+    if positions is None:
+        _, img_jpg = cv2.imencode('.jpg', img,
+                                    [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return protocol.pack_frame(frame.index, frame.timestamp, img.shape[1],
+                                    img.shape[0], img_jpg)
+
+    # Pack the changed tiles into one atlas image
+    data = b""
+    if delta_raw:
+        tile_format = protocol.RAW_TILES
+        if positions:
+            data = cv2.cvtColor(make_atlas(img, positions, delta_tile),
+                                cv2.COLOR_BGR2RGB).tobytes()
+    else:
+        tile_format = protocol.JPEG_TILES
+        if positions:
+            _, data = cv2.imencode('.jpg', make_atlas(img, positions,
+                                                        delta_tile),
+                                    [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return protocol.pack_delta(frame.index, frame.timestamp, img.shape[1],
+                                img.shape[0], delta_tile, tile_format,
+                                positions, data)
+
+#-------------------------------------------------------------------------------
+# Main
+
+# Network process (split mode): takes the newest sub-images from the ring,
+# encodes them and sends them to the displays. Ends with the capture process.
+def network_main(settings, parent_pid):
+    global scheduler
+    scheduler = DisplayScheduler(target_fps)
+    for host in HOSTS:
+        listening_thread = ListeningThread(host, PORT)
+        listening_thread.start()
+    preview = start_preview()
+    stats_timestamp = time.time()
+    try:
+        while os.getppid() == parent_pid:
+
+            # Apply setting changes forwarded by the capture process
+            while not settings.empty():
+                globals().update(settings.get())
+
+            # Wait for the next frame (older ones are dropped)
+            item = ring.read(1.0)
+            if item is None:
+                continue
+            start = time.perf_counter()
+            seq, frame_id, capture_time, sub_imgs, scores = item
+            frame = RingFrame(frame_id, capture_time)
+            sub_imgs = [img if img.size else None for img in sub_imgs]
+
+            # Encode straight from shared memory, then make sure the capture
+            # process did not overwrite the slot meanwhile (delta encoders
+            # start over, as their reference saw the discarded frame, and
+            # discarded idle messages are sent again)
+            displays = get_displays()
+            messages = encode_for_displays(displays, sub_imgs, frame, scores)
+            del sub_imgs, item
+            if not ring.valid(seq):
+                for _, client, _ in messages:
+                    client.idle = False
+                    if client.delta is not None:
+                        client.delta.reset()
+                continue
+            send_messages(messages, frame, preview)
+            scheduler.update(time.perf_counter() - start)
+
+            # Share the delivered frame rates with the capture process
+            for slot, client in enumerate(displays[:RING_FPS_SLOTS]):
+                ring.set_value(RING_FPS + slot,
+                                int(client.delivered_fps() * 1000))
+
+            # Report latencies and frames dropped between the processes
+            if time.time() - stats_timestamp >= stats_interval:
+                stats_timestamp = time.time()
+                print(ring.report())
+                print(scheduler.report())
+                for client in list(clients):
+                    print(client.report())
+    except KeyboardInterrupt:
+        pass
+    if preview is not None:
+        preview.stop()
+
+def main():
+    global ring, client_connected, scheduler
+    timeline = StartupTimeline(DEBUG)
+
+    # Optionally leave networking and encoding to a second process, which
+    # gets the sub-images through shared memory. It is forked first, before
+    # any threads, the camera or the models exist.
+    network = None
+    if SPLIT_PROCESSES:
+        context = multiprocessing.get_context("fork")
+        ring = FrameRing(ring_slots,
+                            max(len(HOSTS), 1) * capture_res[0] *
+                            capture_res[1] * 3)
+        client_connected = context.Event()
+        network_settings = context.Queue()
+        network = context.Process(target=network_main,
+                                    args=(network_settings, os.getpid()),
+                                    daemon=True)
+        network.start()
+
+    # Start listening threads first, so displays can connect while the models
+    # load and the camera starts
+    else:
+        for host in HOSTS:
+            listening_thread = ListeningThread(host, PORT, timeline)
+            listening_thread.start()
+
+    # Play back a recording instead of using the camera and models
+    loaders = {}
+    if REPLAY_FILE is not None:
+        source = ReplaySource(REPLAY_FILE, capture_res, resize_res, replay_speed)
+        runners = {"fomo": ReplayRunner(source, "fomo"),
+                    "ssd": ReplayRunner(source, "ssd")}
+
+    # Load the models in the background while the camera starts (frames show
+    # the default center crop until they are ready)
+    else:
+        if yuv_capture:
+            source = PiCameraSource(capture_res, resize_res, rotation,
+                                    yuv=True)
+        else:
+            source = PiCameraSource(capture_res, resize_res, rotation,
+                                    dual_stream)
+        runners = {}
+        for name in required_models(MODE):
+            start_loader(name, loaders)
+
+    # Log frames along with every classify() result
+    recorder = None
+    if RECORD_FILE is not None:
+        recorder = Recorder(RECORD_FILE, record_res, record_jpeg_quality)
+        for name in runners:
+            runners[name] = RecordingRunner(runners[name], recorder, name)
+
+    # Initial framerate value
+    fps = 0
+
+    # Create detectors and model cascade
+    cascade = make_cascade(runners)
+    governor = FrameGovernor(target_fps, idle_fps, static_fps, 
+                                static_threshold, static_frames)
+    stats_timestamp = time.time()
+
+    # Profile on request (nothing runs until asked)
+    profiler = Profiler("server", PROFILE_DIR, PROFILE_SECONDS)
+    profiler.install()
+
+    # Accept setting changes (and profiling commands) from a file and/or the
+    # local control socket
+    config = ConfigUpdates({name: globals()[name] for name in LIVE_SETTINGS},
+                            {"MODE": lambda mode: mode in MODES},
+                            CONFIG_FILE, CONTROL_PORT,
+                            commands={"profile": profiler.profile,
+                                        "stacks": profiler.stacks,
+                                        "memory": profiler.memory,
+                                        "displays": display_stats})
+    config.start()
+
+    # Serve previews of the camera and of what each display gets, and
+    # schedule frames across displays (the network process does both in
+    # split mode)
+    preview = None
+    if network is None:
+        preview = start_preview()
+        scheduler = DisplayScheduler(target_fps)
+
+    # Start the camera or playback (small RGB frames for the model, full BGR or
+    # YUV frames for crops). Stop with ctrl+c.
+    exit_code = 0
+    try:
+        with source:
+            timeline.mark("camera open")
+
+            # Continuously capture frames (this is our while loop)
+            for frame in source:
+                                                
+                # Get timestamp for calculating actual framerate
+                timestamp = cv2.getTickCount()
+            
+                # Find faces once the models are loaded, and record the frame
+                # along with the model output
+                timeline.mark("first capture")
+                bboxes = []
+                if models_ready(cascade, runners):
+                    bboxes = detect_regions(cascade, frame)
+                    if not timeline.has("first detection"):
+                        timeline.mark("first detection")
+                        print(timeline)
+                if recorder is not None:
+                    recorder.write_frame(frame)
+
+                # Create sub-images (limit number of faces to number of clients)
+                if ring is None:
+                    displays = get_displays()
+                    num_displays = len(displays)
+                else:
+                    num_displays = ring.get_value(RING_DISPLAYS)
+                sub_imgs = cut_sub_images(frame, bboxes, num_displays)
+                scores = face_scores(bboxes, num_displays)
+
+                # Compress and send image data to clients, or hand the
+                # sub-images to the network process (an empty image stands
+                # for an idle display)
+                if ring is None:
+                    send_messages(encode_for_displays(displays, sub_imgs,
+                                                        frame, scores),
+                                    frame, preview)
+                elif sub_imgs:
+                    ring.write(frame.index, frame.timestamp,
+                                [ring_image(frame, img) for img in sub_imgs],
+                                scores)
+                if sub_imgs:
+                    timeline.mark("first frame sent")
+                if preview is not None and preview.wants("camera"):
+                    preview.publish("camera", encode_preview(frame, bboxes))
+            
+                # Calculate framrate
+                frame_time = (cv2.getTickCount() - timestamp) / \
+                                cv2.getTickFrequency()
+                fps = 1 / frame_time
+                cascade.frame_done(frame_time)
+                if network is None:
+                    scheduler.update(frame_time)
+                if DEBUG:
+                    print("FPS:", fps)
+
+                # Report per-model inference counts and latencies
+                if time.time() - stats_timestamp >= stats_interval:
+                    stats_timestamp = time.time()
+                    print(cascade.report())
+                    print(governor.report())
+                    if network is None:
+                        print(scheduler.report())
+                    for client in list(clients):
+                        print(client.report())
+            
+                # Sleep until the next frame is due (slower while the scene is
+                # static or every display shows idle content)
+                governor.update(frame, num_displays,
+                                sum(img is not None for img in sub_imgs))
+                governor.wait(client_connected)
+
+                # Apply setting changes and loaded models before the next frame
+                changes = config.pending()
+                if changes:
+                    apply_settings(changes, cascade, governor, runners, loaders)
+                    if network is not None:
+                        network_settings.put(changes)
+                failed = swap_runners(cascade, runners, loaders, recorder,
+                                        timeline)
+
+                # Give up if a model never loaded
+                if any(name not in runners for name in failed):
+                    exit_code = 1
+                    break
+
+    except KeyboardInterrupt:
+        pass
+
+    # Clean up
+    config.stop()
+    if preview is not None:
+        preview.stop()
+    if network is not None:
+        network.terminate()
+        network.join()
+        ring.close(unlink=True)
+    for loader in loaders.values():
+        loader.join()
+        if loader.runner is not None:
+            loader.runner.stop()
+    if recorder is not None:
+        recorder.close()
+    for runner in runners.values():
+        runner.stop()
+    if exit_code != 0:
+        sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
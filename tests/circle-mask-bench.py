@@ -0,0 +1,94 @@
+"""
+Circular mask benchmark
+
+Measures JPEG bytes per frame and encode time with and without the round
+display mask, on crop sizes the server actually sends: 240x240 (small SSD box),
+480x480 (default center crop), and 816x816 (FOMO sub_res scaled up to
+capture_res). Pass an image path to cut crops from a real capture instead of
+the synthetic test scene.
+
+Usage: python3 circle-mask-bench.py [image.jpg]
+
+License: Apache-2.0
+"""
+
+import os, sys, time
+
+import numpy as np
+import cv2
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+from facedress import mask
+
+# Settings
+capture_res = (1088, 1088)              # Resolution captured by the camera
+crop_sizes = [240, 480, 816]            # Sub-image sizes to test
+jpeg_quality = 95                       # OpenCV default JPEG quality
+num_iters = 50                          # Encodes per measurement
+
+# Build a synthetic scene: smooth gradients, a "face", and sensor noise
+def make_scene(res):
+    rng = np.random.default_rng(0)
+    ys, xs = np.mgrid[0:res[1], 0:res[0]]
+    img = np.zeros((res[1], res[0], 3), dtype=np.float32)
+    img[..., 0] = 80 + 60 * np.sin(xs / 90.0)
+    img[..., 1] = 90 + 50 * np.cos(ys / 70.0)
+    img[..., 2] = 120 + 40 * np.sin((xs + ys) / 150.0)
+    img = img.astype(np.uint8)
+    center = (res[0] // 2, res[1] // 2)
+    cv2.ellipse(img, center, (200, 260), 0, 0, 360, (150, 170, 210), -1)
+    cv2.circle(img, (center[0] - 80, center[1] - 60), 25, (40, 40, 40), -1)
+    cv2.circle(img, (center[0] + 80, center[1] - 60), 25, (40, 40, 40), -1)
+    cv2.ellipse(img, (center[0], center[1] + 110), (90, 30), 0, 0, 180,
+                    (60, 60, 140), 8)
+    noise = rng.normal(0, 6, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+# Average encode time (seconds) and size (bytes) over several runs
+def measure(img, use_mask):
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+    size = 0
+    start = time.perf_counter()
+    for _ in range(num_iters):
+        sub_img = mask.apply_mask(img) if use_mask else img
+        _, img_jpg = cv2.imencode('.jpg', sub_img, params)
+        size = len(img_jpg)
+    return (time.perf_counter() - start) / num_iters, size
+
+def main(argv):
+
+    # Load or generate the full frame
+    if len(argv) > 0:
+        frame = cv2.imread(argv[0], cv2.IMREAD_COLOR)
+        frame = cv2.resize(frame, capture_res, interpolation=cv2.INTER_LINEAR)
+    else:
+        frame = make_scene(capture_res)
+
+    # Prime the mask cache so we measure steady-state cost
+    for size in crop_sizes:
+        mask.get_mask(size, size)
+
+    print("crop      visible  bytes (full/masked)   saved   " +
+            "encode ms (full/masked)")
+    for size in crop_sizes:
+
+        # Take crop from center of frame (as a view, like the server does)
+        x0 = (capture_res[0] - size) // 2
+        y0 = (capture_res[1] - size) // 2
+        crop = frame[y0:y0 + size, x0:x0 + size]
+
+        # Compare encoder output with and without the mask
+        t_full, b_full = measure(crop, False)
+        t_mask, b_mask = measure(crop, True)
+        print("{0:>4}x{0:<4} {1:6.1%}  {2:8d} / {3:<8d}  {4:6.1%}   {5:7.2f} / {6:.2f}"
+                .format(size,
+                        mask.visible_fraction(size, size),
+                        b_full,
+                        b_mask,
+                        1 - (b_mask / b_full),
+                        t_full * 1000,
+                        t_mask * 1000))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,93 @@
+"""
+Client startup benchmark
+
+Starts client.py in a fresh Python process (lean pygame mode and OpenCV mode),
+serves it frames from a local fake server, and reports the time from process
+launch to the first frame on screen (taken from the client's telemetry) and
+the client's resident memory once that frame is shown. Runs with SDL's dummy
+video driver, so no display is needed. Linux only (reads /proc for RSS).
+
+Usage: python3 client-startup-bench.py [runs]
+
+License: Apache-2.0
+"""
+
+import os, sys, time, socket, subprocess
+
+import numpy as np
+import cv2
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+from facedress import protocol
+
+# Settings
+frame_res = (240, 240)
+frame_interval = 0.05
+
+# Code run in the client process (settings patched before main)
+client_code = """
+import sys
+sys.path.insert(0, {root!r})
+import client
+client.HOST = '127.0.0.1'
+client.PORT = {port}
+client.DEBUG = False
+client.LEAN = {lean}
+client.main()
+"""
+
+# Resident set size of a process in MB
+def rss_mb(pid):
+    with open("/proc/" + str(pid) + "/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+# Launch a client, feed it until it reports a shown frame
+def run_client(lean):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    port = listener.getsockname()[1]
+
+    img = np.random.randint(0, 255, (frame_res[1], frame_res[0], 3), np.uint8)
+    jpg = cv2.imencode('.jpg', cv2.GaussianBlur(img, (15, 15), 0))[1]
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy",
+                PYGAME_HIDE_SUPPORT_PROMPT="1")
+    code = client_code.format(root=os.path.join(dir_path, ".."), port=port,
+                                lean=lean)
+    launch_time = time.time()
+    proc = subprocess.Popen([sys.executable, "-c", code], env=env)
+    try:
+        conn, _ = listener.accept()
+        conn.settimeout(10.0)
+
+        # Skip clock sync (client and server share a clock here)
+        frame_id = 0
+        while True:
+            frame_id += 1
+            conn.sendall(protocol.pack_frame(frame_id, time.time(),
+                                                frame_res[0], frame_res[1], jpg))
+            reply = protocol.recv_reply(conn)
+            shown_time = reply[5]
+            if shown_time > 0:
+                return shown_time - launch_time, rss_mb(proc.pid)
+            time.sleep(frame_interval)
+    finally:
+        proc.kill()
+        proc.wait()
+        listener.close()
+
+def main(argv):
+    runs = int(argv[0]) if len(argv) > 0 else 3
+    for name, lean in (("lean (pygame)", True), ("opencv", False)):
+        results = [run_client(lean) for _ in range(runs)]
+        first = [r[0] for r in results]
+        rss = [r[1] for r in results]
+        print("{:<14} first frame {:.2f} s (min {:.2f}) | RSS {:.1f} MB".format(
+                name, np.mean(first), np.min(first), np.mean(rss)))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
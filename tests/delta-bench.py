@@ -0,0 +1,121 @@
+"""
+Delta codec benchmark
+
+Compares full-frame JPEG with the tile delta codec (facedress/delta.py) on
+synthetic display streams with camera noise: the default center crop with a
+face moving through it, a crop of a still face, and a crop following a moving
+face. Reports bytes per frame, server encode time and client decode time
+(pygame and OpenCV paths) per frame, and checks that the client's patched frame
+stays close to the source.
+
+Usage: python3 delta-bench.py [num_frames] [noise_sigma]
+
+License: Apache-2.0
+"""
+
+import os, sys, time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import cv2
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import client
+import server
+from facedress import boxes, protocol
+from facedress.sources import SyntheticSource
+
+# Stand-in for a ClientThread (only the encoder state is used)
+class Display:
+    def __init__(self):
+        self.delta = None
+
+# Frame index and timestamp, like a captured frame
+class Frame:
+    def __init__(self, index):
+        self.index = index
+        self.timestamp = time.time()
+
+# Crops of one scenario, with fresh camera noise on every frame
+def make_crops(scenario, num_frames, sigma):
+    source = SyntheticSource(server.capture_res, server.resize_res)
+    res = server.capture_res
+    img = np.empty((res[1], res[0], 3), dtype=np.uint8)
+    rng = np.random.default_rng(1)
+    crops = []
+    for i in range(num_frames):
+        index = 0 if scenario == "still face" else i
+        source.render(index, res, img)
+        if scenario == "center crop":
+            _, x0, y0, x1, y1 = boxes.center_region(server.default_sub_res,
+                                                    res)
+        else:
+            x, y, w, h = source.face_box(index)
+            x0, y0 = max(x - w // 2, 0), max(y - h // 2, 0)
+            x1, y1 = min(x + w + w // 2, res[0]), min(y + h + h // 2, res[1])
+        crop = img[y0:y1, x0:x1].astype(np.int16)
+        crop += rng.normal(0, sigma, crop.shape).astype(np.int16)
+        crops.append(np.clip(crop, 0, 255).astype(np.uint8))
+    return crops
+
+# Encode every crop, then decode the messages like the client does
+def run(crops, delta, lean):
+    server.delta_codec = delta
+    client.LEAN = lean
+    decode = client.decode_lean if lean else client.decode_opencv
+    patch = client.patch_pygame if lean else client.patch_opencv
+    display = Display()
+    messages = []
+    start = time.perf_counter()
+    for i, crop in enumerate(crops):
+        messages.append(server.encode_for_display(display, crop, Frame(i)))
+    encode_time = time.perf_counter() - start
+
+    frame = None
+    start = time.perf_counter()
+    for message in messages:
+        payload = memoryview(message)[protocol.LENGTH.size:]
+        if payload[0] == protocol.DELTA:
+            (_, _, width, height, tile, tile_format, positions,
+                data) = protocol.unpack_delta(payload)
+            frame = patch(frame, positions, tile, tile_format, data, width,
+                            height)
+        else:
+            _, _, width, height, jpg = protocol.unpack_frame(payload)
+            frame = decode(jpg, width, height)
+    decode_time = time.perf_counter() - start
+
+    # Last frame as shown vs. the source scaled the same way
+    if lean:
+        frame = np.transpose(client.pygame.surfarray.array3d(frame), (1, 0, 2))
+        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    source = server.mask.apply_mask(cv2.resize(crops[-1], frame.shape[1::-1],
+                                                interpolation=cv2.INTER_AREA))
+    error = np.abs(frame.astype(np.int16) - source).mean()
+    n = len(crops)
+    return (sum(len(m) for m in messages) / n, encode_time / n,
+            decode_time / n, error, display.delta)
+
+def main(argv):
+    num_frames = int(argv[0]) if len(argv) > 0 else 120
+    sigma = float(argv[1]) if len(argv) > 1 else 2.0
+    server.DEBUG = False
+    print("{} frames, camera noise sigma {:.1f}".format(num_frames, sigma))
+    for scenario in ("center crop", "still face", "moving face"):
+        crops = make_crops(scenario, num_frames, sigma)
+        print("\n" + scenario + " ({}x{} crops):".format(crops[0].shape[1],
+                                                        crops[0].shape[0]))
+        for delta in (False, True):
+            for lean in (True, False):
+                size, encode, decode, error, encoder = run(crops, delta, lean)
+                print("  {:<6} {:<7} {:6.1f} kB/frame | encode {:5.2f} ms | "
+                        "decode {:5.2f} ms | error {:4.1f}{}".format(
+                        "delta" if delta else "full",
+                        "pygame" if lean else "opencv", size / 1000,
+                        encode * 1000, decode * 1000, error,
+                        "" if encoder is None else " | " + encoder.report()))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
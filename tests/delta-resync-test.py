@@ -0,0 +1,115 @@
+"""
+Delta codec resync test
+
+Runs a server client thread with the delta codec on against a fake display
+(socket pair, no network) that fails to decode the first keyframe, like a
+corrupted JPEG would. Checks that the display answers with a NACK, that the
+server sends a keyframe next instead of deltas the display cannot apply, and
+that a single keyframe is sent for the deltas that were already queued.
+
+Usage: python3 delta-resync-test.py [num_frames]
+
+License: Apache-2.0
+"""
+
+import os, sys, time, queue, socket, threading
+
+import numpy as np
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+from facedress import protocol
+
+# Settings
+queued = 3                              # Frames sent before the first NACK
+
+# Frame index and timestamp, like a captured frame
+class Frame:
+    def __init__(self, index):
+        self.index = index
+        self.timestamp = time.time()
+
+# Display that NACKs the first keyframe and every delta until the next one,
+# records the type of every message it gets
+def display(sock, received, release):
+    reader = protocol.MessageReader(sock)
+    have_frame = False
+    first = True
+    try:
+        while True:
+            payload = reader.read()
+            if payload[0] == protocol.SYNC:
+                server_time = protocol.SYNC_MSG.unpack_from(payload)[1]
+                sock.sendall(protocol.pack_sync_reply(server_time, time.time()))
+                continue
+            if payload[0] == protocol.FRAME:
+                frame_id = protocol.unpack_frame(payload)[0]
+                have_frame = not first
+                first = False
+            else:
+                frame_id = protocol.unpack_delta(payload)[0]
+            received.put((frame_id, payload[0]))
+
+            # Hold the NACK of the first frame until more frames are queued
+            if frame_id == 0:
+                release.wait()
+            if have_frame:
+                sock.sendall(protocol.pack_telemetry(frame_id, time.time(),
+                                                        0.0, 0, 0.0, 0.0, 0))
+            else:
+                sock.sendall(protocol.pack_nack(frame_id))
+    except (OSError, ValueError):
+        pass
+    finally:
+        sock.close()
+
+def main(argv):
+    num_frames = int(argv[0]) if len(argv) > 0 else 12
+    server.DEBUG = False
+    server.delta_codec = True
+    server.keyframe_interval = 1000
+    server_sock, client_sock = socket.socketpair()
+    client = server.ClientThread(("resync", 0), server_sock)
+    client.start()
+    received = queue.Queue()
+    release = threading.Event()
+    threading.Thread(target=display, args=(client_sock, received, release),
+                        daemon=True).start()
+
+    # A still picture with some noise, so every frame after the first would
+    # be a delta
+    rng = np.random.default_rng(1)
+    img = rng.integers(0, 255, (240, 240, 3), dtype=np.uint8)
+    types = {}
+    for i in range(num_frames):
+        client.send(server.encode_for_display(client, img, Frame(i)), i)
+        if i < queued - 1:
+            continue
+        release.set()
+        while len(types) < i + 1:
+            frame_id, message_type = received.get(timeout=5.0)
+            types[frame_id] = message_type
+
+        # Let the client thread handle the reply before the next frame
+        time.sleep(0.02)
+    client.close()
+    client.join(timeout=5.0)
+
+    names = {protocol.FRAME: "K", protocol.DELTA: "d"}
+    sequence = "".join(names[types[i]] for i in range(num_frames))
+    keyframes = [i for i in range(num_frames) if types[i] == protocol.FRAME]
+    failures = []
+    if len(keyframes) != 2 or keyframes[0] != 0:
+        failures.append("expected 2 keyframes, the first one at 0")
+    elif keyframes[1] != queued:
+        failures.append("second keyframe at {} instead of {} (first frame "
+                        "after the NACK)".format(keyframes[1], queued))
+    for failure in failures:
+        print("    " + failure)
+    print("Messages {} (K keyframe, d delta): {}".format(sequence,
+            "FAIL" if failures else "PASS"))
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
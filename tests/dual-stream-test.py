@@ -0,0 +1,119 @@
+"""
+Dual stream capture test
+
+Runs PiCameraSource's dual stream loop against a fake camera (no Pi needed)
+whose full resolution port starts delivering frames a few frames after the
+model port, in several chunks per frame. Checks that no frame is handed out
+before a full frame exists, that frame ids start at 0 and follow on, that each
+frame's full view is the latest complete full frame, and that the server can
+cut sub-images from every frame.
+
+Usage: python3 dual-stream-test.py [lag_frames]
+
+License: Apache-2.0
+"""
+
+import os, sys
+
+import numpy as np
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+from facedress.sources import PiCameraSource, _FullResOutput
+
+# Settings
+num_frames = 20
+num_chunks = 3                          # Writes per full resolution frame
+
+# What capture_continuous() yields: the model input frame
+class FakeCapture:
+    def __init__(self, array):
+        self.array = array
+
+# Stand-in for PiRGBArray
+class FakeRawCapture:
+    def truncate(self, size):
+        pass
+
+# Camera whose port 1 recording starts lag frames after port 0
+class FakeCamera:
+
+    def __init__(self, capture_res, resize_res, lag):
+        self.capture_res = capture_res
+        self.resize_res = resize_res
+        self.lag = lag
+        self.output = None
+        self.captured = 0
+        self.recording = False
+
+    def start_recording(self, output, format, splitter_port):
+        self.output = output
+        self.recording = True
+
+    def stop_recording(self, splitter_port):
+        self.recording = False
+
+    # Full frame i is filled with i + 1 (padded like the camera's raw output)
+    def _write_full(self, i):
+        padded = self.output.padded
+        data = np.full(padded[0] * padded[1] * 3, i + 1, dtype=np.uint8)
+        for chunk in np.array_split(data, num_chunks):
+            self.output.write(chunk.tobytes())
+
+    def capture_continuous(self, raw_capture, **options):
+        small = np.zeros((self.resize_res[1], self.resize_res[0], 3),
+                            dtype=np.uint8)
+        for i in range(num_frames):
+            if i >= self.lag:
+                self._write_full(i)
+            self.captured = i + 1
+            yield FakeCapture(small)
+
+def main(argv):
+    lag = int(argv[0]) if len(argv) > 0 else 5
+    capture_res = server.capture_res
+    source = PiCameraSource(capture_res, server.resize_res)
+    camera = FakeCamera(capture_res, server.resize_res, lag)
+    source.camera = camera
+    output = _FullResOutput(capture_res)
+    camera.start_recording(output, format='bgr', splitter_port=1)
+
+    failures = []
+    ids = []
+    server.idle_content = False
+    for frame in source._dual_loop(output, FakeRawCapture()):
+        ids.append(frame.index)
+        full = frame.full
+        if full is None:
+            failures.append("frame {}: no full view".format(frame.index))
+            continue
+        if camera.captured <= lag:
+            failures.append("frame {} handed out before port 1 delivered "
+                            "a full frame".format(frame.index))
+        if full.shape != (capture_res[1], capture_res[0], 3):
+            failures.append("frame {}: full view is {}".format(frame.index,
+                            full.shape))
+        if full[0, 0, 0] != camera.captured:
+            failures.append("frame {}: full view is from frame {}, not "
+                            "{}".format(frame.index, full[0, 0, 0] - 1,
+                                        camera.captured - 1))
+        try:
+            server.cut_sub_images(frame, [], 2)
+        except Exception as e:
+            failures.append("frame {}: cut_sub_images failed: {}".format(
+                            frame.index, e))
+    if ids != list(range(num_frames - lag)):
+        failures.append("frame ids {} instead of 0 to {}".format(ids,
+                        num_frames - lag - 1))
+    if camera.recording:
+        failures.append("port 1 recording not stopped")
+
+    for failure in failures:
+        print("    " + failure)
+    print("Port 1 {} frames behind: {} of {} frames handed out, {}".format(
+            lag, len(ids), num_frames, "FAIL" if failures else "PASS"))
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,210 @@
+"""
+Batch classification of feature files and images
+
+Streams feature files (.txt, as exported from the Studio) and images (.jpg,
+.png, .bmp) through a pool of runner instances and writes one JSON line per
+sample with its result and latency, followed by latency statistics. Useful for
+measuring model throughput and comparing .eim builds on the same data.
+
+Directories are searched recursively.
+
+License: Apache-2.0
+"""
+
+import os
+import sys, getopt
+import signal
+import time
+import json
+import queue
+import threading
+
+import cv2
+from edge_impulse_linux.image import ImageImpulseRunner
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+from facedress.features import load_features
+
+# Settings
+FEATURE_EXTS = ('.txt',)
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+QUEUE_SIZE = 16                         # Samples parsed ahead of the runners
+
+runners = []
+
+def signal_handler(sig, frame):
+    print('Interrupted')
+    for runner in runners:
+        runner.stop()
+    sys.exit(0)
+
+signal.signal(signal.SIGINT, signal_handler)
+
+def help():
+    print('python ei-face-batch-test.py [-j <num_runners>] [-o <results.jsonl>] ' +
+            '[-r <repeat>] <path_to_model.eim> <file_or_dir> [<file_or_dir> ...]')
+
+# Yield every feature file and image under the given paths (sorted, so runs
+# over the same data are repeatable)
+def find_samples(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(FEATURE_EXTS + IMAGE_EXTS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+# Turn a sample file into model input
+def load_sample(runner, path):
+    if path.lower().endswith(IMAGE_EXTS):
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Could not read image")
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        features, cropped = runner.get_features_from_image(img)
+        return features
+    return load_features(path)
+
+# Worker: classify samples from the input queue with its own runner
+def worker(ix, runner, in_q, out_q):
+    while True:
+        item = in_q.get()
+        if item is None:
+            break
+        seq, path = item
+        record = {'seq': seq, 'path': path, 'runner': ix}
+        try:
+            start = time.perf_counter()
+            features = load_sample(runner, path)
+            loaded = time.perf_counter()
+            res = runner.classify(features)
+            done = time.perf_counter()
+            record['load_ms'] = (loaded - start) * 1000
+            record['latency_ms'] = (done - loaded) * 1000
+            record['timing'] = res.get('timing')
+            record['result'] = res.get('result')
+        except Exception as e:
+            record['error'] = str(e)
+        out_q.put(record)
+
+# Percentile of a sorted list
+def percentile(values, p):
+    if len(values) == 0:
+        return 0.0
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "hj:o:r:", ["help", "jobs=", "output=", "repeat="])
+    except getopt.GetoptError:
+        help()
+        sys.exit(2)
+
+    num_runners = os.cpu_count() or 1
+    output = "batch-results.jsonl"
+    repeat = 1
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            help()
+            sys.exit()
+        elif opt in ('-j', '--jobs'):
+            num_runners = int(arg)
+        elif opt in ('-o', '--output'):
+            output = arg
+        elif opt in ('-r', '--repeat'):
+            repeat = int(arg)
+
+    if len(args) <= 1:
+        help()
+        sys.exit(2)
+
+    # Model path is relative to the current directory, like the samples
+    modelfile = os.path.abspath(args[0])
+    print('MODEL: ' + modelfile)
+
+    # Start the pool of runners (each one is its own .eim process)
+    for i in range(num_runners):
+        runner = ImageImpulseRunner(modelfile)
+        model_info = runner.init()
+        runners.append(runner)
+    print('Loaded ' + str(num_runners) + ' runner(s) for "' + 
+            model_info['project']['owner'] + ' / ' + 
+            model_info['project']['name'] + '"')
+
+    in_q = queue.Queue(maxsize=QUEUE_SIZE)
+    out_q = queue.Queue()
+    threads = []
+    for i, runner in enumerate(runners):
+        t = threading.Thread(target=worker, args=(i, runner, in_q, out_q))
+        t.start()
+        threads.append(t)
+
+    # Feed samples, writing results as they come back
+    latencies = []
+    errors = 0
+    count = 0
+    start = time.perf_counter()
+    try:
+        with open(output, 'w') as f:
+            def drain(block):
+                nonlocal errors
+                while True:
+                    try:
+                        record = out_q.get(block=block, timeout=1.0 if block else None)
+                    except queue.Empty:
+                        return
+                    f.write(json.dumps(record) + "\n")
+                    if 'error' in record:
+                        errors += 1
+                    else:
+                        latencies.append(record['latency_ms'])
+                    block = False
+
+            for r in range(repeat):
+                for path in find_samples(args[1:]):
+                    in_q.put((count, path))
+                    count += 1
+                    drain(False)
+            for t in threads:
+                in_q.put(None)
+            while len(latencies) + errors < count:
+                drain(True)
+            elapsed = time.perf_counter() - start
+
+            # Latency statistics
+            latencies.sort()
+            stats = {
+                'model': model_info['project'],
+                'runners': num_runners,
+                'samples': count,
+                'errors': errors,
+                'elapsed_s': elapsed,
+                'throughput_per_s': (count - errors) / elapsed if elapsed > 0 else 0.0,
+                'latency_ms': {
+                    'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+                    'p50': percentile(latencies, 50),
+                    'p90': percentile(latencies, 90),
+                    'p99': percentile(latencies, 99),
+                    'max': latencies[-1] if latencies else 0.0,
+                },
+            }
+            f.write(json.dumps({'stats': stats}) + "\n")
+
+        print("samples:", count, "errors:", errors)
+        print("throughput: {:.1f} samples/s".format(stats['throughput_per_s']))
+        print("latency ms:", stats['latency_ms'])
+        print("results written to " + output)
+
+    finally:
+        for t in threads:
+            t.join(timeout=1.0)
+        for runner in runners:
+            runner.stop()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
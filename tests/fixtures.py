@@ -0,0 +1,182 @@
+"""
+Shared helpers for the tests and benchmarks
+
+Synthetic sessions to replay, fake displays that talk the wire protocol like
+client.py does, and the settings, camera and model stand-ins for running the
+server without a Pi. Import it from a script in this directory:
+
+    import fixtures
+
+License: Apache-2.0
+"""
+
+import os, sys, json, time, socket, threading
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+from facedress import protocol
+from facedress.recording import Recorder
+from facedress.sources import SyntheticSource
+
+#-------------------------------------------------------------------------------
+# Classes
+
+# Model stand-in that finds faces at fixed spots, given as (x, y, value) with x
+# and y as fractions of the frame. Each classify() waits inference_time like
+# the .eim IPC, then spends postprocess_time in Python holding the GIL. After
+# face_seconds (from loading) it finds nothing.
+class FixedFaceRunner:
+
+    # Constructor
+    def __init__(self, faces=((0.5, 0.5, 0.9),), inference_time=0.0,
+                    postprocess_time=0.0, face_seconds=None):
+        self.faces = faces
+        self.inference_time = inference_time
+        self.postprocess_time = postprocess_time
+        self.end = None
+        if face_seconds is not None:
+            self.end = time.perf_counter() + face_seconds
+
+    def get_features_from_image(self, img):
+        return img, img
+
+    def classify(self, img):
+        if self.inference_time > 0:
+            time.sleep(self.inference_time)
+        h, w = img.shape[:2]
+        end = time.perf_counter() + self.postprocess_time
+        while True:
+            bboxes = [{'label': 'face', 'value': value,
+                        'x': int(x * w) - 4, 'y': int(y * h) - 4,
+                        'width': 8, 'height': 8} for x, y, value in self.faces]
+            if time.perf_counter() >= end:
+                break
+        if self.end is not None and time.perf_counter() >= self.end:
+            bboxes = []
+        return {'result': {'bounding_boxes': bboxes}, 'timing': {}}
+
+    def stop(self):
+        pass
+
+#-------------------------------------------------------------------------------
+# Functions
+
+# Record a synthetic session with FOMO-like results taken from ground truth
+def record_synthetic(path, num_frames=50):
+    source = SyntheticSource(server.capture_res, server.resize_res,
+                                num_frames=num_frames)
+    scale = server.resize_res[0] / server.capture_res[0]
+    with Recorder(path, server.record_res) as recorder:
+        for frame in source:
+            x, y, w, h = source.face_box(frame.index)
+            recorder.add_result("fomo", {'result': {'bounding_boxes': [
+                                    {'label': 'face', 'value': 0.9,
+                                        'x': int((x + w / 2) * scale) - 4,
+                                        'y': int((y + h / 2) * scale) - 4,
+                                        'width': 8, 'height': 8}]},
+                                    'timing': {}})
+            recorder.write_frame(frame)
+
+# Send one request to the server's control socket, return the reply
+def control(port, request):
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps(request).encode() + b"\n")
+            f.flush()
+            return json.loads(f.readline())
+
+# Connect to address, retrying until the server listens. The server tells
+# displays apart by their address, so several fake displays on one machine
+# need their own source address (e.g. 127.0.0.2 and 127.0.0.3).
+def connect(address, interval=0.05, source=None):
+    while True:
+        try:
+            return socket.create_connection(address, source_address=(
+                                                None if source is None
+                                                else (source, 0)))
+        except OSError:
+            time.sleep(interval)
+
+# Pretend to be a display on a connected socket: answer clock syncs, answer
+# every other message with telemetry as if the frame went straight to the
+# screen, and pass it on to handle(payload, recv_time). Runs until stop is set,
+# handle returns False or the connection goes away, then closes the socket.
+def fake_display(sock, handle, stop=None):
+    reader = protocol.MessageReader(sock)
+    shown_id = 0
+    shown_time = 0.0
+    try:
+        while stop is None or not stop.is_set():
+            payload = reader.read()
+            if payload[0] == protocol.SYNC:
+                server_time = protocol.SYNC_MSG.unpack_from(payload)[1]
+                sock.sendall(protocol.pack_sync_reply(server_time, time.time()))
+                continue
+            recv_time = time.time()
+            frame_id = 0
+            if payload[0] == protocol.FRAME:
+                frame_id = protocol.unpack_frame(payload)[0]
+            sock.sendall(protocol.pack_telemetry(frame_id, recv_time, 0.0,
+                                                    shown_id, shown_time, 0.0,
+                                                    0))
+            if payload[0] == protocol.FRAME:
+                shown_id = frame_id
+                shown_time = time.time()
+            if handle(payload, recv_time) is False:
+                break
+    except (OSError, ValueError):
+        pass
+    finally:
+        sock.close()
+
+# Connect fake displays through the server's own client threads (socket pairs,
+# no network), one for each handler
+def add_displays(handlers, name="bench"):
+    for i, handle in enumerate(handlers):
+        server_sock, client_sock = socket.socketpair()
+        client = server.ClientThread((name, i), server_sock)
+        client.daemon = True
+        client.start()
+        server.clients.append(client)
+        threading.Thread(target=fake_display, args=(client_sock, handle),
+                            daemon=True).start()
+
+# Synthetic camera class to use in place of PiCameraSource, taking warmup
+# seconds to open (like the real camera) and passing options on to
+# SyntheticSource
+def synthetic_camera(warmup=0.0, **options):
+    class SyntheticCamera(SyntheticSource):
+        def __init__(self, capture_res, resize_res, rotation=0, dual=True,
+                        yuv=False):
+            SyntheticSource.__init__(self, capture_res, resize_res, dual,
+                                        yuv=yuv, **options)
+
+        def open(self):
+            time.sleep(warmup)
+
+        def __enter__(self):
+            self.open()
+            return self
+    return SyntheticCamera
+
+# Set up the server module to run without a Pi: quiet, FOMO only, listening on
+# port for hosts, no control socket or preview, a synthetic camera and
+# load_runner(model_file) in place of the .eim models. Other settings are
+# passed by name and must exist in server.py.
+def configure_server(port, load_runner, hosts=("127.0.0.1",), camera=None,
+                        **settings):
+    server.DEBUG = False
+    server.MODE = "fomo"
+    server.HOSTS = list(hosts)
+    server.PORT = port
+    server.CONTROL_PORT = None
+    server.PREVIEW_PORT = None
+    server.idle_content = False
+    server.stats_interval = 1e9
+    server.PiCameraSource = camera or synthetic_camera()
+    server.load_runner = load_runner
+    for name, value in settings.items():
+        if not hasattr(server, name):
+            raise AttributeError("server.py has no setting " + name)
+        setattr(server, name, value)
@@ -0,0 +1,102 @@
+"""
+Frame source benchmark
+
+Compares the CPU spent per frame preparing the model input and the display
+crops with:
+
+  * legacy: convert the full frame to RGB, then resize (old server loop)
+  * single: resize the BGR frame into a reused buffer, convert the small image
+  * dual: model input comes straight from the (GPU) small stream
+
+Then runs the synthetic source end-to-end in both modes so the frame-source
+layer can be exercised off the Pi.
+
+Usage: python3 frame-source-bench.py
+
+License: Apache-2.0
+"""
+
+import os, sys, time
+
+import numpy as np
+import cv2
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+from facedress.sources import SyntheticSource, downscale
+
+# Settings
+capture_res = (1088, 1088)              # Resolution captured by the camera
+resize_res = (320, 320)                 # Resolution expected by model
+crop_res = (480, 480)                   # Size of the crops cut per frame
+num_crops = 2                           # Crops per frame (one per display)
+num_frames = 200                        # Frames per measurement
+
+# Cut and convert the display crops (same for every mode)
+def cut_crops(img_bgr):
+    x0 = (capture_res[0] - crop_res[0]) // 2
+    y0 = (capture_res[1] - crop_res[1]) // 2
+    for _ in range(num_crops):
+        crop = img_bgr[y0:y0 + crop_res[1], x0:x0 + crop_res[0]]
+        cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+
+# Old server loop: full frame conversion, resize, crops from the RGB frame
+def legacy(img_bgr, bufs):
+    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+    cv2.resize(img_rgb, resize_res, interpolation=cv2.INTER_LINEAR)
+    x0 = (capture_res[0] - crop_res[0]) // 2
+    y0 = (capture_res[1] - crop_res[1]) // 2
+    for _ in range(num_crops):
+        img_rgb[y0:y0 + crop_res[1], x0:x0 + crop_res[0]]
+
+# Single stream fallback: downscale into reused buffers, convert crops only
+def single(img_bgr, bufs):
+    downscale(img_bgr, resize_res, bufs[0], bufs[1])
+    cut_crops(img_bgr)
+
+# Dual stream: no CPU work for the model input
+def dual(img_bgr, bufs):
+    cut_crops(img_bgr)
+
+# CPU seconds per frame for one preprocessing function
+def measure(fn, img_bgr):
+    bufs = (np.empty((resize_res[1], resize_res[0], 3), dtype=np.uint8),
+            np.empty((resize_res[1], resize_res[0], 3), dtype=np.uint8))
+    fn(img_bgr, bufs)
+    start = time.process_time()
+    for _ in range(num_frames):
+        fn(img_bgr, bufs)
+    return (time.process_time() - start) / num_frames
+
+def main():
+
+    # Use single thread so CPU time is comparable to a busy Pi 4 core
+    cv2.setNumThreads(1)
+
+    # Get a representative full frame from the synthetic source
+    source = SyntheticSource(capture_res, resize_res, dual=False, num_frames=1)
+    img_bgr = next(iter(source)).full.copy()
+
+    print("Preprocessing CPU per frame (" + str(num_crops) + " crops):")
+    t_legacy = measure(legacy, img_bgr)
+    for name, fn in (("legacy", legacy), ("single", single), ("dual", dual)):
+        t = t_legacy if fn is legacy else measure(fn, img_bgr)
+        print("  {:<7} {:7.3f} ms  (saves {:6.3f} ms)".format(
+                name, t * 1000, (t_legacy - t) * 1000))
+
+    # End-to-end through the synthetic source (includes scene rendering)
+    print("Synthetic source, CPU per frame incl. rendering:")
+    for dual_stream in (False, True):
+        source = SyntheticSource(capture_res, resize_res, dual=dual_stream,
+                                    num_frames=num_frames)
+        start = time.process_time()
+        for frame in source:
+            frame.small.sum()
+            if frame.index % 10 == 0:
+                cut_crops(frame.full)
+        t = (time.process_time() - start) / num_frames
+        print("  dual={:<5} {:7.3f} ms (crops every 10th frame)".format(
+                str(dual_stream), t * 1000))
+
+if __name__ == "__main__":
+    main()
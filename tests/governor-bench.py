@@ -0,0 +1,95 @@
+"""
+Frame-rate governor benchmark
+
+Runs the server loop (replayed detections, cutting, encoding, fan-out through
+real ClientThreads to fake clients) for a few seconds at several target frame
+rates and reports CPU time per delivered frame and overall CPU load. A run
+without clients shows the idle rate. No camera or model is needed.
+
+Usage: python3 governor-bench.py [seconds_per_rate]
+
+License: Apache-2.0
+"""
+
+import os, sys, time
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+import fixtures
+from facedress.governor import FrameGovernor
+from facedress.recording import ReplayRunner, ReplaySource
+
+# Settings
+synthetic_log = "/tmp/facedress-governor.log"
+num_synthetic_frames = 100
+target_rates = [0, 20, 10, 5]
+num_displays = 2
+
+# Connect fake displays that count the frames they get
+def connect_displays(count):
+    counters = [[0] for _ in range(count)]
+
+    def counter(frames):
+        def handle(payload, recv_time):
+            frames[0] += 1
+        return handle
+    fixtures.add_displays([counter(frames) for frames in counters])
+    return counters
+
+# Run the server loop for a while, return (frames, delivered, cpu, wall)
+def run(target_fps, seconds, counters):
+    source = ReplaySource(synthetic_log, server.capture_res, server.resize_res,
+                            0, loop=True)
+    cascade = server.make_cascade({"fomo": ReplayRunner(source, "fomo"),
+                                    "ssd": ReplayRunner(source, "ssd")})
+    governor = FrameGovernor(target_fps, server.idle_fps, server.static_fps,
+                                server.static_threshold, server.static_frames)
+    delivered = sum(c[0] for c in counters)
+    frames = 0
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    with source:
+        for frame in source:
+            bboxes = server.detect_regions(cascade, frame)
+            displays = list(server.clients)
+            sub_imgs = server.cut_sub_images(frame, bboxes, len(displays))
+            for client, sub_img in zip(displays, sub_imgs):
+                client.send(server.encode_sub_image(sub_img, frame),
+                            frame.index, frame.timestamp)
+            frames += 1
+            governor.update(frame, len(displays))
+            governor.wait()
+            if time.perf_counter() - start >= seconds:
+                break
+
+    # Let the client threads drain their queues
+    while any(not c.q.empty() for c in server.clients):
+        time.sleep(0.01)
+    time.sleep(0.1)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - start
+    return frames, sum(c[0] for c in counters) - delivered, cpu, wall
+
+def main(argv):
+    server.DEBUG = False
+    server.MODE = "fomo"
+    server.idle_content = False
+    seconds = float(argv[0]) if len(argv) > 0 else 5.0
+    fixtures.record_synthetic(synthetic_log, num_synthetic_frames)
+
+    print("{:<12} {:>8} {:>10} {:>14} {:>8}".format(
+            "target", "frames", "delivered", "CPU ms/frame", "CPU %"))
+    frames, _, cpu, wall = run(target_rates[0], seconds, [])
+    print("{:<12} {:>8} {:>10} {:>14} {:>7.0f}%".format(
+            "no clients", frames, 0, "-", cpu / wall * 100))
+    counters = connect_displays(num_displays)
+    for rate in target_rates:
+        frames, delivered, cpu, wall = run(rate, seconds, counters)
+        print("{:<12} {:>8} {:>10} {:>14.2f} {:>7.0f}%".format(
+                "{:g} fps".format(rate) if rate > 0 else "unlimited",
+                frames, delivered, cpu / max(delivered, 1) * 1000,
+                cpu / wall * 100))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
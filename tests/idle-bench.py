@@ -0,0 +1,76 @@
+"""
+Idle content benchmark
+
+Runs the server with a synthetic camera and a fake model that finds a face for
+the first part of the run and nothing after, with one display connected from
+this process. Once with idle_content off (the display keeps getting the
+default center crop) and once with it on (the display gets an idle message,
+the server stops streaming to it and slows down to static_fps). Reports the
+messages and bytes the display got and the CPU time the server process used
+(including its startup).
+
+Usage: python3 idle-bench.py [seconds] [face_seconds]
+
+License: Apache-2.0
+"""
+
+import os, sys, time, signal, resource, threading, subprocess
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+import fixtures
+from facedress import protocol
+
+# Settings
+port = 18490
+
+# Run the server (in a child process of the benchmark) with a model that finds
+# a face in the middle of the frame for a while
+def serve(idle_content, face_seconds):
+    def load_runner(model_file):
+        return fixtures.FixedFaceRunner(face_seconds=face_seconds)
+    fixtures.configure_server(port, load_runner, idle_content=idle_content)
+    server.main()
+
+# Answer messages like a display, count them and their bytes by type
+def display(counts, stop):
+    def handle(payload, recv_time):
+        count, size = counts.get(payload[0], (0, 0))
+        counts[payload[0]] = (count + 1, size + len(payload))
+    fixtures.fake_display(fixtures.connect(("127.0.0.1", port)), handle, stop)
+
+def main(argv):
+    if len(argv) > 0 and argv[0] == "--serve":
+        serve(argv[1] == "on", float(argv[2]))
+        return
+    seconds = float(argv[0]) if len(argv) > 0 else 10.0
+    face_seconds = float(argv[1]) if len(argv) > 1 else 2.0
+    print("{:.0f} s, face for the first {:.0f} s".format(seconds, face_seconds))
+
+    for mode in ("off", "on"):
+        cpu_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+        proc = subprocess.Popen([sys.executable, os.path.realpath(__file__),
+                                    "--serve", mode, str(face_seconds)],
+                                stdout=subprocess.DEVNULL)
+        stop = threading.Event()
+        counts = {}
+        thread = threading.Thread(target=display, args=(counts, stop),
+                                    daemon=True)
+        thread.start()
+        time.sleep(seconds)
+        stop.set()
+        proc.send_signal(signal.SIGINT)
+        proc.wait()
+        cpu_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = (cpu_end.ru_utime - cpu_start.ru_utime) + \
+                (cpu_end.ru_stime - cpu_start.ru_stime)
+
+        frames, frame_bytes = counts.get(protocol.FRAME, (0, 0))
+        idles, idle_bytes = counts.get(protocol.IDLE, (0, 0))
+        print("idle_content {:<3} | frames {:4d} | idle messages {:3d} | "
+                "{:6.2f} MB | server CPU {:5.2f} s".format(mode, frames, idles,
+                    (frame_bytes + idle_bytes) / 1e6, cpu))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
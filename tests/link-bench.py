@@ -0,0 +1,73 @@
+"""
+Link benchmark
+
+Runs server.main() with a synthetic camera and a model that always finds the
+face, and a display on localhost that connects through the link emulator
+(facedress/linkemu.py) with each link profile in turn. Reports the frame rate
+and bandwidth the display got, and the capture-to-receive latency (server and
+display share a clock here). The link is seeded, so runs are repeatable
+enough to compare transport and codec changes.
+
+Usage: python3 link-bench.py [seconds] [profile ...]
+
+License: Apache-2.0
+"""
+
+import os, sys, time, threading
+
+import numpy as np
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+import fixtures
+from facedress import protocol
+from facedress.linkemu import PROFILES, LinkEmulator
+
+# Settings
+port = 18487
+seed = 1
+
+# Receive frames through the link for a while, like a display
+def display(address, seconds):
+    latencies = []
+    num_bytes = [0]
+    start = []
+
+    def handle(payload, recv_time):
+        if not start:
+            start.append(time.perf_counter())
+            return
+        latencies.append(recv_time - protocol.unpack_frame(payload)[1])
+        num_bytes[0] += len(payload)
+        return time.perf_counter() - start[0] < seconds
+    fixtures.fake_display(fixtures.connect(address), handle)
+    return latencies, num_bytes[0]
+
+def main(argv):
+    seconds = float(argv[0]) if len(argv) > 0 else 5.0
+    profiles = argv[1:] if len(argv) > 1 else list(PROFILES)
+
+    # Model that finds a face in the middle of the frame
+    fixtures.configure_server(port,
+                                lambda model_file: fixtures.FixedFaceRunner(),
+                                camera=fixtures.synthetic_camera(fps=30),
+                                target_fps=30.0, static_fps=30.0)
+    threading.Thread(target=server.main, daemon=True).start()
+
+    for name in profiles:
+        link = LinkEmulator(("127.0.0.1", port), seed=seed, **PROFILES[name])
+        link.start()
+        latencies, num_bytes = display(link.address, seconds)
+        link.stop()
+        latencies = np.array(latencies) * 1000
+        print("{:<13} {:5.1f} fps | {:5.2f} MB/s | latency p50 {:5.1f} ms, "
+                "p99 {:6.1f} ms".format(name, len(latencies) / seconds,
+                                        num_bytes / seconds / 1e6,
+                                        np.percentile(latencies, 50),
+                                        np.percentile(latencies, 99)))
+        print("              " + link.report())
+        time.sleep(0.5)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
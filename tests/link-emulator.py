@@ -0,0 +1,86 @@
+"""
+USB gadget link emulator
+
+Runs a local proxy that shapes traffic like the Pi 4 <-> Pi Zero USB link (see
+facedress/linkemu.py), so the real server and client can be run on one machine
+through it. Start the server, then this proxy, then point the client's HOST
+and PORT at the proxy. Prints link statistics every few seconds.
+
+Usage: python3 link-emulator.py [-p <profile>] [-l <listen_port>]
+        [-r <rate_mbit>] [-d <latency_ms>] [-j <jitter_ms>] [-o <reorder>]
+        [-x <loss>] [-s <seed>] [-u] <server_host:port>
+
+License: Apache-2.0
+"""
+
+import os, sys, time, getopt
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+from facedress.linkemu import PROFILES, LinkEmulator
+
+# Settings
+STATS_INTERVAL = 5.0
+
+def help():
+    print('python link-emulator.py [-p <profile>] [-l <listen_port>] ' +
+            '[-r <rate_mbit>] [-d <latency_ms>] [-j <jitter_ms>] ' +
+            '[-o <reorder>] [-x <loss>] [-s <seed>] [-u] <server_host:port>')
+    print('Profiles: ' + ', '.join(PROFILES))
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "hp:l:r:d:j:o:x:s:u",
+                                    ["help", "profile=", "listen=", "rate=",
+                                        "latency=", "jitter=", "reorder=",
+                                        "loss=", "seed=", "udp"])
+    except getopt.GetoptError:
+        help()
+        sys.exit(2)
+
+    model = dict(PROFILES["gadget"])
+    listen_port = 8486
+    udp = False
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            help()
+            sys.exit()
+        elif opt in ('-p', '--profile'):
+            model = dict(PROFILES[arg])
+        elif opt in ('-l', '--listen'):
+            listen_port = int(arg)
+        elif opt in ('-r', '--rate'):
+            model["rate"] = float(arg) * 1e6
+        elif opt in ('-d', '--latency'):
+            model["latency"] = float(arg) / 1000
+        elif opt in ('-j', '--jitter'):
+            model["jitter"] = float(arg) / 1000
+        elif opt in ('-o', '--reorder'):
+            model["reorder"] = float(arg)
+        elif opt in ('-x', '--loss'):
+            model["loss"] = float(arg)
+        elif opt in ('-s', '--seed'):
+            model["seed"] = int(arg)
+        elif opt in ('-u', '--udp'):
+            udp = True
+
+    if len(args) != 1:
+        help()
+        sys.exit(2)
+    host, port = args[0].rsplit(":", 1)
+
+    link = LinkEmulator((host, int(port)), ("0.0.0.0", listen_port), udp=udp,
+                        **model)
+    link.start()
+    print("Forwarding port {} to {}:{} ({})".format(listen_port, host, port,
+            ", ".join("{}={}".format(k, v) for k, v in sorted(model.items()))))
+    try:
+        while True:
+            time.sleep(STATS_INTERVAL)
+            print(link.report())
+    except KeyboardInterrupt:
+        pass
+    link.stop()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,106 @@
+"""
+Live configuration test
+
+Runs the server's frame loop on a replayed synthetic log and changes settings
+through the local control socket while it runs: a threshold/JPEG change
+(applied between frames) and a model file change (loaded in the background by
+a fake loader that takes 2 seconds). Prints when each change took effect and
+the longest gap between frames, which should stay near the normal frame time.
+
+Usage: python3 live-config-test.py
+
+License: Apache-2.0
+"""
+
+import os, sys, time, threading
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+import fixtures
+from facedress.config import ConfigUpdates
+from facedress.governor import FrameGovernor
+from facedress.recording import ReplayRunner, ReplaySource
+
+# Settings
+synthetic_log = "/tmp/facedress-live-config.log"
+control_port = 18485
+load_time = 2.0
+run_time = 5.0
+
+# Send one request to the control socket, return the reply
+def control(request):
+    return fixtures.control(control_port, request)
+
+# Change settings from another thread while the loop runs
+def operator():
+    time.sleep(1.0)
+    print("{:.2f} s: set threshold and jpeg_quality".format(elapsed()))
+    control({"threshold": 0.6, "jpeg_quality": 70})
+    time.sleep(0.5)
+    print("{:.2f} s: set fomo_model_file".format(elapsed()))
+    control({"fomo_model_file": "fomo-face-v2.eim"})
+    reply = control({"threshold": "high"})
+    print("Bad value rejected:", reply["error"])
+
+def elapsed():
+    return time.perf_counter() - start
+
+def main():
+    global start
+    server.DEBUG = False
+    server.MODE = "fomo"
+    server.idle_content = False
+    fixtures.record_synthetic(synthetic_log)
+    source = ReplaySource(synthetic_log, server.capture_res, server.resize_res,
+                            0, loop=True)
+
+    # Fake model loading: slow, then replays the same detections
+    def slow_load_runner(model_file):
+        time.sleep(load_time)
+        return ReplayRunner(source, "fomo")
+    server.load_runner = slow_load_runner
+
+    runners = {"fomo": ReplayRunner(source, "fomo")}
+    cascade = server.make_cascade(runners)
+    governor = FrameGovernor(20)
+    config = ConfigUpdates({name: getattr(server, name)
+                                for name in server.LIVE_SETTINGS},
+                            port=control_port)
+    config.start()
+    loaders = {}
+    threading.Thread(target=operator, daemon=True).start()
+
+    start = time.perf_counter()
+    last = start
+    max_gap = 0.0
+    num_frames = 0
+    with source:
+        for frame in source:
+            server.detect_regions(cascade, frame)
+            sub_imgs = server.cut_sub_images(frame, [], 1)
+            server.encode_jpeg(sub_imgs[0])
+            governor.update(frame, 1)
+            governor.wait()
+            old_fomo = cascade.fomo
+            changes = config.pending()
+            if changes:
+                server.apply_settings(changes, cascade, governor, runners,
+                                        loaders)
+                print("{:.2f} s: applied {} (threshold now {})".format(
+                        elapsed(), changes, cascade.fomo.threshold))
+            server.swap_runners(cascade, runners, loaders, None)
+            if cascade.fomo is not old_fomo:
+                print("{:.2f} s: new model swapped in".format(elapsed()))
+            now = time.perf_counter()
+            max_gap = max(max_gap, now - last)
+            last = now
+            num_frames += 1
+            if now - start >= run_time:
+                break
+    config.stop()
+    print("Frames: {} | longest gap between frames: {:.1f} ms".format(
+            num_frames, max_gap * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Microbenchmarks of the hot paths, with per-machine baselines
+
+Times the functions every frame goes through, on the server (downscaling and
+RGB conversion from BGR or YUV420 frames, feature packing, box post-processing, cutting sub-images, the
+circle mask, JPEG encoding, building frame messages, delta tile diffs) and on
+the client (receive buffering, JPEG decoding, scaling and orienting a frame
+for the display). Client benchmarks are skipped if pygame is not installed.
+
+Each benchmark runs for a short while several times over, and the fastest
+time per call is compared with the baseline stored for this machine (in
+tests/baselines/<hostname>-<arch>.json). Anything slower than the baseline by
+more than the tolerance is flagged, and the exit code is 1 if there was any
+slowdown. Save a baseline with -s on a quiet machine (no server running),
+e.g. before starting on a change. Baselines are only comparable on the machine
+that saved them, so none ship with the repository.
+
+Usage: python3 microbench.py [-s] [-t <tolerance_percent>] [-f <filter>]
+        [-b <baseline.json>] [-r <repeats>] [-l]
+
+License: Apache-2.0
+"""
+
+import os, sys, json, time, timeit, getopt, platform, statistics
+
+import numpy as np
+import cv2
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+from facedress import boxes, mask, protocol, yuv
+from facedress.delta import DeltaEncoder
+from facedress.runner import pack_features
+from facedress.sources import SyntheticSource, downscale
+try:
+    import client
+except ImportError:
+    client = None
+
+# Settings
+BASELINE_DIR = os.path.join(dir_path, "baselines")
+TOLERANCE = 15.0                        # Percent slower that is flagged
+REPEATS = 5                             # Timing runs per benchmark
+MIN_TIME = 0.2                          # Seconds per timing run (at least)
+
+def help():
+    print('python microbench.py [-s] [-t <tolerance_percent>] [-f <filter>] ' +
+            '[-b <baseline.json>] [-r <repeats>] [-l]')
+
+# Socket stand-in that returns the same message over and over in TCP-sized
+# chunks, so receive buffering is timed without the kernel
+class ReplaySocket:
+
+    def __init__(self, data, chunk=64 * 1024):
+        self.data = memoryview(data)
+        self.chunk = chunk
+        self.pos = 0
+
+    def recv_into(self, view, n):
+        count = min(n, self.chunk, len(self.data) - self.pos)
+        view[:count] = self.data[self.pos:self.pos + count]
+        self.pos = (self.pos + count) % len(self.data)
+        return count
+
+# Default baseline file for this machine
+def baseline_path():
+    name = "{}-{}".format(platform.node() or "unknown", platform.machine())
+    return os.path.join(BASELINE_DIR, name.replace(os.sep, "_") + ".json")
+
+# Server side benchmarks: name -> function to time
+def server_benchmarks(frame):
+    capture_res = server.capture_res
+    resize_res = server.resize_res
+    full = np.ascontiguousarray(frame.full)
+    small = frame.small.copy()
+    resized = np.empty((resize_res[1], resize_res[0], 3), dtype=np.uint8)
+    small_buf = np.empty_like(resized)
+    rgb = np.empty_like(full)
+
+    # Model output like FOMO's (centroids) and SSD's (boxes)
+    fomo = [{'label': 'face', 'value': 0.9 - i * 0.1, 'x': 60 + i * 80,
+                'y': 100 + i * 20, 'width': 8, 'height': 8} for i in range(3)]
+    ssd = [{'label': 'face', 'value': 0.9 - i * 0.1, 'x': 40 + i * 90,
+                'y': 80 + i * 20, 'width': 60, 'height': 70} for i in range(3)]
+    sub_size = server.get_sub_size()
+    bboxes = boxes.fixed_regions(boxes.scale_boxes(fomo, resize_res,
+                                                    capture_res),
+                                    server.threshold, sub_size, capture_res)
+
+    # Crops the server sends: a FOMO face and the default center crop
+    face = full[:sub_size, :sub_size]
+    _, x0, y0, x1, y1 = boxes.center_region(server.default_sub_res,
+                                            capture_res)
+    center = full[y0:y1, x0:x1]
+    jpg = server.encode_jpeg(face)
+    delta = DeltaEncoder()
+    delta_imgs = [cv2.resize(center, server.delta_res),
+                    cv2.resize(full[:y1 - y0, :x1 - x0], server.delta_res)]
+    delta.encode(delta_imgs[0])
+    params = [cv2.IMWRITE_JPEG_QUALITY, server.jpeg_quality]
+
+    # The same frame and face crop as YUV420 planes (yuv_capture)
+    frame_yuv = yuv.from_bgr(full)
+    face_yuv = frame_yuv.crop(0, 0, sub_size, sub_size)
+    small_i420 = np.empty((resize_res[1] * 3 // 2, resize_res[0]),
+                            dtype=np.uint8)
+
+    return {
+        "downscale to resize_res": lambda: downscale(full, resize_res,
+                                                        resized, small_buf),
+        "BGR to RGB at capture_res": lambda: cv2.cvtColor(
+                                                full, cv2.COLOR_BGR2RGB,
+                                                dst=rgb),
+        "downscale YUV to resize_res": lambda: yuv.downscale(frame_yuv,
+                                                            resize_res,
+                                                            small_i420,
+                                                            small_buf),
+        "pack features": lambda: pack_features(small),
+        "boxes FOMO": lambda: boxes.fixed_regions(
+                                boxes.scale_boxes(fomo, resize_res,
+                                                    capture_res),
+                                server.threshold, sub_size, capture_res),
+        "boxes SSD": lambda: boxes.scaled_regions(
+                                boxes.scale_boxes(ssd, resize_res,
+                                                    capture_res),
+                                server.threshold, server.box_increase,
+                                capture_res),
+        "cut sub-images": lambda: server.cut_sub_images(frame, bboxes, 2),
+        "circle mask face": lambda: mask.apply_mask(face),
+        "JPEG encode face": lambda: cv2.imencode('.jpg', face, params),
+        "JPEG encode center": lambda: cv2.imencode('.jpg', center, params),
+        "JPEG encode face from YUV": lambda: yuv.encode_jpeg(
+                                                face_yuv,
+                                                server.jpeg_quality),
+        "frame message": lambda: protocol.pack_frame(frame.index,
+                                                        frame.timestamp,
+                                                        sub_size, sub_size,
+                                                        jpg),
+        "delta tile diff": lambda: delta._tile_diff(delta_imgs[1]),
+    }
+
+# Client side benchmarks: name -> function to time
+def client_benchmarks(frame):
+    import pygame
+    sub_size = server.get_sub_size()
+    face = np.ascontiguousarray(frame.full[:sub_size, :sub_size])
+    jpg = server.encode_jpeg(face).tobytes()
+    message = protocol.pack_frame(frame.index, frame.timestamp, sub_size,
+                                    sub_size, jpg)
+    reader = protocol.MessageReader(ReplaySocket(message))
+    decoded = client.decode_pygame(jpg)
+    display_img = pygame.transform.smoothscale(decoded, client.DISPLAY_RES)
+    bgr = cv2.resize(face, client.DISPLAY_RES)
+    surface = pygame.Surface(client.DISPLAY_RES)
+
+    return {
+        "receive frame message": reader.read,
+        "JPEG decode pygame": lambda: client.decode_pygame(jpg),
+        "JPEG decode OpenCV reduced": lambda: client.decode_opencv(
+                                                jpg, sub_size, sub_size),
+        "JPEG decode lean": lambda: client.decode_lean(jpg, sub_size,
+                                                        sub_size),
+        "scale and orient pygame": lambda: client.show_pygame(surface,
+                                                                decoded),
+        "orient pygame": lambda: client.show_pygame(surface, display_img),
+        "orient OpenCV": lambda: client.show_opencv(surface, bgr),
+    }
+
+# Fastest and median seconds per call over several timing runs
+def measure(fn, repeats):
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * MIN_TIME / max(elapsed, 1e-9)))
+    times = [t / number for t in timer.repeat(repeats, number)]
+    return min(times), statistics.median(times)
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "hst:f:b:r:l",
+                                    ["help", "save", "tolerance=", "filter=",
+                                        "baseline=", "repeats=", "list"])
+    except getopt.GetoptError:
+        help()
+        sys.exit(2)
+
+    save = False
+    tolerance = TOLERANCE
+    name_filter = None
+    path = baseline_path()
+    repeats = REPEATS
+    list_only = False
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            help()
+            sys.exit()
+        elif opt in ('-s', '--save'):
+            save = True
+        elif opt in ('-t', '--tolerance'):
+            tolerance = float(arg)
+        elif opt in ('-f', '--filter'):
+            name_filter = arg.lower()
+        elif opt in ('-b', '--baseline'):
+            path = arg
+        elif opt in ('-r', '--repeats'):
+            repeats = int(arg)
+        elif opt in ('-l', '--list'):
+            list_only = True
+
+    # One synthetic frame, like the camera delivers
+    server.idle_content = False
+    source = SyntheticSource(server.capture_res, server.resize_res,
+                                num_frames=1)
+    frame = next(iter(source))
+    benchmarks = server_benchmarks(frame)
+    if client is not None:
+        benchmarks.update(client_benchmarks(frame))
+    else:
+        print("pygame not installed, skipping client benchmarks")
+    if name_filter is not None:
+        benchmarks = {name: fn for name, fn in benchmarks.items()
+                        if name_filter in name.lower()}
+    if list_only:
+        print("\n".join(benchmarks))
+        return
+
+    # Load the baseline for this machine
+    baseline = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            baseline = json.load(f)["results"]
+    print("Baseline: " + (path if baseline else "none (" + path + ")"))
+
+    # Time everything and compare
+    results = {}
+    slower = []
+    print("{:<28} {:>10} {:>10} {:>10} {:>8}".format("benchmark", "min us",
+            "median us", "base us", "change"))
+    for name, fn in benchmarks.items():
+        best, median = measure(fn, repeats)
+        results[name] = {"min": best, "median": median}
+        line = "{:<28} {:>10.1f} {:>10.1f}".format(name, best * 1e6,
+                                                    median * 1e6)
+        if name in baseline:
+            base = baseline[name]["min"]
+            change = (best - base) / base * 100
+            line += " {:>10.1f} {:>+7.1f}%".format(base * 1e6, change)
+            if change > tolerance:
+                line += "  SLOWER"
+                slower.append(name)
+        print(line)
+
+    # Store the results as the new baseline
+    if save:
+        baseline.update(results)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"machine": {"node": platform.node(),
+                                    "machine": platform.machine(),
+                                    "processor": platform.processor(),
+                                    "python": platform.python_version(),
+                                    "opencv": cv2.__version__},
+                        "saved": time.strftime("%Y-%m-%d %H:%M:%S"),
+                        "results": baseline}, f, indent=2, sort_keys=True)
+        print("Saved baseline " + path)
+
+    # Summary
+    if slower:
+        print("{} of {} benchmarks more than {:.0f}% slower than the baseline: "
+                "{}".format(len(slower), len(results), tolerance,
+                            ", ".join(slower)))
+        sys.exit(1)
+    if baseline:
+        print("No slowdowns beyond {:.0f}%".format(tolerance))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Mock Edge Impulse .eim model process
+
+Speaks enough of the .eim IPC protocol (one JSON request at a time over a Unix
+socket, each reply a JSON object followed by a NUL byte) to stand in for a
+face model in tests and benchmarks: hello, classify (features in the request)
+and classify_shm (features in a shared memory segment, offered in the hello
+reply like newer .eim builds do). It "finds" one face at the centroid of the
+pixels brighter than average, so results depend on the features it got.
+
+Environment variables:
+    MOCK_EIM_SHM=0          don't offer the shared memory segment
+    MOCK_EIM_DELAY_MS=n     pretend inference takes n ms
+    MOCK_EIM_SIZE=n         model input is n x n pixels (default 320)
+
+Usage: mock-eim.py <socket_path>
+
+License: Apache-2.0
+"""
+
+import os, sys, json, time, socket
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Settings
+SIZE = int(os.environ.get("MOCK_EIM_SIZE", "320"))
+DELAY = float(os.environ.get("MOCK_EIM_DELAY_MS", "0")) / 1000
+OFFER_SHM = os.environ.get("MOCK_EIM_SHM", "1") != "0"
+
+# Model info returned by hello
+def model_info(shm):
+    info = {"model_parameters": {"image_input_width": SIZE,
+                                    "image_input_height": SIZE,
+                                    "image_channel_count": 3,
+                                    "input_features_count": SIZE * SIZE,
+                                    "image_resize_mode": "squash",
+                                    "labels": ["face"],
+                                    "label_count": 1,
+                                    "model_type": "constrained_object_detection"},
+            "project": {"name": "Mock face model", "owner": "facedress",
+                        "id": 0, "deploy_version": 1}}
+    if shm is not None:
+        info["features_shm"] = {"name": "/" + shm.name, "type": "float32",
+                                "elements": SIZE * SIZE}
+    return info
+
+# One face box at the centroid of the bright pixels
+def classify(features):
+    start = time.perf_counter()
+    values = np.asarray(features, dtype=np.uint32)[:SIZE * SIZE]
+    luma = ((values >> 16) & 0xFF) + ((values >> 8) & 0xFF) + (values & 0xFF)
+    ys, xs = np.divmod(np.flatnonzero(luma > luma.mean()), SIZE)
+    boxes = []
+    if len(xs) > 0:
+        boxes.append({"label": "face", "value": 0.9,
+                        "x": int(xs.mean()) - 4, "y": int(ys.mean()) - 4,
+                        "width": 8, "height": 8})
+    time.sleep(max(DELAY - (time.perf_counter() - start), 0))
+    return {"result": {"bounding_boxes": boxes},
+            "timing": {"dsp": 0, "anomaly": 0, "classification":
+                        int((time.perf_counter() - start) * 1000)}}
+
+# Read one JSON request (requests have no delimiter, so parse once the data
+# ends with a closing brace), None when the client hangs up
+def read_request(conn, decoder):
+    data = bytearray()
+    while True:
+        chunk = conn.recv(256 * 1024)
+        if not chunk:
+            return None
+        data += chunk
+        if data.rstrip().endswith(b"}"):
+            try:
+                return decoder.raw_decode(data.decode())[0]
+            except ValueError:
+                continue
+
+# Answer requests from one client until it hangs up
+def serve(conn, shm):
+    decoder = json.JSONDecoder()
+    features = None
+    if shm is not None:
+        features = np.ndarray((SIZE * SIZE,), dtype=np.float32, buffer=shm.buf)
+    while True:
+        msg = read_request(conn, decoder)
+        if msg is None:
+            return
+        reply = {"id": msg.get("id"), "success": True}
+        if "hello" in msg:
+            reply.update(model_info(shm))
+        elif "classify" in msg:
+            reply.update(classify(msg["classify"]))
+        elif "classify_shm" in msg and features is not None:
+            reply.update(classify(features[:msg["classify_shm"]["elements"]]))
+        else:
+            reply = {"id": msg.get("id"), "success": False,
+                        "error": "Unknown request"}
+        conn.sendall(json.dumps(reply).encode() + b"\0")
+
+def main(argv):
+    if len(argv) != 1:
+        print("Usage: mock-eim.py <socket_path>")
+        sys.exit(2)
+    shm = None
+    if OFFER_SHM:
+        shm = shared_memory.SharedMemory(create=True, size=SIZE * SIZE * 4)
+    server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server_socket.bind(argv[0])
+    server_socket.listen(1)
+    try:
+        while True:
+            conn, _ = server_socket.accept()
+            with conn:
+                serve(conn, shm)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server_socket.close()
+        if os.path.exists(argv[0]):
+            os.remove(argv[0])
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,92 @@
+"""
+Playout buffer benchmark
+
+Simulates frames captured at an irregular rate (inference time varies) and
+delivered over a link with random extra delay, then shown on a 60 Hz display
+either on arrival or through the playout buffer with different jitter
+factors. Prints the latency / smoothness trade-off for each setting.
+
+Usage: python3 playout-bench.py [network_jitter_ms]
+
+License: Apache-2.0
+"""
+
+import os, sys
+
+import numpy as np
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+from facedress.playout import PlayoutBuffer
+
+# Settings
+num_frames = 3000
+frame_interval = 0.1                    # Mean capture interval (10 fps)
+inference_jitter = 0.015                # Std dev of capture interval
+base_transit = 0.02                     # Fixed network + encode delay
+clock_offset = 123.456                  # Client clock minus server clock
+refresh_interval = 1.0 / 60             # Display refresh
+jitter_factors = [1.0, 2.0, 3.0, 5.0]
+
+# Make capture and arrival times (arrivals stay in order, as on TCP)
+def simulate(network_jitter, seed=0):
+    rng = np.random.default_rng(seed)
+    intervals = np.clip(rng.normal(frame_interval, inference_jitter,
+                                    num_frames), 0.02, None)
+    capture = np.cumsum(intervals)
+    arrival = capture + base_transit + \
+                rng.exponential(network_jitter, num_frames) + clock_offset
+    return capture, np.maximum.accumulate(arrival)
+
+# Run the display loop, return (latencies, display jitter, shown, dropped)
+def run(capture, arrival, playout):
+    shown = []
+    next_frame = 0
+    now = arrival[0]
+    pending = None
+    while next_frame < len(capture) or (playout and playout.next_time()):
+        while next_frame < len(capture) and arrival[next_frame] <= now:
+            if playout is None:
+                pending = next_frame
+            else:
+                playout.push(next_frame, capture[next_frame],
+                                arrival[next_frame], next_frame)
+            next_frame += 1
+        if playout is None:
+            due = pending
+            pending = None
+        else:
+            due = playout.pop(now)
+            due = None if due is None else due[0]
+        if due is not None:
+            shown.append((now, due))
+        now += refresh_interval
+
+    # Latency (minus the clock offset) and spacing error of shown frames
+    times = np.array([t for t, _ in shown])
+    ids = np.array([i for _, i in shown])
+    latency = times - capture[ids] - clock_offset
+    spacing_error = np.abs(np.diff(times) - np.diff(capture[ids]))
+    return latency, spacing_error, len(shown), len(capture) - len(shown)
+
+def main(argv):
+    network_jitter = float(argv[0]) / 1000 if len(argv) > 0 else 0.03
+    capture, arrival = simulate(network_jitter)
+    print("Network jitter (mean extra delay): {:.0f} ms".format(
+            network_jitter * 1000))
+    print("{:<18} {:>10} {:>10} {:>14} {:>8}".format(
+            "mode", "lat mean", "lat p99", "spacing err", "dropped"))
+    settings = [("on arrival", None)] + \
+                [("playout x{:g}".format(f), PlayoutBuffer(jitter_factor=f))
+                    for f in jitter_factors]
+    for name, playout in settings:
+        latency, spacing_error, shown, dropped = run(capture, arrival, playout)
+        print("{:<18} {:>7.1f} ms {:>7.1f} ms {:>11.1f} ms {:>8}".format(
+                name,
+                latency.mean() * 1000,
+                np.percentile(latency, 99) * 1000,
+                spacing_error.mean() * 1000,
+                dropped))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
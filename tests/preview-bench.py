@@ -0,0 +1,92 @@
+"""
+Preview server benchmark
+
+Runs the server pipeline on replayed synthetic detections (two display slots)
+with the MJPEG preview server enabled, first without viewers, then with a
+viewer on every stream, then with viewers that stop reading. Reports the frame
+loop time in each case and the frame rate each viewer got.
+
+Usage: python3 preview-bench.py [seconds]
+
+License: Apache-2.0
+"""
+
+import os, sys, time, socket, threading
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+import fixtures
+from facedress import protocol
+from facedress.preview import PreviewServer
+from facedress.recording import ReplayRunner, ReplaySource
+
+# Settings
+synthetic_log = "/tmp/facedress-preview.log"
+port = 18080
+streams = ["camera", "display0", "display1"]
+
+# Read a stream, count frames (or stall after the headers)
+def viewer(name, counter, stall, stop):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(b"GET /" + name.encode() + b".mjpg HTTP/1.1\r\n"
+                    b"Host: localhost\r\n\r\n")
+    with sock:
+        while not stop.is_set():
+            if stall:
+                time.sleep(0.1)
+                continue
+            data = sock.recv(65536)
+            if not data:
+                return
+            counter[0] += data.count(b"--frame\r\n")
+
+# Run the frame loop for a while, return ms per frame
+def run(seconds, preview):
+    source = ReplaySource(synthetic_log, server.capture_res, server.resize_res,
+                            0, loop=True)
+    cascade = server.make_cascade({"fomo": ReplayRunner(source, "fomo")})
+    frames = 0
+    start = time.perf_counter()
+    with source:
+        for frame in source:
+            bboxes = server.detect_regions(cascade, frame)
+            sub_imgs = server.cut_sub_images(frame, bboxes, 2)
+            for slot, sub_img in enumerate(sub_imgs):
+                data = server.encode_sub_image(sub_img, frame)
+                preview.publish("display" + str(slot),
+                                protocol.frame_jpeg(data))
+            if preview.wants("camera"):
+                preview.publish("camera", server.encode_preview(frame, bboxes))
+            frames += 1
+            if time.perf_counter() - start >= seconds:
+                break
+    return (time.perf_counter() - start) / frames * 1000
+
+def main(argv):
+    seconds = float(argv[0]) if len(argv) > 0 else 3.0
+    server.DEBUG = False
+    server.MODE = "fomo"
+    server.idle_content = False
+    fixtures.record_synthetic(synthetic_log, 100)
+    preview = PreviewServer("127.0.0.1", port, server.preview_fps)
+    preview.start()
+
+    print("No viewers:       {:.2f} ms/frame".format(run(seconds, preview)))
+    for stall in (False, True):
+        stop = threading.Event()
+        counters = {name: [0] for name in streams}
+        for name in streams:
+            threading.Thread(target=viewer, args=(name, counters[name], stall,
+                                                    stop), daemon=True).start()
+        ms = run(seconds, preview)
+        stop.set()
+        print("{:<17} {:.2f} ms/frame | viewer fps: {}".format(
+                "Stalled viewers:" if stall else "Viewers:", ms,
+                ", ".join("{} {:.1f}".format(name, counters[name][0] / seconds)
+                            for name in streams)))
+        time.sleep(0.5)
+    preview.stop()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,98 @@
+"""
+Profiling hooks test
+
+Runs the server's frame loop on a replayed synthetic log in the main thread
+with the profiler installed and the control socket open, and starts each
+capture while it runs: a cProfile through the control socket, stack samples
+and a memory diff with SIGUSR2. Prints the frame time before, during and after
+the captures (with nothing running the hooks should cost nothing) and the top
+of each report.
+
+Usage: python3 profiling-test.py
+
+License: Apache-2.0
+"""
+
+import os, sys, time, signal, tempfile, threading
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+import fixtures
+from facedress.config import ConfigUpdates
+from facedress.profiling import Profiler
+from facedress.recording import ReplayRunner, ReplaySource
+
+# Settings
+synthetic_log = "/tmp/facedress-profiling.log"
+control_port = 18488
+capture_seconds = 2.0
+
+# Send one request to the control socket, return the reply
+def control(request):
+    return fixtures.control(control_port, request)
+
+# Start the captures from another thread while the loop runs
+def operator(paths, phases):
+    time.sleep(capture_seconds)
+    phases.append(("capturing", time.perf_counter()))
+    paths.append(control({"command": "profile",
+                            "seconds": capture_seconds})["result"])
+    print("Busy profile rejected:",
+            control({"command": "profile"})["error"])
+    os.kill(os.getpid(), signal.SIGUSR2)
+    time.sleep(capture_seconds + 0.5)
+    phases.append(("after", time.perf_counter()))
+
+def main():
+    server.DEBUG = False
+    server.MODE = "fomo"
+    server.idle_content = False
+    fixtures.record_synthetic(synthetic_log)
+    directory = tempfile.mkdtemp(prefix="facedress-profiles-")
+    profiler = Profiler("server", directory, capture_seconds)
+    profiler.install()
+    config = ConfigUpdates({name: getattr(server, name)
+                                for name in server.LIVE_SETTINGS},
+                            port=control_port,
+                            commands={"profile": profiler.profile,
+                                        "stacks": profiler.stacks,
+                                        "memory": profiler.memory})
+    config.start()
+
+    source = ReplaySource(synthetic_log, server.capture_res, server.resize_res,
+                            0, loop=True)
+    cascade = server.make_cascade({"fomo": ReplayRunner(source, "fomo")})
+    paths = []
+    phases = [("idle", time.perf_counter())]
+    threading.Thread(target=operator, args=(paths, phases),
+                        daemon=True).start()
+    times = {}
+    with source:
+        for frame in source:
+            start = time.perf_counter()
+            bboxes = server.detect_regions(cascade, frame)
+            for sub_img in server.cut_sub_images(frame, bboxes, 2):
+                server.encode_jpeg(sub_img)
+            times.setdefault(phases[-1][0], []).append(
+                    time.perf_counter() - start)
+            if len(phases) == 3 and \
+                    time.perf_counter() - phases[-1][1] >= capture_seconds:
+                break
+    config.stop()
+    time.sleep(0.5)
+
+    for name, _ in phases:
+        print("{:<10} {:.2f} ms/frame".format(name,
+                sum(times[name]) / len(times[name]) * 1000))
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".txt"):
+            continue
+        with open(os.path.join(directory, name)) as f:
+            lines = [line for line in f if line.strip()]
+        print("\n{} ({} lines):".format(name, len(lines)))
+        print("".join(line[:150].rstrip() + "\n" for line in lines[:12]),
+                end="")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Reconnect benchmark
+
+Runs server.main() with a synthetic camera and a slow model (like a busy Pi
+running both models), and a display on localhost that keeps dropping its
+connection and reconnecting with the client's connect() settings. Reports the
+time from reconnecting to the first frame received, with and without the
+server's last-frame cache (RESUME_CACHE). Also checks that a display coming
+back without closing its old connection replaces it, instead of the stale
+connection holding on to the display's slot.
+
+Usage: python3 reconnect-bench.py [inference_ms] [reconnects]
+
+License: Apache-2.0
+"""
+
+import os, sys, time, socket, threading
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import client
+import server
+import fixtures
+
+# Settings
+port = 18486
+
+# Connect, wait for the first frame, return seconds from connect() call
+def time_to_frame():
+    start = time.perf_counter()
+    fixtures.fake_display(client.connect("127.0.0.1", port),
+                            lambda payload, recv_time: False)
+    return time.perf_counter() - start
+
+# Leave a connection open without answering (like a display that lost power),
+# connect again from the same host, return failures
+def stale_reconnect():
+    stale = client.connect("127.0.0.1", port)
+    time.sleep(0.2)
+    sock = client.connect("127.0.0.1", port)
+    time.sleep(0.2)
+    failures = []
+    displays = server.get_displays()
+    if len(displays) != 1:
+        failures.append("{} displays for one host".format(len(displays)))
+    stale.settimeout(1.0)
+    try:
+        while stale.recv(4096):
+            pass
+    except socket.timeout:
+        failures.append("stale connection not closed by the server")
+    except OSError:
+        pass
+    stale.close()
+    sock.close()
+    return failures
+
+def main(argv):
+    inference_time = float(argv[0]) / 1000 if len(argv) > 0 else 0.3
+    reconnects = int(argv[1]) if len(argv) > 1 else 10
+
+    # Slow model that never finds anything (displays get the center crop)
+    runner = fixtures.FixedFaceRunner(faces=(), inference_time=inference_time)
+    fixtures.configure_server(port, lambda model_file: runner, target_fps=0,
+                                static_fps=0)
+    threading.Thread(target=server.main, daemon=True).start()
+
+    # First connection fills the cache
+    while True:
+        try:
+            time_to_frame()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    print("Inference time: {:.0f} ms".format(inference_time * 1000))
+    for resume in (False, True):
+        server.RESUME_CACHE = resume
+        times = []
+        for _ in range(reconnects):
+            time.sleep(np.random.uniform(0.1, 0.5))
+            times.append(time_to_frame())
+        print("RESUME_CACHE={:<5}  reconnect to first frame: mean {:.0f} ms, "
+                "max {:.0f} ms".format(str(resume), np.mean(times) * 1000,
+                                        np.max(times) * 1000))
+
+    failures = stale_reconnect()
+    for failure in failures:
+        print("    " + failure)
+    print("Reconnect over a stale connection:", "FAIL" if failures else "PASS")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
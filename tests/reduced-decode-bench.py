@@ -0,0 +1,73 @@
+"""
+Reduced decoding benchmark
+
+Times decoding a crop and scaling it to the display resolution on the client,
+for several crop sizes: pygame full decode + scale, OpenCV full decode +
+resize, OpenCV reduced (DCT-domain) decode + resize, and what lean mode does
+(pygame, or OpenCV reduced for crops at least twice the display size) + scale.
+
+Usage: python3 reduced-decode-bench.py [repeats]
+
+License: Apache-2.0
+"""
+
+import os, sys, time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import cv2
+import pygame
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import client
+from facedress.sources import SyntheticSource
+
+# Settings
+crop_sizes = [240, 480, 720, 960, 1088]
+
+# Make a JPEG crop of the given size from a synthetic camera frame
+def make_crop(size):
+    source = SyntheticSource((size, size), (size, size))
+    img = np.empty((size, size, 3), dtype=np.uint8)
+    img = source.render(0, (size, size), img, source.noise)
+    return cv2.imencode('.jpg', img)[1].tobytes()
+
+# Average time (ms) of decoding and scaling to DISPLAY_RES
+def time_decode(decode, scale, jpg, size, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        scale(decode(jpg, size, size))
+    return (time.perf_counter() - start) / repeats * 1000
+
+def scale_pygame(img):
+    return pygame.transform.smoothscale(img, client.DISPLAY_RES)
+
+def scale_opencv(img):
+    return cv2.resize(img, client.DISPLAY_RES, interpolation=cv2.INTER_LINEAR)
+
+def main(argv):
+    repeats = int(argv[0]) if len(argv) > 0 else 50
+    print("Display:", client.DISPLAY_RES)
+    print("{:>6} {:>9} {:>7} {:>12} {:>12} {:>12} {:>12}".format(
+            "crop", "jpeg kB", "scale", "pygame ms", "opencv ms", "reduced ms",
+            "lean ms"))
+    for size in crop_sizes:
+        jpg = make_crop(size)
+        client.REDUCED_DECODE = False
+        t_pygame = time_decode(client.decode_pygame, scale_pygame, jpg, size,
+                                repeats)
+        t_full = time_decode(client.decode_opencv, scale_opencv, jpg, size,
+                                repeats)
+        client.REDUCED_DECODE = True
+        t_reduced = time_decode(client.decode_opencv, scale_opencv, jpg, size,
+                                repeats)
+        t_lean = time_decode(client.decode_lean, scale_pygame, jpg, size,
+                                repeats)
+        print("{:>6} {:>9.1f} {:>6}x {:>12.2f} {:>12.2f} {:>12.2f} {:>12.2f}"
+                .format(size, len(jpg) / 1000, client.decode_scale(size, size),
+                        t_pygame, t_full, t_reduced, t_lean))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,98 @@
+"""
+Replay benchmark
+
+Feeds a frame log (see facedress/recording.py) through the server pipeline as
+fast as possible: box post-processing, sub-image cutting, encoding, and fan-out
+through real ClientThreads to local socket pairs that answer like clients.
+No camera or model is needed, so results are repeatable.
+
+Without a log file, a synthetic one is recorded first (simulated FOMO results
+from the synthetic source's ground truth).
+
+Usage: python3 replay-bench.py [recording.log] [num_displays]
+
+License: Apache-2.0
+"""
+
+import os, sys, time
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+import fixtures
+from facedress import protocol
+from facedress.recording import ReplayRunner, ReplaySource
+
+# Settings
+synthetic_log = "/tmp/facedress-synthetic.log"
+num_synthetic_frames = 200
+
+# Count the frames a fake display gets and their bytes on the wire
+def counter(stats):
+    def handle(payload, recv_time):
+        stats[0] += 1
+        stats[1] += protocol.LENGTH.size + len(payload)
+    return handle
+
+def main(argv):
+    server.DEBUG = False
+    server.MODE = "fomo"
+    server.idle_content = False
+    log_path = argv[0] if len(argv) > 0 else None
+    num_displays = int(argv[1]) if len(argv) > 1 else 2
+    if log_path is None:
+        log_path = synthetic_log
+        fixtures.record_synthetic(log_path, num_synthetic_frames)
+
+    # Replay the recorded model output instead of running the model
+    source = ReplaySource(log_path, server.capture_res, server.resize_res, 0)
+    cascade = server.make_cascade({"fomo": ReplayRunner(source, "fomo"),
+                                    "ssd": ReplayRunner(source, "ssd")})
+
+    # Connect fake displays through the server's own client threads
+    stats = [[0, 0] for _ in range(num_displays)]
+    fixtures.add_displays([counter(counts) for counts in stats], "replay")
+
+    # Run the pipeline stages and time each one
+    times = {"detect": 0.0, "cut": 0.0, "encode": 0.0, "send": 0.0}
+    num_frames = 0
+    start = time.perf_counter()
+    with source:
+        for frame in source:
+            t0 = time.perf_counter()
+            capture_time = time.time()
+            bboxes = server.detect_regions(cascade, frame)
+            t1 = time.perf_counter()
+            displays = list(server.clients)
+            sub_imgs = server.cut_sub_images(frame, bboxes, len(displays))
+            frame.full
+            t2 = time.perf_counter()
+            msgs = [server.encode_sub_image(sub_img, frame) for sub_img in sub_imgs]
+            t3 = time.perf_counter()
+            for client, msg in zip(displays, msgs):
+                client.send(msg, frame.index, capture_time)
+            t4 = time.perf_counter()
+            times["detect"] += t1 - t0
+            times["cut"] += t2 - t1
+            times["encode"] += t3 - t2
+            times["send"] += t4 - t3
+            num_frames += 1
+    total = time.perf_counter() - start
+
+    # Let the client threads drain their queues
+    while any(not c.q.empty() for c in server.clients):
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    print("Frames:", num_frames, "| displays:", num_displays)
+    print("Pipeline FPS: {:.1f}".format(num_frames / total))
+    for stage, t in times.items():
+        print("  {:<7} {:7.3f} ms/frame".format(stage, t / num_frames * 1000))
+    for i, (count, size) in enumerate(stats):
+        print("  display {}: {} frames, {:.1f} kB/frame".format(
+                i, count, size / max(count, 1) / 1000))
+    for client in server.clients:
+        print(" ", client.report())
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,97 @@
+"""
+ROI inference recall benchmark
+
+Runs the synthetic source with a small, distant face through a simulated FOMO
+model (it only finds faces that cover enough pixels of its input) and compares
+recall and localization error of full-frame inference against RoiDetector.
+Both make exactly one inference per frame.
+
+Usage: python3 roi-recall-bench.py
+
+License: Apache-2.0
+"""
+
+import os, sys, time
+
+import numpy as np
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+from facedress import boxes
+from facedress.roi import RoiDetector
+from facedress.sources import SyntheticSource
+
+# Settings
+capture_res = (1088, 1088)              # Resolution captured by the camera
+resize_res = (320, 320)                 # Resolution expected by model
+threshold = 0.4                         # Prediction value must be over this
+num_frames = 300                        # Frames per run
+face_sizes = [0.03, 0.05, 0.08, 0.12]   # Face radius (fraction of frame width)
+min_face_px = 14                        # Smallest face radius the model sees
+face_rgb = (210, 170, 150)              # Face color in the synthetic scene
+
+# Simulated FOMO runner: finds the face blob, reports an 8x8 centroid cell
+class FakeFomoRunner:
+
+    def __init__(self):
+        self.num_inferences = 0
+
+    def get_features_from_image(self, img):
+        return img, img
+
+    def classify(self, img):
+        self.num_inferences += 1
+        diff = np.abs(img.astype(np.int16) - np.array(face_rgb, dtype=np.int16))
+        face = np.all(diff < 30, axis=2)
+        bboxes = []
+        count = np.count_nonzero(face)
+        if np.sqrt(count / np.pi) >= min_face_px:
+            ys, xs = np.nonzero(face)
+            bboxes.append({'label': 'face', 'value': 0.9,
+                            'x': int(xs.mean()) - 4, 'y': int(ys.mean()) - 4,
+                            'width': 8, 'height': 8})
+        return {'result': {'bounding_boxes': bboxes}, 'timing': {}}
+
+# Run one configuration, return (recall, mean center error px, ms per frame)
+def run(face_size, use_roi):
+    runner = FakeFomoRunner()
+    detector = RoiDetector(runner, capture_res, resize_res, threshold)
+    source = SyntheticSource(capture_res, resize_res, num_frames=num_frames,
+                                face_size=face_size)
+    hits = 0
+    errors = []
+    start = time.perf_counter()
+    for frame in source:
+        if use_roi:
+            found = detector.detect(frame)
+        else:
+            features, cropped = runner.get_features_from_image(frame.small)
+            res = runner.classify(features)
+            found = boxes.scale_boxes(res['result']['bounding_boxes'],
+                                        resize_res, capture_res)
+
+        # Count a hit if a box center lands inside the true face
+        x, y, w, h = source.face_box(frame.index)
+        for bbox in found:
+            center_x = bbox['x'] + bbox['width'] / 2
+            center_y = bbox['y'] + bbox['height'] / 2
+            if x <= center_x <= x + w and y <= center_y <= y + h:
+                hits += 1
+                errors.append(np.hypot(center_x - (x + w / 2),
+                                        center_y - (y + h / 2)))
+                break
+    elapsed = (time.perf_counter() - start) / num_frames
+    assert runner.num_inferences == num_frames
+    mean_error = np.mean(errors) if len(errors) > 0 else float('nan')
+    return hits / num_frames, mean_error, elapsed * 1000
+
+def main():
+    print("face radius   full-frame recall / err     ROI recall / err")
+    for face_size in face_sizes:
+        full = run(face_size, False)
+        roi = run(face_size, True)
+        print("  {:5.1%}       {:6.1%} / {:5.1f} px        {:6.1%} / {:5.1f} px"
+                .format(face_size, full[0], full[1], roi[0], roi[1]))
+
+if __name__ == "__main__":
+    main()
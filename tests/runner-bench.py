@@ -0,0 +1,124 @@
+"""
+Model runner benchmark
+
+Classifies the same synthetic frames with the mock .eim model (mock-eim.py)
+through ImageImpulseRunner from edge_impulse_linux (if it is installed) and
+through the lean runner in facedress/runner.py, each with and without the
+shared memory feature segment. Reports per inference the time to pack the
+features, the bytes sent to the model process, the time to serialize and
+send the request, and the whole classify() round trip.
+
+Usage: python3 runner-bench.py [frames]
+
+License: Apache-2.0
+"""
+
+import os, sys, time, json
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+from facedress.runner import FastImageRunner
+from facedress.sources import SyntheticSource
+
+# Settings
+mock_path = os.path.join(dir_path, "mock-eim.py")
+resize_res = (320, 320)
+
+# Counts the bytes of requests and the time spent serializing and sending
+# them (for ImageImpulseRunner, which has no statistics of its own)
+class CountingSocket:
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.bytes_sent = 0
+        self.send_time = 0.0
+
+    def send(self, data):
+        start = time.perf_counter()
+        self.bytes_sent += len(data)
+        count = self.sock.send(data)
+        self.send_time += time.perf_counter() - start
+        return count
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+# Serialization happens right before send(), so time json.dumps around it
+class TimedJson:
+
+    def __init__(self, counter):
+        self.counter = counter
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        data = json.dumps(obj, **kwargs)
+        self.counter.send_time += time.perf_counter() - start
+        return data
+
+    def __getattr__(self, name):
+        return getattr(json, name)
+
+# Start the stock runner on the mock, or None if it is not installed
+def stock_runner(allow_shm):
+    try:
+        from edge_impulse_linux import runner as ei_runner
+        from edge_impulse_linux.image import ImageImpulseRunner
+    except ImportError:
+        return None
+    runner = ImageImpulseRunner(mock_path)
+    runner._allow_shm = allow_shm
+    runner.init()
+    runner.counter = CountingSocket(runner._client)
+    runner._client = runner.counter
+    ei_runner.json = TimedJson(runner.counter)
+    return runner
+
+# Classify frames, return (features ms, bytes, send ms, classify ms) per frame
+def run(runner, frames, counter):
+    features_time = 0.0
+    classify_time = 0.0
+    bytes_before = counter.bytes_sent
+    send_before = counter.send_time
+    for img in frames:
+        start = time.perf_counter()
+        features, _ = runner.get_features_from_image(img)
+        features_time += time.perf_counter() - start
+        start = time.perf_counter()
+        runner.classify(features)
+        classify_time += time.perf_counter() - start
+    n = len(frames)
+    return (features_time / n * 1000, (counter.bytes_sent - bytes_before) / n,
+            (counter.send_time - send_before) / n * 1000,
+            classify_time / n * 1000)
+
+def main(argv):
+    num_frames = int(argv[0]) if len(argv) > 0 else 50
+
+    # Model input frames (RGB at resize_res)
+    source = SyntheticSource(resize_res, resize_res, num_frames=num_frames)
+    frames = [frame.small.copy() for frame in source]
+
+    print("{:<30} {:>12} {:>14} {:>10} {:>13}".format("runner", "features ms",
+            "bytes/request", "send ms", "classify ms"))
+    for name, allow_shm in (("ImageImpulseRunner, JSON", False),
+                            ("ImageImpulseRunner, shm", True),
+                            ("FastImageRunner, JSON", False),
+                            ("FastImageRunner, shm", True)):
+        os.environ["MOCK_EIM_SHM"] = "1" if allow_shm else "0"
+        if name.startswith("ImageImpulseRunner"):
+            runner = stock_runner(allow_shm)
+            if runner is None:
+                print("{:<30} (edge_impulse_linux not installed)".format(name))
+                continue
+            counter = runner.counter
+        else:
+            runner = FastImageRunner(mock_path, allow_shm=allow_shm)
+            runner.init()
+            counter = runner
+        run(runner, frames[:5], counter)
+        print("{:<30} {:>12.2f} {:>14.0f} {:>10.2f} {:>13.2f}".format(name,
+                *run(runner, frames, counter)))
+        runner.stop()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
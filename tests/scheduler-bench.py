@@ -0,0 +1,89 @@
+"""
+Display scheduler benchmark
+
+Runs the server with a synthetic camera and a fake model that finds two faces
+(a confident one and a doubtful one) and takes a while, so the frame loop
+can't keep up with target_fps while encoding for three displays (the third
+one gets the default center crop). Once with schedule_displays off and once
+on. Reports the frame rate each display got and, from the control socket,
+the delivered frame rate and scheduling state the server sees.
+
+Usage: python3 scheduler-bench.py [seconds] [inference_ms]
+
+License: Apache-2.0
+"""
+
+import os, sys, json, time, signal, threading, subprocess
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+import fixtures
+
+# Settings
+port = 18491
+control_port = 18492
+hosts = ["127.0.0.1", "127.0.0.2", "127.0.0.3"]
+
+# Run the server (in a child process of the benchmark) with a model that waits
+# for "inference", then finds two faces
+def serve(schedule, inference_time):
+    def load_runner(model_file):
+        return fixtures.FixedFaceRunner(faces=((1 / 3, 0.5, 0.9),
+                                                (2 / 3, 0.5, 0.5)),
+                                        inference_time=inference_time)
+    fixtures.configure_server(port, load_runner, hosts,
+                                CONTROL_PORT=control_port,
+                                roi_inference=False,
+                                static_fps=server.target_fps,
+                                schedule_displays=schedule)
+    server.main()
+
+# Answer frames like a display, note when they arrive
+def display(host, times, stop):
+    def handle(payload, recv_time):
+        times.append(time.perf_counter())
+    sock = fixtures.connect((host, port), source=host)
+    fixtures.fake_display(sock, handle, stop)
+
+# Ask the server's control socket about the displays
+def display_stats():
+    return fixtures.control(control_port, {"command": "displays"})["result"]
+
+def main(argv):
+    if len(argv) > 0 and argv[0] == "--serve":
+        serve(argv[1] == "on", float(argv[2]))
+        return
+    seconds = float(argv[0]) if len(argv) > 0 else 6.0
+    inference_ms = float(argv[1]) if len(argv) > 1 else 60.0
+    print("Inference {:.0f} ms".format(inference_ms))
+
+    for mode in ("off", "on"):
+        proc = subprocess.Popen([sys.executable, os.path.realpath(__file__),
+                                    "--serve", mode,
+                                    str(inference_ms / 1000)],
+                                stdout=subprocess.DEVNULL)
+        stop = threading.Event()
+        times = {host: [] for host in hosts}
+        for host in hosts:
+            threading.Thread(target=display, args=(host, times[host], stop),
+                                daemon=True).start()
+        time.sleep(1.0 + seconds)
+        stats = display_stats()
+        stop.set()
+        proc.send_signal(signal.SIGINT)
+        proc.wait()
+
+        # Skip the first second (startup)
+        line = "schedule_displays {:<3}".format(mode)
+        for host in hosts:
+            start = times[host][0] + 1.0
+            shown = [t for t in times[host] if t >= start]
+            line += " | {}: {:5.1f} fps".format(host, (len(shown) - 1) /
+                                                max(shown[-1] - shown[0], 1e-6))
+        print(line)
+        for entry in stats:
+            print("    " + json.dumps(entry))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
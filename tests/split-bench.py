@@ -0,0 +1,92 @@
+"""
+Split process benchmark
+
+Runs the server with a synthetic camera and a fake model (waits like the .eim
+IPC, then does some Python post-processing that holds the GIL) as fast as it
+can, once in one process and once with SPLIT_PROCESSES, each time with two
+displays connected from this process. Reports the capture rate, the rate each
+display got, frames dropped and the capture-to-receive latency.
+
+Usage: python3 split-bench.py [seconds] [inference_ms] [postprocess_ms]
+
+License: Apache-2.0
+"""
+
+import os, sys, time, signal, threading, subprocess
+
+import numpy as np
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+import fixtures
+from facedress import protocol
+
+# Settings
+port = 18489
+hosts = ["127.0.0.1", "127.0.0.2"]
+
+# Run the server (in a child process of the benchmark) with a model that waits
+# for "inference", then spends time in Python
+def serve(split, inference_time, postprocess_time):
+    def load_runner(model_file):
+        return fixtures.FixedFaceRunner(inference_time=inference_time,
+                                        postprocess_time=postprocess_time)
+    fixtures.configure_server(port, load_runner, hosts, roi_inference=False,
+                                target_fps=0, static_fps=0,
+                                SPLIT_PROCESSES=split)
+    server.main()
+
+# Receive frames like a display, collect (time, frame id, latency)
+def display(host, results, stop):
+    def handle(payload, recv_time):
+        frame_id, capture_time, _, _, _ = protocol.unpack_frame(payload)
+        results.append((time.perf_counter(), frame_id,
+                        recv_time - capture_time))
+    sock = fixtures.connect((host, port), source=host)
+    fixtures.fake_display(sock, handle, stop)
+
+def main(argv):
+    if len(argv) > 0 and argv[0] == "--serve":
+        serve(argv[1] == "split", float(argv[2]), float(argv[3]))
+        return
+    seconds = float(argv[0]) if len(argv) > 0 else 5.0
+    inference_ms = argv[1] if len(argv) > 1 else "20"
+    postprocess_ms = argv[2] if len(argv) > 2 else "8"
+    print("Inference {} ms, post-processing {} ms".format(inference_ms,
+                                                            postprocess_ms))
+
+    for mode in ("single", "split"):
+        proc = subprocess.Popen([sys.executable, os.path.realpath(__file__),
+                                    "--serve", mode,
+                                    str(float(inference_ms) / 1000),
+                                    str(float(postprocess_ms) / 1000)],
+                                stdout=subprocess.DEVNULL)
+        stop = threading.Event()
+        results = {host: [] for host in hosts}
+        threads = [threading.Thread(target=display,
+                                    args=(host, results[host], stop),
+                                    daemon=True) for host in hosts]
+        for thread in threads:
+            thread.start()
+        time.sleep(1.0 + seconds)
+        stop.set()
+        proc.send_signal(signal.SIGINT)
+        proc.wait()
+
+        # Skip the first second (startup)
+        line = "{:<7}".format(mode)
+        for host in hosts:
+            start = results[host][0][0] + 1.0
+            frames = [r for r in results[host] if r[0] >= start]
+            ids = [r[1] for r in frames]
+            latencies = np.array([r[2] for r in frames]) * 1000
+            span = frames[-1][0] - frames[0][0]
+            line += " | {}: capture {:5.1f} fps, shown {:5.1f} fps, " \
+                    "latency p50 {:5.1f} ms".format(host,
+                        (ids[-1] - ids[0]) / span, (len(ids) - 1) / span,
+                        np.percentile(latencies, 50))
+        print(line)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,87 @@
+"""
+Server startup benchmark
+
+Runs server.main() with a simulated camera (synthetic frames after a warm-up
+delay) and a simulated model that takes a few seconds to initialize, with a
+display connecting over localhost right away. Prints the server's startup
+timeline and, from the display's side, when the first frame and the first
+face crop arrived. Compares with the sum of the steps (what a strictly
+sequential startup would take at least).
+
+Usage: python3 startup-bench.py [model_load_seconds] [camera_warmup_seconds]
+
+License: Apache-2.0
+"""
+
+import os, sys, time, threading
+
+import numpy as np
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+import fixtures
+from facedress import protocol
+
+# Settings
+port = 18484
+num_frames = 120
+face_rgb = (210, 170, 150)              # Synthetic face color (RGB)
+
+# Finds the synthetic face by color, like a FOMO model would
+class FakeFomoRunner:
+
+    def get_features_from_image(self, img):
+        return img, img
+
+    def classify(self, img):
+        diff = np.abs(img.astype(np.int16) - np.array(face_rgb, dtype=np.int16))
+        ys, xs = np.nonzero(np.all(diff < 30, axis=2))
+        bboxes = []
+        if len(xs) > 0:
+            bboxes.append({'label': 'face', 'value': 0.9,
+                            'x': int(xs.mean()) - 4, 'y': int(ys.mean()) - 4,
+                            'width': 8, 'height': 8})
+        return {'result': {'bounding_boxes': bboxes}, 'timing': {}}
+
+    def stop(self):
+        pass
+
+# Connect as soon as the server listens, note when frames arrive
+def display(start, events):
+    sock = fixtures.connect(("127.0.0.1", port), 0.01)
+    events["connected"] = time.perf_counter() - start
+
+    def handle(payload, recv_time):
+        width = protocol.unpack_frame(payload)[2]
+        now = time.perf_counter() - start
+        events.setdefault("first frame", now)
+        if width != server.default_sub_res[0]:
+            events.setdefault("first face crop", now)
+    fixtures.fake_display(sock, handle)
+
+def main(argv):
+    load_time = float(argv[0]) if len(argv) > 0 else 3.0
+    warmup = float(argv[1]) if len(argv) > 1 else 0.5
+
+    def slow_load_runner(model_file):
+        time.sleep(load_time)
+        return FakeFomoRunner()
+    fixtures.configure_server(port, slow_load_runner,
+                                camera=fixtures.synthetic_camera(
+                                    warmup, fps=30, num_frames=num_frames),
+                                target_fps=15.0)
+
+    events = {}
+    start = time.perf_counter()
+    threading.Thread(target=display, args=(start, events), daemon=True).start()
+    server.main()
+
+    print("Display side:")
+    for name, seconds in sorted(events.items(), key=lambda item: item[1]):
+        print("  {:<16} {:.2f} s".format(name, seconds))
+    print("Sequential startup (model, then camera) would take at least "
+            "{:.2f} s to the first frame".format(load_time + warmup))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
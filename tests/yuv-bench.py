@@ -0,0 +1,115 @@
+"""
+YUV capture benchmark
+
+Compares the server's CPU time per frame for BGR and YUV420 capture: making
+the model input from the full frame (unless the GPU resizes it, as with
+dual_stream), cutting a face crop and the default center crop, and encoding
+both to JPEG (masked if circle_mask is set). Frames are rendered and converted
+to the camera's formats up front (BGR from the same YUV420 data, like the
+camera's ISP makes it), so only the server's work is timed. YUV crops are
+encoded with OpenCV (only the crop is converted to BGR), and straight from the
+planes with libjpeg-turbo if PyTurboJPEG is installed.
+
+Usage: python3 yuv-bench.py [frames]
+
+License: Apache-2.0
+"""
+
+import os, sys, time
+
+import numpy as np
+import cv2
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+from facedress import boxes, yuv
+from facedress.sources import Frame, SyntheticSource, downscale
+
+# Camera frames of a synthetic scene: I420 buffers and BGR arrays
+def make_frames(source, num_frames):
+    bgr = []
+    i420 = []
+    for index in range(num_frames):
+        img = source.render(index, server.capture_res, source.full_buf,
+                            source.noise)
+        i420.append(cv2.cvtColor(img, cv2.COLOR_BGR2YUV_I420))
+        bgr.append(cv2.cvtColor(i420[-1], cv2.COLOR_YUV2BGR_I420))
+    return bgr, i420
+
+# The server's work on one frame: model input, two crops, two JPEGs
+def process(frame, bboxes, model_input):
+    if model_input is not None:
+        model_input()
+    return [len(server.encode_jpeg(img))
+            for img in server.cut_sub_images(frame, bboxes, 2)]
+
+# CPU and wall time per frame (ms) and JPEG bytes per frame for one pipeline
+def run(name, source, bgr, i420):
+    capture_res = server.capture_res
+    resize_res = server.resize_res
+    resized = np.empty((resize_res[1], resize_res[0], 3), dtype=np.uint8)
+    small = np.empty_like(resized)
+    small_i420 = np.empty((resize_res[1] * 3 // 2, resize_res[0]),
+                            dtype=np.uint8)
+    cpu = 0.0
+    wall = 0.0
+    sizes = 0
+    for index in range(len(bgr)):
+        x, y, w, h = source.face_box(index)
+        bboxes = boxes.fixed_regions([{'value': 0.9, 'x': x, 'y': y,
+                                        'width': w, 'height': h}],
+                                        server.threshold,
+                                        server.get_sub_size(), capture_res)
+        start_cpu = time.process_time()
+        start = time.perf_counter()
+        if name.startswith("BGR"):
+            full = bgr[index]
+            frame = Frame(index, 0.0, small, full)
+            model_input = None
+            if "single" in name:
+                model_input = lambda: downscale(full, resize_res, resized,
+                                                small)
+        else:
+            img = yuv.from_i420(i420[index], capture_res)
+            frame = Frame(index, 0.0, small, img.to_bgr, img)
+            model_input = lambda: yuv.downscale(img, resize_res, small_i420,
+                                                small)
+        sizes += sum(process(frame, bboxes, model_input))
+        wall += time.perf_counter() - start
+        cpu += time.process_time() - start_cpu
+    n = len(bgr)
+    return cpu / n * 1000, wall / n * 1000, sizes / n
+
+def main(argv):
+    num_frames = int(argv[0]) if len(argv) > 0 else 60
+    rounds = 3
+    server.idle_content = False
+    source = SyntheticSource(server.capture_res, server.resize_res)
+    bgr, i420 = make_frames(source, num_frames)
+
+    pipelines = ["BGR, dual stream (GPU resize)", "BGR, single stream",
+                    "YUV420, OpenCV JPEG"]
+    if yuv.get_turbo() is not None:
+        pipelines.append("YUV420, libjpeg-turbo JPEG")
+    else:
+        print("PyTurboJPEG or libjpeg-turbo not installed, skipping "
+                "libjpeg-turbo")
+    print("Capture {}x{}: {:.0f} kB BGR, {:.0f} kB YUV420 per frame".format(
+            server.capture_res[0], server.capture_res[1],
+            bgr[0].nbytes / 1e3, i420[0].nbytes / 1e3))
+    print("{:<32} {:>12} {:>12} {:>12}".format("pipeline", "CPU ms/frame",
+            "wall ms", "JPEG bytes"))
+
+    # Take turns, so all pipelines see the same machine state (best round)
+    results = {name: [] for name in pipelines}
+    for _ in range(rounds):
+        for name in pipelines:
+            server.yuv_turbojpeg = name.endswith("libjpeg-turbo JPEG")
+            results[name].append(run(name, source, bgr, i420))
+    for name in pipelines:
+        print("{:<32} {:>12.2f} {:>12.2f} {:>12.0f}".format(name,
+                *min(results[name])))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
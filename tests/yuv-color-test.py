@@ -0,0 +1,157 @@
+"""
+YUV capture color test
+
+Checks that colors survive the YUV420 pipeline: a frame of known color patches
+is converted to I420 like the camera delivers it (in video range, and once in
+full range), then the model input (RGB at resize_res) and the JPEG of the
+center crop (decoded like a display does) are compared with the original
+colors. Also checks that the red and blue channels are not swapped, and that
+the circle mask leaves black corners. JPEGs are encoded with OpenCV, and with
+libjpeg-turbo straight from the planes if PyTurboJPEG is installed.
+
+Usage: python3 yuv-color-test.py
+
+License: Apache-2.0
+"""
+
+import os, sys
+
+import numpy as np
+import cv2
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, ".."))
+import server
+from facedress import boxes, yuv
+
+# Settings
+patch_size = 48
+tolerance = 12.0                        # Max mean error per channel (0-255)
+colors = {"red": (0, 0, 255), "green": (0, 255, 0), "blue": (255, 0, 0),
+            "skin": (150, 170, 210), "gray": (128, 128, 128),
+            "white": (255, 255, 255), "black": (0, 0, 0),
+            "yellow": (0, 255, 255)}
+
+# Frame with the color patches (BGR) in a grid around the center
+def make_frame(res):
+    img = np.full((res[1], res[0], 3), 64, dtype=np.uint8)
+    positions = {}
+    for i, (name, color) in enumerate(colors.items()):
+        x = res[0] // 2 - 2 * patch_size + (i % 4) * patch_size
+        y = res[1] // 2 - patch_size + (i // 4) * patch_size
+        img[y:y + patch_size, x:x + patch_size] = color
+        positions[name] = (x, y)
+    return img, positions
+
+# Mean color (in the image's channel order) of the middle of a patch
+def patch_mean(img, x, y, size):
+    margin = size // 4
+    return img[y + margin:y + size - margin,
+                x + margin:x + size - margin].reshape(-1, 3).mean(axis=0)
+
+# Compare the patches of an image with the expected colors, returns failures
+def check_patches(name, img, positions, scale, order):
+    failures = []
+    for color, (x, y) in positions.items():
+        expected = np.array(colors[color], dtype=np.float64)
+        if order == "rgb":
+            expected = expected[::-1]
+        found = patch_mean(img, int(x * scale), int(y * scale),
+                            int(patch_size * scale))
+        error = np.abs(found - expected).max()
+        if error > tolerance:
+            failures.append("{} {}: expected {} got {}".format(name, color,
+                            expected.astype(int).tolist(),
+                            found.round().astype(int).tolist()))
+    return failures
+
+# Run one check and print the result
+def report(name, failures):
+    print("{:<40} {}".format(name, "FAIL" if failures else "PASS"))
+    for failure in failures:
+        print("    " + failure)
+    return len(failures)
+
+def main():
+    capture_res = server.capture_res
+    resize_res = server.resize_res
+    img, positions = make_frame(capture_res)
+    _, x0, y0, x1, y1 = boxes.center_region(server.default_sub_res,
+                                            capture_res)
+    crop_positions = {name: (x - x0, y - y0)
+                        for name, (x, y) in positions.items()}
+
+    # Video range like the camera's video port, and full range
+    video = yuv.from_bgr(img)
+    full = yuv.YuvImage(cv2.LUT(video.y, yuv._Y_TO_FULL),
+                        cv2.LUT(video.u, yuv._C_TO_FULL),
+                        cv2.LUT(video.v, yuv._C_TO_FULL), full_range=True)
+
+    failed = 0
+    for range_name, frame_yuv in (("video range", video),
+                                    ("full range", full)):
+
+        # Model input is RGB
+        small = yuv.downscale(frame_yuv, resize_res)
+        failed += report("model input, " + range_name,
+                            check_patches("model input", small, positions,
+                                            resize_res[0] / capture_res[0],
+                                            "rgb"))
+
+        # Full frame and crops convert back to BGR
+        failed += report("BGR frame, " + range_name,
+                            check_patches("BGR frame", frame_yuv.to_bgr(),
+                                            positions, 1.0, "bgr"))
+
+        # JPEGs decode to the same colors with either encoder
+        crop = frame_yuv.crop(x0, y0, x1, y1)
+        encoders = [("OpenCV", False)]
+        if yuv.get_turbo() is not None:
+            encoders.append(("libjpeg-turbo", True))
+        else:
+            print("{:<40} SKIPPED (no PyTurboJPEG or libjpeg-turbo)".format(
+                    "JPEG libjpeg-turbo, " + range_name))
+        for encoder, turbo in encoders:
+            jpg = yuv.encode_jpeg(crop, server.jpeg_quality, turbo=turbo)
+            decoded = cv2.imdecode(jpg, cv2.IMREAD_COLOR)
+            name = "JPEG " + encoder + ", " + range_name
+            failures = check_patches(name, decoded, crop_positions, 1.0, "bgr")
+            if decoded.shape[:2] != (y1 - y0, x1 - x0):
+                failures.append("{}: size {} instead of {}".format(name,
+                                decoded.shape[:2], (y1 - y0, x1 - x0)))
+            failed += report(name, failures)
+
+            # Corners outside the display circle are black
+            masked = cv2.imdecode(yuv.encode_jpeg(crop, server.jpeg_quality,
+                                                    circle=True, turbo=turbo),
+                                    cv2.IMREAD_COLOR)
+            corners = [masked[:8, :8], masked[:8, -8:], masked[-8:, :8],
+                        masked[-8:, -8:]]
+            failures = ["{}: corner is {}".format(name, corner.reshape(-1, 3)
+                                                    .mean(axis=0).round()
+                                                    .tolist())
+                        for corner in corners if corner.max() > tolerance]
+            failed += report(name + ", masked", failures)
+
+    # The server encodes YUV crops through the same path as BGR crops
+    server.circle_mask = False
+    from_yuv = cv2.imdecode(server.encode_jpeg(video.crop(x0, y0, x1, y1)),
+                            cv2.IMREAD_COLOR)
+    from_bgr = cv2.imdecode(server.encode_jpeg(img[y0:y1, x0:x1]),
+                            cv2.IMREAD_COLOR)
+    failures = []
+    if from_yuv.shape != from_bgr.shape:
+        failures.append("size {} vs {}".format(from_yuv.shape, from_bgr.shape))
+    else:
+        failures += check_patches("server JPEG from YUV", from_yuv,
+                                    crop_positions, 1.0, "bgr")
+        failures += check_patches("server JPEG from BGR", from_bgr,
+                                    crop_positions, 1.0, "bgr")
+    failed += report("server.encode_jpeg, YUV and BGR", failures)
+
+    print("All checks passed" if failed == 0 else
+            str(failed) + " color errors")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()